@@ -8,20 +8,24 @@ except ImportError:
     from typing_extensions import Annotated
 from dotenv import load_dotenv
 from operator import add
+import contextvars
 import copy
+import functools
 import json
 import time
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage, SystemMessage
 from langgraph.graph import END, StateGraph
 from langgraph.prebuilt import ToolNode, tools_condition
 from langchain_core.tools import BaseTool, tool
-from langchain_core.runnables.graph import MermaidDrawMethod
+from langchain_core.runnables import RunnableConfig
 
 # Import both decorated and raw tool functions
 from .tools import (
+    get_data_version,
     get_product_info,
     list_products,
     get_inventory_level,
@@ -38,13 +42,39 @@ from .tools import (
     _estimate_days_of_stock_remaining,
     _get_top_selling_products
 )
-from .tool_usage import reset_tracker, get_tool_usage, add_tool_usage
-from .models import AgentLogicResponse, DebugInfo, ToolUsage # Added import
+from .tool_usage import reset_tracker, get_tool_usage, start_tool_call, end_tool_call
+from .tool_logger import start_session, end_session
+from .models import AgentLogicResponse, DebugInfo, ToolUsage, TokenUsage # Added import
+from .response_cache import lookup_response, store_response, normalize_query
+from .singleflight import SingleFlight
+from .conversation import BoundedMemorySaver, add_bounded_messages, trim_context
+from .metrics import timed_node, observe_llm_call, TOOL_DURATION, RETRIEVAL_DURATION
+from .router import try_fast_path, record_route, GRAPH_ROUTE, PLANNER_ROUTE, RESPONSE_CACHE_ROUTE
+from .warmup import warmup_complete
+from .rag_prefetch import start_rag_prefetch, RAG_TOOL_NAME
+from .token_usage import TokenUsageTracker, tools_in_context
+from . import tool_dedup, profiling
+from .query_planner import run_analytics_query, SOURCE_COLUMNS
+from .log_policy import truncated, digest, log_payload
+from .llm_resilience import resilient_invoke, LLM_TIMEOUT_MAX
+from .cascade import (
+    CASCADE_ENABLED,
+    SMALL_TIER,
+    LARGE_TIER,
+    TIER_METADATA_KEY,
+    REASON_METADATA_KEY,
+    model_for_tier,
+    run_start_tier,
+    escalation_reason,
+    record_escalation,
+    record_answer,
+    run_tiers,
+)
 
 # Import for RAG - use relative imports as agent.py is inside 'app' which is inside 'backend'
 # and backend/ is the root for python path when uvicorn starts from backend/
 # Reverting to direct imports as Uvicorn runs from backend/, making backend/ the effective root for these.
-from data_processing import setup_vector_store
+from data_processing import get_collection_version
 from tools import create_query_internal_docs_tool
 import logging
 
@@ -81,31 +111,57 @@ tools = RAW_TOOLS
 load_dotenv()
 
 # Configure the LLM
-def get_llm():
-    """Get the LLM based on environment variables"""
+@functools.lru_cache(maxsize=None)
+def _build_llm(provider: str, model: str, logprobs: bool = False):
+    """Build (once) a chat model client; clients are reused across requests"""
+    if provider == "openai":
+        # Imported on first use: the OpenAI SDK is the largest single import cost
+        from langchain_openai import ChatOpenAI
+        # Retries and timeouts are handled by resilient_invoke; the client timeout
+        # only bounds abandoned (timed-out or hedged) requests
+        return ChatOpenAI(model=model, temperature=0, logprobs=logprobs or None, max_retries=0, timeout=LLM_TIMEOUT_MAX)
+    from langchain_anthropic import ChatAnthropic
+    return ChatAnthropic(model=model, temperature=0, max_retries=0, default_request_timeout=LLM_TIMEOUT_MAX)
+
+def get_llm(tier: str = LARGE_TIER):
+    """
+    Get the LLM based on environment variables
+    
+    Args:
+        tier: Cascade tier, SMALL_TIER or LARGE_TIER (see app/cascade.py)
+    """
+    if os.environ.get("LLM_PROVIDER", "").lower() == "fake":
+        # Offline scripted model for load testing (see app/fake_llm.py)
+        from .fake_llm import get_fake_llm
+        return get_fake_llm()
     if os.environ.get("OPENAI_API_KEY"):
-        return ChatOpenAI(model="gpt-4o", temperature=0)
+        # The small tier returns logprobs so the cascade can judge its confidence
+        return _build_llm("openai", model_for_tier("openai", tier), logprobs=tier == SMALL_TIER)
     elif os.environ.get("ANTHROPIC_API_KEY"):
-        from langchain_anthropic import ChatAnthropic
-        return ChatAnthropic(model="claude-3-sonnet-20240229", temperature=0)
+        return _build_llm("anthropic", model_for_tier("anthropic", tier))
     else:
         raise ValueError("No API key found for OpenAI or Anthropic. Please set OPENAI_API_KEY or ANTHROPIC_API_KEY.")
 
+def llm_configured() -> bool:
+    """Whether get_llm has a provider to build a model for (an API key or the fake LLM)"""
+    return (os.environ.get("LLM_PROVIDER", "").lower() == "fake"
+            or bool(os.environ.get("OPENAI_API_KEY") or os.environ.get("ANTHROPIC_API_KEY")))
+
 # Define the agent state
 class AgentState(TypedDict):
-    messages: Annotated[Sequence[BaseMessage], add]
+    # Bounded append: conversation threads drop their oldest turns past MAX_THREAD_MESSAGES
+    messages: Annotated[Sequence[BaseMessage], add_bounded_messages]
 
 # Define the tools (using the global `tools` list populated above and by lifespan)
 # tools = instrumented_tools # No longer instrumenting
 
-# System prompt template
+# System prompt. Tool descriptions are not repeated here: bind_tools already sends
+# each tool's schema, and a static prompt keeps the prefix cacheable across hops.
 SYSTEM_PROMPT = """
 You are an AI Shopping Operations Assistant for a Shopify merchant. Your primary goal is to answer the merchant's questions accurately and efficiently.
 
 You have access to specialized tools for specific data types and a general knowledge tool for policies, procedures, and other internal information.
 
-{tool_descriptions}
-
 ## Tool Usage and Answering Protocol:
 
 **1. Understand the Query Type:**
@@ -124,7 +180,7 @@ You have access to specialized tools for specific data types and a general knowl
 **2. Tool Invocation and Response Generation:**
    - After invoking a tool, review the information received.
    - **If the information is sufficient to answer the user's question, formulate and provide the answer directly. Do NOT call another tool unless absolutely necessary to fulfill the original request.**
-   - If the initial tool call (especially from `query_internal_documents`) does not provide a complete answer, you may re-phrase your query and try the *same* tool again if you believe more relevant information can be found within that tool's scope. Avoid rapidly switching between different tools for the same core question if the RAG tool is appropriate.
+   - If the initial tool call (especially from `query_internal_documents`) does not provide a complete answer, you may re-phrase your query and try the *same* tool again if you believe more relevant information can be found within that tool's scope. Never repeat a call with exactly the same arguments; its result will not change. Avoid rapidly switching between different tools for the same core question if the RAG tool is appropriate.
 
 **3. Important Guidelines:**
    - **Prioritize `query_internal_documents`**: For any ambiguity or for questions about processes, policies, how-to guides, FAQs, or general knowledge, your FIRST and primary choice should be `query_internal_documents`.
@@ -147,41 +203,105 @@ You have access to specialized tools for specific data types and a general knowl
 By following this protocol, you will efficiently use the available tools and provide accurate answers. If you find yourself calling multiple different tools for a single, simple query, re-evaluate if `query_internal_documents` should have been your primary choice.
 """
 
+def _invoke_llm(tier: str, bound_tools: Sequence[BaseTool], formatted_messages: List[BaseMessage],
+                token_tracker: Optional[TokenUsageTracker] = None, context_tools: Sequence[str] = ()) -> AIMessage:
+    """
+    Call the model for a cascade tier with tools bound, recording latency and token usage.
+    
+    Args:
+        tier: SMALL_TIER or LARGE_TIER
+        bound_tools: Tools to bind to the model
+        formatted_messages: Prompt messages, starting with the system message
+        token_tracker: Optional per-request token accounting
+        context_tools: Tools whose results are new in this prompt
+    """
+    llm = get_llm(tier)
+    llm_with_tools = llm.bind_tools(bound_tools)
+    model_name = getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+    def record_discarded(discarded_response: AIMessage, seconds: float) -> None:
+        # A losing hedge (or timed-out attempt) that still answered was billed
+        observe_llm_call(model_name, seconds, discarded_response, context_tools)
+        if token_tracker is not None:
+            token_tracker.record(model_name, discarded_response, seconds, list(context_tools), tier=tier,
+                                 discarded=True)
+
+    llm_start = time.perf_counter()
+    # Adaptive timeout, jittered retries and a hedged request after the p95 latency
+    response = resilient_invoke(lambda: llm_with_tools.invoke(formatted_messages), key=model_name,
+                                on_discarded=record_discarded)
+    llm_seconds = time.perf_counter() - llm_start
+    observe_llm_call(model_name, llm_seconds, response, context_tools)
+    # Per-request token accounting, surfaced in DebugInfo.token_usage
+    if token_tracker is not None:
+        token_tracker.record(model_name, response, llm_seconds, list(context_tools), tier=tier)
+    return response
+
 # Define the chatbot function using LLM with tools
-def chatbot(state: AgentState):
-    """Process the messages using the LLM"""
-    llm = get_llm()
+def chatbot(state: AgentState, config: RunnableConfig = None):
+    """Process the messages using the LLM, starting on the small cascade tier"""
+    configurable = (config or {}).get("configurable", {})
+    token_tracker = configurable.get("token_tracker")
+
+    # Keep long conversation threads within the prompt token budget
+    messages = trim_context(state["messages"])
+    run_messages = tool_dedup.current_run(state["messages"])
+    # Once the run has used its tool call budget, the model must answer now
+    force_answer = tool_dedup.budget_exhausted(state["messages"])
+    system_prompt = SYSTEM_PROMPT + "\n" + tool_dedup.BUDGET_EXHAUSTED_MESSAGE if force_answer else SYSTEM_PROMPT
+    formatted_messages = [SystemMessage(content=system_prompt), *messages]
+    context_tools = tools_in_context(messages)
+
     # Bind the raw tools (populated globally) to the LLM
     # Ensure the global `tools` list is up-to-date (includes RAG tool from lifespan)
-    llm_with_tools = llm.bind_tools(tools)
-
-    # Create prompt template with system message
-    # Use the current state of the global `tools` list for descriptions
-    tool_descriptions = "\n".join([f"- {tool.name}: {tool.description}" for tool in tools if tool is not None])
-    messages = state["messages"]
-    
-    # Use a system message and the history
-    system_message = SYSTEM_PROMPT.format(tool_descriptions=tool_descriptions)
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_message),
-        ("placeholder", "{messages}"),
-    ])
-    
-    # Format messages and invoke the LLM
-    formatted_messages = prompt.format_messages(messages=messages)
-    response = llm_with_tools.invoke(formatted_messages)
+    tier = run_start_tier(run_messages)
+    response = _invoke_llm(tier, tools, formatted_messages, token_tracker, context_tools)
+    # Validation compares the answer with this turn's question as well as the run's tool results
+    # (not with earlier turns of a conversation thread)
+    turn_messages = state["messages"][max(len(state["messages"]) - len(run_messages) - 1, 0):]
+    reason = escalation_reason(response, turn_messages, tools) if tier == SMALL_TIER else None
+    if reason:
+        logger.info(f"Escalating to the large model ({reason}).")
+        record_escalation(reason)
+        tier = LARGE_TIER
+        response = _invoke_llm(tier, tools, formatted_messages, token_tracker, context_tools)
+
+    if force_answer and getattr(response, "tool_calls", None):
+        # Drop further tool calls so the run ends here
+        logger.warning(f"Tool call budget ({tool_dedup.MAX_TOOL_CALLS_PER_RUN}) exhausted; dropping {len(response.tool_calls)} tool call(s).")
+        tool_dedup.record("forced_answers")
+        response = AIMessage(
+            content=response.content or "I couldn't complete this request within the tool call limit. Please try a more specific question.",
+            usage_metadata=response.usage_metadata,
+            response_metadata=response.response_metadata,
+            id=response.id,
+        )
+    # Record the answering tier on the message so later hops and DebugInfo can see it
+    response.response_metadata[TIER_METADATA_KEY] = tier
+    if reason:
+        response.response_metadata[REASON_METADATA_KEY] = reason
+
+    # Drop the speculative RAG prefetch if the model did not ask for retrieval
+    rag_prefetch = configurable.get("rag_prefetch")
+    if rag_prefetch is not None and not any(
+        tc.get("name") == RAG_TOOL_NAME for tc in (getattr(response, "tool_calls", None) or [])
+    ):
+        rag_prefetch.cancel()
     
     # Return the response
     return {"messages": [response]}
 
-# Fix the graph creation to handle config parameter
-def create_graph():
-    """Create and configure the agent graph"""
-    graph = StateGraph(AgentState)
-
+def make_tool_node(get_tools: Callable[[], List[BaseTool]]):
+    """
+    Create the tool execution node
+    
+    Args:
+        get_tools: Returns the tools the node may execute (looked up on every call,
+            so tools added at startup, like the RAG tool, are picked up)
+    """
     # Create a custom tool execution node that handles the config parameter
     # and performs tracking directly.
-    def custom_tool_node(state):
+    def custom_tool_node(state, config: RunnableConfig = None):
+        rag_prefetch = (config or {}).get("configurable", {}).get("rag_prefetch")
         if "messages" not in state or not state["messages"]:
             return {"messages": []}
 
@@ -197,6 +317,10 @@ def create_graph():
             logger.info("No tool calls found in the latest AI message.")
             return {"messages": []}
 
+        # Results already returned in this run, and tool calls used so far
+        seen_results = tool_dedup.previous_results(state["messages"])
+        calls_used = tool_dedup.tool_calls_used(state["messages"])
+
         result_messages = []
         for tool_call in ai_message.tool_calls: # ai_message.tool_calls is a list of ToolCall objects/dicts
             # Ensure we get the tool_call_id directly from the LLM's tool_call object/dict
@@ -218,7 +342,7 @@ def create_graph():
 
             # Find the original tool from the global `tools` list
             matching_tool = None
-            for t in tools: # Use the global `tools` list
+            for t in get_tools():
                 if t and t.name == tool_name:
                     matching_tool = t
                     break
@@ -231,39 +355,72 @@ def create_graph():
                 )
                 continue
 
+            # Answer exact repeats from this run's earlier results and enforce the budget
+            call_key = tool_dedup.tool_call_key(tool_name, tool_args)
+            if call_key in seen_results:
+                logger.info("Tool '%s' (ID: %s) repeats an earlier call with args %s; returning the earlier result.", tool_name, tool_call_id, truncated(tool_args))
+                tool_dedup.record("deduplicated")
+                calls_used += 1
+                result_messages.append(
+                    ToolMessage(content=tool_dedup.DUPLICATE_NOTE + seen_results[call_key], tool_call_id=tool_call_id)
+                )
+                continue
+            if calls_used >= tool_dedup.MAX_TOOL_CALLS_PER_RUN:
+                logger.warning(f"Tool call budget exhausted; not executing '{tool_name}' (ID: {tool_call_id}).")
+                tool_dedup.record("budget_rejected")
+                calls_used += 1
+                result_messages.append(
+                    ToolMessage(content=tool_dedup.BUDGET_EXHAUSTED_MESSAGE, tool_call_id=tool_call_id)
+                )
+                continue
+
             # Start tracking
-            logger.info(f"Executing tool '{tool_name}' (ID: {tool_call_id}) with args: {tool_args}")
-            tool_tracking_id = add_tool_usage(tool_name, tool_args)
+            logger.info("Executing tool '%s' (ID: %s) with args: %s", tool_name, tool_call_id, truncated(tool_args))
+            tool_tracking_id = start_tool_call(tool_name, tool_args, tool_call_id)
+            tool_start = time.perf_counter()
 
             try:
                 # --> Add specific logging for RAG tool input <--
                 if tool_name == "query_internal_documents":
                     query_text = tool_args.get('query', '[Query not found in args]')
-                    logger.info(f"<<< RAG TOOL CALL >>> Querying retriever with: '{query_text}'")
-
-                result = matching_tool.invoke(tool_args)
+                    logger.info("<<< RAG TOOL CALL >>> Querying retriever with: '%s'", truncated(query_text))
+
+                # Reuse the speculative retrieval started alongside the first LLM call
+                used_prefetch = False
+                if tool_name == RAG_TOOL_NAME and rag_prefetch is not None:
+                    used_prefetch, result = rag_prefetch.take(tool_args.get('query', ''))
+                if not used_prefetch:
+                    result = matching_tool.invoke(tool_args)
+                tool_duration = time.perf_counter() - tool_start
+                TOOL_DURATION.labels(tool=tool_name, status="ok").observe(tool_duration)
+                if tool_name == RAG_TOOL_NAME:
+                    RETRIEVAL_DURATION.labels(source="prefetch" if used_prefetch else "tool").observe(tool_duration)
 
                 # --> Add specific logging for RAG tool output <--
                 if tool_name == "query_internal_documents":
-                    # Log the raw result (which should be a list of Documents)
-                    logger.info(f"<<< RAG TOOL RAW RESULT >>> Retriever returned: {result}")
-                    # Also log the number of documents returned
+                    # The number of documents and a content hash at INFO; the raw result
+                    # (which should be a list of Documents) only at DEBUG, sampled and truncated
                     num_docs = len(result) if isinstance(result, list) else "N/A (Result not a list)"
-                    logger.info(f"<<< RAG TOOL RAW RESULT >>> Number of documents: {num_docs}")
+                    logger.info("<<< RAG TOOL RAW RESULT >>> Number of documents: %s, content: %s", num_docs, digest(result))
+                    log_payload(logger, "<<< RAG TOOL RAW RESULT >>> Retriever returned:", result)
 
-                logger.info(f"Tool '{tool_name}' (ID: {tool_call_id}) completed successfully.")
-                add_tool_usage(tool_name, tool_args, result, tool_tracking_id) # Update tracking with result
+                logger.info("Tool '%s' (ID: %s) completed successfully.", tool_name, tool_call_id)
+                end_tool_call(tool_tracking_id, result) # Complete the tracked call with its result
                 try:
                     result_content = json.dumps(result)
                 except TypeError:
                     logger.warning(f"Result from tool '{tool_name}' (ID: {tool_call_id}) is not JSON serializable. Converting to string.")
                     result_content = str(result)
+                seen_results[call_key] = result_content
 
             except Exception as e:
+                TOOL_DURATION.labels(tool=tool_name, status="error").observe(time.perf_counter() - tool_start)
                 logger.error(f"Error executing tool '{tool_name}' (ID: {tool_call_id}): {e}", exc_info=True)
                 error_msg = f"Error: Tool '{tool_name}' failed with: {e}"
-                add_tool_usage(tool_name, tool_args, {"error": str(e)}, tool_tracking_id) # Update tracking with error
+                end_tool_call(tool_tracking_id, {"error": str(e)}, error=str(e)) # Complete the tracked call with its error
                 result_content = error_msg
+            tool_dedup.record("executed")
+            calls_used += 1
 
             result_messages.append(
                 ToolMessage(content=result_content, tool_call_id=tool_call_id) # Crucially, use the original tool_call_id from the LLM
@@ -271,9 +428,23 @@ def create_graph():
 
         return {"messages": result_messages}
 
+    return custom_tool_node
+
+# Fix the graph creation to handle config parameter
+def create_graph(checkpointer=None):
+    """
+    Create and configure the agent graph
+    
+    Args:
+        checkpointer: Optional checkpointer that persists state per conversation thread
+    """
+    graph = StateGraph(AgentState)
+
+    custom_tool_node = make_tool_node(lambda: tools)
+
     # Define the nodes in the graph
-    graph.add_node("chatbot", chatbot)
-    graph.add_node("tools", custom_tool_node)
+    graph.add_node("chatbot", timed_node("chatbot", chatbot))
+    graph.add_node("tools", timed_node("tools", custom_tool_node))
 
     # Connect the nodes
     graph.add_conditional_edges(
@@ -289,18 +460,161 @@ def create_graph():
     graph.set_entry_point("chatbot")
 
     # Compile the graph
-    app = graph.compile()
+    app = graph.compile(checkpointer=checkpointer)
     return app
 
 # Create the agent application
 agent_app = create_graph()
 
+# Conversation threads keep their state in a bounded in-memory checkpointer
+conversation_checkpointer = BoundedMemorySaver()
+conversation_app = create_graph(checkpointer=conversation_checkpointer)
+
+# --- Planner mode ---
+# The LLM compiles the question into one analytics query, the vectorized executor
+# runs it, and a second LLM call phrases the answer: two LLM calls per question.
+AGENT_MODE = os.environ.get("AGENT_MODE", "react").lower()
+PLANNER_MODE = "planner"
+
+PLANNER_PROMPT = """
+You are an analytics planner for a Shopify merchant's operations data. Today is {today}.
+
+Translate the merchant's question into ONE call to `run_analytics_query` that computes the answer in a single query.
+
+Sources and columns:
+- products (one row per product, with its current stock): {products_columns}
+- sales (one row per order line, with its order, product and stock): {sales_columns}
+
+Guidelines:
+- Use window_days on the sales source for lookback periods ("last 30 days").
+- Revenue is sum(item_total); units sold is sum(quantity); order count is nunique(order_id).
+- Use group_by with metrics for per-product or per-category figures, sort_by a metric and top_k for rankings.
+- Product IDs look like 'P301'; filter with field 'product_id'.
+
+If the question cannot be answered from these columns (policies, procedures, how-to questions),
+do not call the tool; reply with a short note instead.
+"""
+
+PLANNER_ANSWER_PROMPT = """
+You are an AI Shopping Operations Assistant for a Shopify merchant.
+Answer the merchant's question from the analytics query result above. Be concise, use $ for dollar amounts
+and % for percentages, and do not invent figures that are not in the result.
+"""
+
+def planner(state: AgentState, config: RunnableConfig = None):
+    """Compile the question into one analytics query (first LLM call)"""
+    token_tracker = (config or {}).get("configurable", {}).get("token_tracker")
+    system_prompt = PLANNER_PROMPT.format(
+        today=datetime.now().strftime('%Y-%m-%d'),
+        products_columns=", ".join(SOURCE_COLUMNS["products"]),
+        sales_columns=", ".join(SOURCE_COLUMNS["sales"]),
+    )
+    # Query compilation is the hard step, so it always uses the large tier
+    response = _invoke_llm(LARGE_TIER, [run_analytics_query],
+                           [SystemMessage(content=system_prompt), *trim_context(state["messages"])],
+                           token_tracker)
+    response.response_metadata[TIER_METADATA_KEY] = LARGE_TIER
+    return {"messages": [response]}
+
+def planner_answer(state: AgentState, config: RunnableConfig = None):
+    """Phrase the answer from the query result (second LLM call)"""
+    token_tracker = (config or {}).get("configurable", {}).get("token_tracker")
+    messages = trim_context(state["messages"])
+    tier = SMALL_TIER if CASCADE_ENABLED else LARGE_TIER
+    response = _invoke_llm(tier, [run_analytics_query],
+                           [SystemMessage(content=PLANNER_ANSWER_PROMPT), *messages],
+                           token_tracker, tools_in_context(messages))
+    if response.tool_calls:
+        # The plan has already run; a second query is not part of this mode
+        response = AIMessage(content=response.content or "I couldn't answer that from a single query.",
+                             usage_metadata=response.usage_metadata, id=response.id)
+    response.response_metadata[TIER_METADATA_KEY] = tier
+    return {"messages": [response]}
+
+def create_planner_graph():
+    """
+    Create the planner-mode graph: planner -> execute -> answer
+    
+    The run ends after the planner if it does not emit a query.
+    """
+    graph = StateGraph(AgentState)
+    graph.add_node("planner", timed_node("planner", planner))
+    graph.add_node("execute", timed_node("execute", make_tool_node(lambda: [run_analytics_query])))
+    graph.add_node("answer", timed_node("answer", planner_answer))
+    graph.add_conditional_edges(
+        "planner",
+        lambda x: "execute" if isinstance(x["messages"][-1], AIMessage) and x["messages"][-1].tool_calls else END,
+    )
+    graph.add_edge("execute", "answer")
+    graph.add_edge("answer", END)
+    graph.set_entry_point("planner")
+    return graph.compile()
+
+planner_app = create_planner_graph()
+
+def _thread_config(thread_id: str) -> Dict[str, Any]:
+    return {"configurable": {"thread_id": thread_id}}
+
+def _record_turn(thread_id: str, query: str, answer: str) -> None:
+    """Append a turn answered outside the graph (fast path or cache) to a thread's history"""
+    conversation_app.update_state(
+        _thread_config(thread_id),
+        {"messages": [HumanMessage(content=query), AIMessage(content=answer)]},
+        as_node="chatbot",
+    )
+
+# Workers used to enforce the timeout when SIGALRM is unavailable (non-main threads).
+# Sized like the server's threadpool (anyio's default of 40 threads), so every request
+# run_in_threadpool admits gets a worker instead of queueing behind the others
+_timeout_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("AGENT_TIMEOUT_WORKERS", "40")), thread_name_prefix="agent-timeout")
+
+def _timeout_response(timeout_seconds) -> AgentLogicResponse:
+    """Friendly response returned when a request times out"""
+    return AgentLogicResponse(
+        response="I'm sorry, but it took too long to process your request. Please try again or simplify your query.",
+        debug=DebugInfo(
+            tool_usage=[],
+            message_count=0,
+            error="Request timed out after {} seconds".format(timeout_seconds)
+        ),
+        trace_data=None
+    )
+
 # Add a timeout decorator
 def timeout_handler(timeout_seconds=30):
     """Decorator to add timeout to a function"""
     def decorator(func):
         def wrapper(*args, **kwargs):
             import signal
+
+            if profiling.is_active():
+                # Profiled requests run in place so cProfile sees the agent's work;
+                # they are debugging runs and are not cut off by the timeout
+                return func(*args, **kwargs)
+
+            if threading.current_thread() is not threading.main_thread():
+                # SIGALRM can only be installed from the main thread (e.g. not from
+                # FastAPI's threadpool): run on a worker and stop waiting after the timeout.
+                # The worker runs in a copy of this context so request-scoped state
+                # (tool usage, logging session, profile) stays visible to it
+                started = threading.Event()
+
+                def run():
+                    started.set()
+                    return func(*args, **kwargs)
+
+                future = _timeout_executor.submit(contextvars.copy_context().run, run)
+                try:
+                    # The deadline counts from when a worker picks the job up; a job still
+                    # queued after a full timeout is cancelled and never runs
+                    if not started.wait(timeout_seconds) and future.cancel():
+                        return _timeout_response(timeout_seconds)
+                    started.wait()
+                    return future.result(timeout=timeout_seconds)
+                except FuturesTimeoutError:
+                    # Only stops a job that has not started; a running one finishes in the background
+                    future.cancel()
+                    return _timeout_response(timeout_seconds)
             
             def timeout_signal_handler(signum, frame):
                 raise TimeoutError(f"Function timed out after {timeout_seconds} seconds")
@@ -314,16 +628,7 @@ def timeout_handler(timeout_seconds=30):
                 return result
             except TimeoutError as e:
                 # Create a friendly timeout response
-                query = args[0] if args else kwargs.get('query', 'Unknown query')
-                return {
-                    "response": "I'm sorry, but it took too long to process your request. Please try again or simplify your query.",
-                    "debug": {
-                        "tool_usage": [],
-                        "message_count": 0,
-                        "error": "Request timed out after {} seconds".format(timeout_seconds)
-                    },
-                    "trace_data": None
-                }
+                return _timeout_response(timeout_seconds)
             finally:
                 # Reset the alarm and restore the original handler
                 signal.alarm(0)
@@ -332,31 +637,130 @@ def timeout_handler(timeout_seconds=30):
         return wrapper
     return decorator
 
-# Apply timeout to the get_agent_response function
+# Identical concurrent requests share one agent run
+SINGLEFLIGHT_ENABLED = os.environ.get("SINGLEFLIGHT_ENABLED", "true").lower() not in ("0", "false", "no")
+_agent_singleflight = SingleFlight()
+
+def _coalescing_key(query: str, thread_id: Optional[str] = None, mode: Optional[str] = None):
+    """Requests coalesce when the normalized query, thread, mode and data/knowledge base version match"""
+    return (normalize_query(query), thread_id, mode or AGENT_MODE, get_data_version(), get_collection_version())
+
+def get_agent_response(query: str, thread_id: Optional[str] = None, mode: Optional[str] = None) -> AgentLogicResponse:
+    """
+    Get a response from the agent for a given query, sharing one in-flight
+    execution between concurrent identical requests.
+    
+    Args:
+        query: The user's question
+        thread_id: Optional conversation thread ID; earlier turns of the thread
+            (including their tool results) are available to the agent
+        mode: 'react' (tool-calling loop) or 'planner' (one compiled analytics
+            query); defaults to AGENT_MODE
+        
+    Returns:
+        AgentLogicResponse with response and debug information
+    """
+    # A profiled request runs on its own so the profile covers its execution only
+    if not SINGLEFLIGHT_ENABLED or profiling.is_active():
+        return _run_agent(query, thread_id, mode)
+    response, shared = _agent_singleflight.do(_coalescing_key(query, thread_id, mode),
+                                              lambda: _run_agent(query, thread_id, mode))
+    if shared:
+        logger.info(f"Coalesced request for '{query}' with an in-flight execution.")
+        return response.model_copy(deep=True)
+    return response
+
+def get_coalescing_stats() -> Dict[str, Any]:
+    """Get single-flight execution and coalescing counters"""
+    return _agent_singleflight.stats()
+
+# Apply timeout to the agent run
 @timeout_handler(timeout_seconds=25)
-def get_agent_response(query: str) -> AgentLogicResponse: # Changed return type
+def _run_agent(query: str, thread_id: Optional[str] = None, mode: Optional[str] = None) -> AgentLogicResponse: # Changed return type
     """
     Get a response from the agent for a given query using LangGraph.
     
     Args:
         query: The user's question
+        thread_id: Optional conversation thread ID
+        mode: 'react' or 'planner' (defaults to AGENT_MODE)
         
     Returns:
         Dictionary with response and debug information
     """
+    # Collects per-hop token usage; kept outside the try so failed runs still report it
+    token_tracker = TokenUsageTracker()
+    # Tool calls of this run are traced under this ID (see GET /api/traces)
+    query_id = uuid.uuid4().hex
     try:
+        # Follow-ups in a thread depend on earlier turns, so only self-contained
+        # first turns are served from (and stored in) the semantic cache
+        has_history = bool(thread_id) and bool(
+            conversation_app.get_state(_thread_config(thread_id)).values.get("messages")
+        )
+
+        # Answer high-confidence structured questions directly, without the LLM
+        fast_path_response = try_fast_path(query)
+        if fast_path_response is not None:
+            if thread_id:
+                _record_turn(thread_id, query, fast_path_response.response)
+            return fast_path_response
+
+        # Serve paraphrases of recently answered questions from the semantic cache
+        cache_start = time.perf_counter()
+        cached_response = lookup_response(query) if not has_history else None
+        if cached_response is not None:
+            # The copy describes this request: its own ID, no tokens spent, and the cache route
+            if cached_response.debug is not None:
+                cached_response.debug.query_id = query_id
+                cached_response.debug.token_usage = TokenUsage()
+                cached_response.debug.route = RESPONSE_CACHE_ROUTE
+            record_route(RESPONSE_CACHE_ROUTE, time.perf_counter() - cache_start)
+            if thread_id:
+                _record_turn(thread_id, query, cached_response.response)
+            return cached_response
+
         # Reset tool usage tracker for the new query
         reset_tracker()
+        start_session(query_id)
+        graph_start = time.perf_counter()
         
         # Prepare the initial state for the graph
         initial_state = AgentState(messages=[HumanMessage(content=query)])
+        route = GRAPH_ROUTE
+
+        # Planner mode: one compiled query for analytics questions. Conversation
+        # threads and questions the planner declines go through the ReAct graph.
+        if (mode or AGENT_MODE) == PLANNER_MODE and not thread_id:
+            run_config = {"configurable": {"token_tracker": token_tracker}}
+            final_state = planner_app.invoke(initial_state, config=run_config)
+            if any(isinstance(m, ToolMessage) for m in final_state["messages"]):
+                route = PLANNER_ROUTE
+            else:
+                logger.info("Planner did not compile a query; falling back to the ReAct graph.")
+
+        if route == GRAPH_ROUTE:
+            # Start retrieval for the raw query while the first LLM call is in flight
+            rag_prefetch = start_rag_prefetch(tools, query)
         
-        # Invoke the LangGraph application
-        # Note: We might need to handle streaming or config if needed later
-        final_state = agent_app.invoke(initial_state)
+            # Invoke the LangGraph application
+            # Note: We might need to handle streaming or config if needed later
+            run_config = {"configurable": {"rag_prefetch": rag_prefetch, "token_tracker": token_tracker}}
+            graph_app = agent_app
+            if thread_id:
+                # Only the new message is passed in; the checkpointer supplies the history
+                run_config["configurable"]["thread_id"] = thread_id
+                graph_app = conversation_app
+            try:
+                final_state = graph_app.invoke(initial_state, config=run_config)
+            finally:
+                if rag_prefetch is not None:
+                    rag_prefetch.cancel()
         
         # Extract the final response message
         final_response_message = final_state['messages'][-1]
+        model_tier, escalation_reasons = run_tiers(tool_dedup.current_run(final_state['messages']))
+        record_answer(model_tier)
         response_content = ""
         if isinstance(final_response_message, AIMessage):
             response_content = final_response_message.content
@@ -373,15 +777,26 @@ def get_agent_response(query: str) -> AgentLogicResponse: # Changed return type
         tool_usage_objects = [ToolUsage(**usage) for usage in tracked_usage_raw] if tracked_usage_raw else []
 
 
-        return AgentLogicResponse(
+        agent_response = AgentLogicResponse(
             response=response_content,
             debug=DebugInfo(
                 tool_usage=tool_usage_objects,
                 message_count=len(final_state.get("messages", [])),
-                error=None
+                error=None,
+                route=route,
+                token_usage=token_tracker.summary(),
+                model_tier=model_tier,
+                escalation_reasons=escalation_reasons,
+                query_id=query_id
             ),
             trace_data=None
         )
+        record_route(route, time.perf_counter() - graph_start)
+        # Answers from before warmup finished may lack the RAG tool; they are not cached,
+        # since an unchanged collection keeps the cache version (and the entry) after it
+        if not has_history and warmup_complete():
+            store_response(query, agent_response)
+        return agent_response
     
     except TimeoutError as te:
         # Handle specific timeout error from decorator
@@ -393,7 +808,9 @@ def get_agent_response(query: str) -> AgentLogicResponse: # Changed return type
             debug=DebugInfo(
                 tool_usage=tool_usage_objects,
                 message_count=0, # No final state available
-                error=str(te)
+                error=str(te),
+                token_usage=token_tracker.summary(),
+                query_id=query_id
             ),
             trace_data=None
         )
@@ -406,17 +823,19 @@ def get_agent_response(query: str) -> AgentLogicResponse: # Changed return type
             debug=DebugInfo(
                 tool_usage=tool_usage_objects,
                 message_count=0, # No final state available
-                error=str(e)
+                error=str(e),
+                token_usage=token_tracker.summary(),
+                query_id=query_id
             ),
             trace_data=None
         )
-
-# At the end of the file, re-create the agent app to ensure it uses the latest definitions
-agent_app = create_graph()
+    finally:
+        end_session()
 
 if __name__ == "__main__":
     print("Generating graph visualization...")
     try:
+        from langchain_core.runnables.graph import MermaidDrawMethod
         # The compiled_app.get_graph() method returns an AGraph object (from pygraphviz)
         # which has a draw method.
         # We need to ensure necessary visualization dependencies are installed.
@@ -0,0 +1,168 @@
+"""
+Model cascade: a small, fast model first, escalating to the large model.
+
+Each LLM hop of a run starts on the small tier. The hop is re-run on the large
+tier when the small model's response
+  - plans a multi-tool answer (several tool calls, or a different tool than the
+    ones already used in the run),
+  - looks low-confidence (hedging language, or a low mean token probability
+    when the provider returns logprobs), or
+  - fails validation (unknown tool, arguments that do not match the tool's
+    schema, an empty answer, or product IDs that appear nowhere in the question
+    or tool results).
+Once a run has escalated it stays on the large tier. The tier that produced each
+response is stored in its response_metadata, so it is available from the graph
+state (and from checkpointed conversation threads).
+"""
+import math
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.tools import BaseTool
+
+CASCADE_ENABLED = os.environ.get("CASCADE_ENABLED", "true").lower() not in ("0", "false", "no")
+CASCADE_MIN_CONFIDENCE = float(os.environ.get("CASCADE_MIN_CONFIDENCE", "0.75"))
+
+SMALL_TIER = "small"
+LARGE_TIER = "large"
+
+# Default models per provider and tier; CASCADE_SMALL_MODEL / CASCADE_LARGE_MODEL override them
+DEFAULT_MODELS = {
+    "openai": {SMALL_TIER: "gpt-4o-mini", LARGE_TIER: "gpt-4o"},
+    "anthropic": {SMALL_TIER: "claude-3-haiku-20240307", LARGE_TIER: "claude-3-sonnet-20240229"},
+}
+
+TIER_METADATA_KEY = "model_tier"
+REASON_METADATA_KEY = "escalation_reason"
+
+_HEDGES = re.compile(
+    r"\b(i'?m not sure|i am not sure|i don'?t know|i do not know|not enough information|"
+    r"unable to (?:determine|find|answer)|cannot (?:determine|answer)|can'?t (?:determine|answer)|unclear)\b",
+    re.IGNORECASE,
+)
+_PRODUCT_ID = re.compile(r"\bP\d+\b")
+
+_stats_lock = threading.Lock()
+_answers: Dict[str, int] = {SMALL_TIER: 0, LARGE_TIER: 0}
+_escalations: Dict[str, int] = {"multi_tool": 0, "low_confidence": 0, "validation": 0}
+
+
+def model_for_tier(provider: str, tier: str) -> str:
+    """Model name for a provider ('openai' or 'anthropic') and tier"""
+    override = os.environ.get("CASCADE_SMALL_MODEL" if tier == SMALL_TIER else "CASCADE_LARGE_MODEL")
+    return override or DEFAULT_MODELS[provider][tier]
+
+
+def run_start_tier(run_messages: Sequence[BaseMessage]) -> str:
+    """Tier for the next hop: small unless the cascade is off or the run already escalated"""
+    if not CASCADE_ENABLED:
+        return LARGE_TIER
+    for message in run_messages:
+        if isinstance(message, AIMessage) and message.response_metadata.get(TIER_METADATA_KEY) == LARGE_TIER:
+            return LARGE_TIER
+    return SMALL_TIER
+
+
+def answer_confidence(response: AIMessage) -> Optional[float]:
+    """Geometric-mean token probability from OpenAI logprobs, or None if not reported"""
+    logprobs = (response.response_metadata.get("logprobs") or {}).get("content") or []
+    values = [entry.get("logprob") for entry in logprobs if entry.get("logprob") is not None]
+    if not values:
+        return None
+    return math.exp(sum(values) / len(values))
+
+
+def _invalid_arguments(tool: BaseTool, args: Dict[str, Any]) -> bool:
+    schema = getattr(tool, "args_schema", None)
+    if schema is None or isinstance(schema, dict):
+        return False
+    try:
+        schema.model_validate(args)
+    except Exception:
+        return True
+    return False
+
+
+def escalation_reason(response: AIMessage, run_messages: Sequence[BaseMessage], tools: Sequence[BaseTool]) -> Optional[str]:
+    """
+    Decide whether a small-tier response needs the large model.
+
+    Args:
+        response: The small model's response
+        run_messages: Messages of the current run (the user's question onwards)
+        tools: Tools bound to the model
+
+    Returns:
+        'multi_tool', 'low_confidence' or 'validation', or None to accept the response
+    """
+    tool_calls = response.tool_calls or []
+    if tool_calls:
+        used = {tc.get("name") for m in run_messages if isinstance(m, AIMessage) for tc in (m.tool_calls or [])}
+        if len(tool_calls) > 1 or (used and tool_calls[0].get("name") not in used):
+            return "multi_tool"
+        tools_by_name = {t.name: t for t in tools if t is not None}
+        for tool_call in tool_calls:
+            tool = tools_by_name.get(tool_call.get("name"))
+            if tool is None or _invalid_arguments(tool, tool_call.get("args") or {}):
+                return "validation"
+        return None
+
+    content = response.content if isinstance(response.content, str) else str(response.content)
+    if not content.strip():
+        return "validation"
+    if _HEDGES.search(content):
+        return "low_confidence"
+    confidence = answer_confidence(response)
+    if confidence is not None and confidence < CASCADE_MIN_CONFIDENCE:
+        return "low_confidence"
+    # Product IDs in the answer must come from the question or a tool result
+    context = " ".join(str(m.content) for m in run_messages if not isinstance(m, AIMessage))
+    if set(_PRODUCT_ID.findall(content)) - set(_PRODUCT_ID.findall(context)):
+        return "validation"
+    return None
+
+
+def run_tiers(run_messages: Sequence[BaseMessage]) -> Tuple[Optional[str], List[str]]:
+    """
+    Get the tier of the run's final response and the escalation reasons seen in the run.
+    """
+    final_tier = None
+    reasons = []
+    for message in run_messages:
+        if isinstance(message, AIMessage):
+            final_tier = message.response_metadata.get(TIER_METADATA_KEY, final_tier)
+            reason = message.response_metadata.get(REASON_METADATA_KEY)
+            if reason:
+                reasons.append(reason)
+    return final_tier, reasons
+
+
+def record_escalation(reason: str) -> None:
+    """Count an escalation by reason"""
+    with _stats_lock:
+        _escalations[reason] = _escalations.get(reason, 0) + 1
+
+
+def record_answer(tier: Optional[str]) -> None:
+    """Count which tier produced a request's final answer"""
+    if tier is None:
+        return
+    with _stats_lock:
+        _answers[tier] = _answers.get(tier, 0) + 1
+
+
+def get_cascade_stats() -> Dict[str, Any]:
+    """Get answers per tier, escalations per reason and the small-tier answer rate"""
+    with _stats_lock:
+        answers = dict(_answers)
+        escalations = dict(_escalations)
+    total = sum(answers.values())
+    return {
+        "enabled": CASCADE_ENABLED,
+        "answers": answers,
+        "escalations": escalations,
+        "small_tier_rate": answers.get(SMALL_TIER, 0) / total if total else 0.0,
+    }
@@ -0,0 +1,149 @@
+"""
+Multi-turn conversation support: a bounded in-memory checkpointer for per-thread
+agent state, and helpers that keep message history within a size budget.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Sequence, Set
+
+from langchain_core.messages import BaseMessage, HumanMessage, trim_messages
+from langgraph.checkpoint.memory import MemorySaver
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable through environment variables)
+MAX_CONVERSATION_THREADS = int(os.environ.get("MAX_CONVERSATION_THREADS", "1000"))
+# Checkpoints kept per thread; only the latest is needed to continue a conversation
+MAX_THREAD_CHECKPOINTS = int(os.environ.get("MAX_THREAD_CHECKPOINTS", "1"))
+MAX_THREAD_MESSAGES = int(os.environ.get("MAX_THREAD_MESSAGES", "60"))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "6000"))
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    In-memory checkpointer that keeps only the latest checkpoints of each
+    conversation thread and evicts the least recently used threads.
+    """
+
+    def __init__(self, max_threads: int = MAX_CONVERSATION_THREADS,
+                 max_checkpoints: int = MAX_THREAD_CHECKPOINTS, **kwargs):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.max_checkpoints = max(1, max_checkpoints)
+        self._thread_order: "OrderedDict[str, None]" = OrderedDict()
+        self._order_lock = threading.Lock()
+        # Channel value blobs written per thread and namespace, so pruning and eviction
+        # do not scan every thread's blobs (guarded by _order_lock)
+        self._thread_blobs: Dict[str, Dict[str, Set[tuple]]] = defaultdict(lambda: defaultdict(set))
+        self.evicted_threads = 0
+        self.pruned_checkpoints = 0
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self._order_lock:
+            self._thread_blobs[thread_id][checkpoint_ns].update(
+                (thread_id, checkpoint_ns, channel, version) for channel, version in new_versions.items()
+            )
+        self._prune_thread(thread_id, checkpoint_ns, checkpoint)
+        evict = []
+        with self._order_lock:
+            self._thread_order[thread_id] = None
+            self._thread_order.move_to_end(thread_id)
+            while len(self._thread_order) > self.max_threads:
+                oldest, _ = self._thread_order.popitem(last=False)
+                self._thread_blobs.pop(oldest, None)
+                self.evicted_threads += 1
+                evict.append(oldest)
+        for oldest in evict:
+            logger.info(f"Evicting conversation thread '{oldest}' from the checkpointer.")
+            self.delete_thread(oldest)
+        return result
+
+    def _prune_thread(self, thread_id: str, checkpoint_ns: str, latest) -> None:
+        """Drop all but the newest max_checkpoints checkpoints of a thread, with their writes and unused blobs"""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.max_checkpoints:
+            return
+        # Checkpoint IDs are time-ordered
+        keep = sorted(checkpoints, reverse=True)[:self.max_checkpoints]
+        for checkpoint_id in [checkpoint_id for checkpoint_id in checkpoints if checkpoint_id not in keep]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self.pruned_checkpoints += 1
+        # A checkpoint references the latest version of every channel, including ones written earlier
+        live = set()
+        for checkpoint_id in keep:
+            kept = latest if checkpoint_id == latest["id"] else self.serde.loads_typed(checkpoints[checkpoint_id][0])
+            live.update(kept["channel_versions"].items())
+        with self._order_lock:
+            blob_keys = self._thread_blobs[thread_id][checkpoint_ns]
+            unused = [key for key in blob_keys if (key[2], key[3]) not in live]
+            blob_keys.difference_update(unused)
+        for key in unused:
+            self.blobs.pop(key, None)
+
+    def thread_count(self) -> int:
+        """Number of conversation threads currently held"""
+        with self._order_lock:
+            return len(self._thread_order)
+
+
+def _from_last_human(messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+    """Messages from the most recent human message onward (the current turn)"""
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], HumanMessage):
+            return list(messages[index:])
+    return list(messages)
+
+
+def add_bounded_messages(left: Sequence[BaseMessage], right: Sequence[BaseMessage]) -> List[BaseMessage]:
+    """
+    State reducer that appends messages and drops whole turns from the front
+    once a thread holds more than MAX_THREAD_MESSAGES messages.
+    """
+    messages = list(left) + list(right)
+    if len(messages) <= MAX_THREAD_MESSAGES:
+        return messages
+    # Cut at a human message so no tool result is separated from its tool call
+    window = messages[-MAX_THREAD_MESSAGES:]
+    for index, message in enumerate(window):
+        if isinstance(message, HumanMessage):
+            return window[index:]
+    # The current turn alone exceeds the limit - keep it whole
+    return _from_last_human(messages)
+
+
+def approximate_token_count(messages: Sequence[BaseMessage]) -> int:
+    """Cheap token estimate (~4 characters per token plus per-message overhead)"""
+    total = 0
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        total += 4 + len(content) // 4
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            total += 4 + len(str(tool_call.get("args", ""))) // 4
+    return total
+
+
+def trim_context(messages: Sequence[BaseMessage], max_tokens: int = CONTEXT_TOKEN_BUDGET) -> List[BaseMessage]:
+    """
+    Trim message history to a token budget for the LLM prompt, keeping the most
+    recent turns and always starting on a human message.
+    """
+    if approximate_token_count(messages) <= max_tokens:
+        return list(messages)
+    trimmed = trim_messages(
+        messages,
+        max_tokens=max_tokens,
+        token_counter=approximate_token_count,
+        strategy="last",
+        start_on="human",
+        allow_partial=False,
+    )
+    if not trimmed:
+        # The current turn alone is over budget - it is still needed to answer
+        return _from_last_human(messages)
+    return trimmed
@@ -0,0 +1,240 @@
+"""
+Streaming embedding pipeline for indexing the knowledge base into Qdrant.
+
+Chunks flow through three overlapping stages:
+  1. the caller's iterator loads and chunks documents lazily,
+  2. batches of KB_EMBED_BATCH_SIZE chunks are embedded, in-process or on a
+     pool of worker processes (one model per process, each limited to its
+     share of the CPU threads so the processes do not oversubscribe cores),
+  3. embedded batches are upserted by a background thread, so the next
+     batches embed while the previous one is written.
+At most `max_in_flight` batches are buffered between the stages, so memory
+stays bounded whatever the corpus size. Progress (chunks done, chunks per
+second) is logged every KB_PROGRESS_INTERVAL seconds and passed to an
+optional callback.
+
+Points are written in the payload layout of langchain's Qdrant wrapper
+(page_content / metadata), so the retriever reads them as usual.
+"""
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+KB_EMBED_BATCH_SIZE = int(os.environ.get("KB_EMBED_BATCH_SIZE", "128"))
+# Worker processes for embedding; 0 picks the number of CPU cores
+KB_EMBED_PROCESSES = int(os.environ.get("KB_EMBED_PROCESSES", "0"))
+KB_PROGRESS_INTERVAL = float(os.environ.get("KB_PROGRESS_INTERVAL", "5"))
+
+# (chunk ID, text, metadata)
+Chunk = Tuple[str, str, Dict[str, Any]]
+ProgressCallback = Callable[[int, Optional[int], float], None]
+
+# Embedding model of a worker process (set by _init_worker)
+_worker_embeddings = None
+
+
+def _init_worker(embeddings_factory: Callable[[], Any], threads: int) -> None:
+    global _worker_embeddings
+    # Read by torch / onnxruntime / BLAS when they load, which happens in the factory
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    _worker_embeddings = embeddings_factory()
+
+
+def _embed_in_worker(texts: List[str]) -> List[List[float]]:
+    return _worker_embeddings.embed_documents(texts)
+
+
+def _batches(chunks: Iterable[Chunk], size: int) -> Iterator[List[Chunk]]:
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def default_processes() -> int:
+    """Embedding worker processes to use (KB_EMBED_PROCESSES, or one per CPU core)"""
+    return KB_EMBED_PROCESSES if KB_EMBED_PROCESSES > 0 else (os.cpu_count() or 1)
+
+
+class EmbeddingPipeline:
+    """Embeds a stream of chunks in batches and upserts them into a Qdrant collection"""
+
+    def __init__(self, client, collection_name: str, embeddings=None,
+                 embeddings_factory: Optional[Callable[[], Any]] = None, batch_size: Optional[int] = None,
+                 processes: int = 1, max_in_flight: Optional[int] = None,
+                 progress: Optional[ProgressCallback] = None, progress_interval: Optional[float] = None,
+                 content_payload_key: str = "page_content", metadata_payload_key: str = "metadata"):
+        """
+        Args:
+            client: QdrantClient to upsert into
+            collection_name: Target collection
+            embeddings: Embedding model used in-process (processes <= 1)
+            embeddings_factory: Picklable callable that builds the embedding model
+                in each worker process (processes > 1)
+            batch_size: Chunks per embedding batch and per upsert (default KB_EMBED_BATCH_SIZE)
+            processes: Embedding worker processes; 1 embeds in the calling process
+            max_in_flight: Batches buffered between stages (default 2 per process)
+            progress: Called with (chunks done, total if known, chunks per second)
+            progress_interval: Seconds between progress reports (default KB_PROGRESS_INTERVAL)
+            content_payload_key: Payload key of the chunk text
+            metadata_payload_key: Payload key of the chunk metadata
+        """
+        if processes > 1 and embeddings_factory is None:
+            raise ValueError("embeddings_factory is required to embed in worker processes")
+        if processes <= 1 and embeddings is None:
+            raise ValueError("embeddings is required to embed in-process")
+        self.client = client
+        self.collection_name = collection_name
+        self.embeddings = embeddings
+        self.embeddings_factory = embeddings_factory
+        self.batch_size = batch_size or KB_EMBED_BATCH_SIZE
+        self.processes = max(1, processes)
+        self.max_in_flight = max_in_flight or 2 * self.processes
+        self.progress = progress
+        self.progress_interval = KB_PROGRESS_INTERVAL if progress_interval is None else progress_interval
+        self.content_payload_key = content_payload_key
+        self.metadata_payload_key = metadata_payload_key
+
+        self._done = 0
+        self._total: Optional[int] = None
+        self._start = 0.0
+        self._last_report = 0.0
+        self._upsert_seconds = 0.0
+        self._error: Optional[BaseException] = None
+
+    def _report_progress(self, final: bool = False) -> None:
+        now = time.perf_counter()
+        if not final and now - self._last_report < self.progress_interval:
+            return
+        self._last_report = now
+        rate = self._done / max(now - self._start, 1e-9)
+        total = f"/{self._total}" if self._total is not None else ""
+        logger.info(f"Indexed {self._done}{total} chunks into '{self.collection_name}' ({rate:.1f} chunks/s)")
+        if self.progress is not None:
+            self.progress(self._done, self._total, rate)
+
+    def _upsert(self, batch: List[Chunk], vectors: List[List[float]]) -> None:
+        from qdrant_client import models
+
+        start = time.perf_counter()
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=[
+                models.PointStruct(id=chunk_id, vector=vector,
+                                   payload={self.content_payload_key: text, self.metadata_payload_key: metadata})
+                for (chunk_id, text, metadata), vector in zip(batch, vectors)
+            ],
+            wait=True,
+        )
+        self._upsert_seconds += time.perf_counter() - start
+        self._done += len(batch)
+        self._report_progress()
+
+    def _upsert_loop(self, batches: "queue.Queue") -> None:
+        while True:
+            item = batches.get()
+            if item is None:
+                return
+            if self._error is not None:
+                continue  # Keep draining so the producer never blocks
+            try:
+                self._upsert(*item)
+            except BaseException as e:
+                self._error = e
+
+    def run(self, chunks: Iterable[Chunk], total: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Embed and upsert every chunk of the stream.
+
+        Args:
+            chunks: (chunk ID, text, metadata) tuples, consumed lazily
+            total: Number of chunks, if known (for progress reports only)
+
+        Returns:
+            Counts and timings: chunks, batches, seconds, chunks_per_second,
+            upsert_seconds and embed_wait_seconds (time spent waiting for vectors)
+
+        Raises:
+            The first embedding or upsert error; chunks upserted before it stay written
+        """
+        self._done, self._total, self._error, self._upsert_seconds = 0, total, None, 0.0
+        self._start = self._last_report = time.perf_counter()
+        embed_wait = 0.0
+        batch_count = 0
+
+        to_upsert: "queue.Queue" = queue.Queue(maxsize=self.max_in_flight)
+        writer = threading.Thread(target=self._upsert_loop, args=(to_upsert,), name="kb-upsert", daemon=True)
+        writer.start()
+        executor = None
+        if self.processes > 1:
+            threads = max(1, math.floor((os.cpu_count() or 1) / self.processes))
+            # spawn, not fork: the server process has threads (and possibly a loaded model)
+            executor = ProcessPoolExecutor(
+                max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(self.embeddings_factory, threads),
+            )
+        pending: deque = deque()
+
+        def hand_off(batch, vectors):
+            to_upsert.put((batch, vectors))
+            if self._error is not None:
+                raise self._error
+
+        try:
+            for batch in _batches(chunks, self.batch_size):
+                batch_count += 1
+                texts = [text for _, text, _ in batch]
+                if executor is None:
+                    wait_start = time.perf_counter()
+                    vectors = self.embeddings.embed_documents(texts)
+                    embed_wait += time.perf_counter() - wait_start
+                    hand_off(batch, vectors)
+                    continue
+                pending.append((batch, executor.submit(_embed_in_worker, texts)))
+                while len(pending) >= self.max_in_flight:
+                    done_batch, future = pending.popleft()
+                    wait_start = time.perf_counter()
+                    vectors = future.result()
+                    embed_wait += time.perf_counter() - wait_start
+                    hand_off(done_batch, vectors)
+            while pending:
+                done_batch, future = pending.popleft()
+                wait_start = time.perf_counter()
+                vectors = future.result()
+                embed_wait += time.perf_counter() - wait_start
+                hand_off(done_batch, vectors)
+        finally:
+            to_upsert.put(None)
+            writer.join()
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+        if self._error is not None:
+            raise self._error
+
+        seconds = time.perf_counter() - self._start
+        if self._done:
+            self._report_progress(final=True)
+        return {
+            "chunks": self._done,
+            "batches": batch_count,
+            "batch_size": self.batch_size,
+            "processes": self.processes,
+            "seconds": seconds,
+            "chunks_per_second": self._done / seconds if seconds > 0 else 0.0,
+            "upsert_seconds": self._upsert_seconds,
+            "embed_wait_seconds": embed_wait,
+        }
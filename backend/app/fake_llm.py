@@ -0,0 +1,206 @@
+"""
+Offline scripted chat model for deterministic load testing.
+
+Selected with LLM_PROVIDER=fake. The model never touches the network: it picks
+tool calls from recorded traces (the evaluation_results.json format written by
+evaluation.py) or, failing that, from simple keyword rules, and answers from
+the tool results once they come back. Artificial latency, a slow tail and
+retryable errors can be configured to emulate a remote model while measuring
+our own overhead (see fake_llm_server.py to serve it over HTTP).
+"""
+import json
+import logging
+import os
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable through environment variables)
+FAKE_LLM_TRACES = os.environ.get("FAKE_LLM_TRACES", "")
+FAKE_LLM_LATENCY_MS = float(os.environ.get("FAKE_LLM_LATENCY_MS", "0"))
+FAKE_LLM_JITTER_MS = float(os.environ.get("FAKE_LLM_JITTER_MS", "0"))
+# Tail emulation: a share of calls is slow or fails with a retryable server error
+FAKE_LLM_SLOW_RATE = float(os.environ.get("FAKE_LLM_SLOW_RATE", "0"))
+FAKE_LLM_SLOW_MS = float(os.environ.get("FAKE_LLM_SLOW_MS", "0"))
+FAKE_LLM_ERROR_RATE = float(os.environ.get("FAKE_LLM_ERROR_RATE", "0"))
+
+_PRODUCT_ID = re.compile(r"\bP\d+\b", re.IGNORECASE)
+_DAYS = re.compile(r"\b(\d+)\s+days?\b")
+
+
+class FakeLLMServerError(Exception):
+    """Emulated provider 5xx error (retryable)"""
+    status_code = 503
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def load_traces(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Load recorded agent traces keyed by normalized question.
+
+    Args:
+        path: JSON file in the evaluation_results.json format
+            ([{"question": ..., "answer": {"response": ..., "debug": {"tool_usage": [...]}}}])
+
+    Returns:
+        Dict of normalized question -> {"tool_calls": [(tool, args), ...], "response": str}
+    """
+    with open(path) as f:
+        records = json.load(f)
+
+    traces = {}
+    for record in records:
+        answer = record.get("answer") or {}
+        tool_calls = []
+        for usage in (answer.get("debug") or {}).get("tool_usage") or []:
+            call = (usage["tool"], usage.get("input") or {})
+            # The tracker may record a call twice (start and result) - keep one
+            if not tool_calls or tool_calls[-1] != call:
+                tool_calls.append(call)
+        traces[_normalize(record["question"])] = {
+            "tool_calls": tool_calls,
+            "response": answer.get("response", ""),
+        }
+    logger.info(f"Loaded {len(traces)} scripted traces from {path}")
+    return traces
+
+
+def rule_based_tool_call(query: str, tool_names: Sequence[str]) -> Optional[tuple]:
+    """Pick a (tool, args) pair for a question with keyword rules; None to answer directly"""
+    text = query.lower()
+    days_match = _DAYS.search(text)
+    days = int(days_match.group(1)) if days_match else 30
+    product_match = _PRODUCT_ID.search(query)
+
+    if product_match:
+        product_id = product_match.group(0).upper()
+        if re.search(r"remaining|run out|days of stock|status", text):
+            call = ("estimate_days_of_stock_remaining", {"product_id": product_id, "days_to_analyze": days})
+        elif re.search(r"sales|sold|revenue|velocity", text):
+            call = ("get_sales_data_for_product", {"product_id": product_id, "days": days})
+        elif re.search(r"stock|inventory|units", text):
+            call = ("get_inventory_level", {"product_id": product_id})
+        else:
+            call = ("get_product_info", {"product_id": product_id})
+    elif re.search(r"top|best[- ]?sell", text):
+        call = ("get_top_selling_products", {"days": days, "limit": 5})
+    elif re.search(r"low stock|low on stock|reorder|less than \d+ units", text):
+        call = ("list_low_stock_products", {"threshold": 10})
+    elif re.search(r"list (all )?products|what products", text):
+        call = ("list_products", {"limit": 10})
+    else:
+        call = ("query_internal_documents", {"query": query})
+
+    return call if call[0] in tool_names else None
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that returns scripted tool calls and answers without any network access"""
+
+    traces: Dict[str, Dict[str, Any]] = {}
+    tool_names: List[str] = []
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    slow_rate: float = 0.0
+    slow_ms: float = 0.0
+    error_rate: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "ScriptedChatModel":
+        """Record the available tool names (the scripted model only calls bound tools)"""
+        return self.model_copy(update={"tool_names": [getattr(t, "name", str(t)) for t in tools]})
+
+    def _sleep(self) -> None:
+        delay_ms = self.latency_ms
+        if self.jitter_ms:
+            delay_ms += random.uniform(-self.jitter_ms, self.jitter_ms)
+        if self.slow_rate and random.random() < self.slow_rate:
+            delay_ms += self.slow_ms
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+    def _next_message(self, messages: Sequence[BaseMessage]) -> AIMessage:
+        # Locate the current turn: everything after the last human message
+        last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=None)
+        if last_human is None:
+            return AIMessage(content="How can I help you?")
+        query = messages[last_human].content
+        turn = messages[last_human + 1:]
+        calls_made = sum(1 for m in turn if isinstance(m, AIMessage) and m.tool_calls)
+
+        trace = self.traces.get(_normalize(query))
+        if trace is not None:
+            planned = [c for c in trace["tool_calls"] if c[0] in self.tool_names]
+            if calls_made < len(planned):
+                name, args = planned[calls_made]
+                return self._tool_call_message(name, args)
+            return AIMessage(content=trace["response"])
+
+        if calls_made == 0:
+            call = rule_based_tool_call(query, self.tool_names)
+            if call is not None:
+                return self._tool_call_message(*call)
+            return AIMessage(content=f"I can't look that up, but here is my answer to: {query}")
+
+        tool_results = [m.content for m in turn if isinstance(m, ToolMessage)]
+        summary = tool_results[-1] if tool_results else ""
+        return AIMessage(content=f"Here is what I found: {summary[:500]}")
+
+    @staticmethod
+    def _tool_call_message(name: str, args: Dict[str, Any]) -> AIMessage:
+        return AIMessage(content="", tool_calls=[{"name": name, "args": dict(args), "id": f"call_{uuid.uuid4().hex[:24]}"}])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self._sleep()
+        if self.error_rate and random.random() < self.error_rate:
+            raise FakeLLMServerError("Emulated provider error")
+        message = self._next_message(messages)
+        # Report approximate token usage like a real provider would
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        output_tokens = max(1, len(str(message.content)) // 4)
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+_fake_llm: Optional[ScriptedChatModel] = None
+
+
+def get_fake_llm() -> ScriptedChatModel:
+    """Get the shared scripted model configured from the environment"""
+    global _fake_llm
+    if _fake_llm is None:
+        traces = load_traces(FAKE_LLM_TRACES) if FAKE_LLM_TRACES else {}
+        _fake_llm = ScriptedChatModel(
+            traces=traces,
+            latency_ms=FAKE_LLM_LATENCY_MS,
+            jitter_ms=FAKE_LLM_JITTER_MS,
+            slow_rate=FAKE_LLM_SLOW_RATE,
+            slow_ms=FAKE_LLM_SLOW_MS,
+            error_rate=FAKE_LLM_ERROR_RATE,
+        )
+    return _fake_llm
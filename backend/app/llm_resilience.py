@@ -0,0 +1,300 @@
+"""
+Latency-aware timeouts, retries and hedging for LLM calls.
+
+Every call made through resilient_invoke() is bounded by an adaptive timeout
+(a multiple of the observed p99 latency for that model, clamped to a range).
+Timeouts and retryable errors (connection errors, 429s, 5xx) are retried with
+full-jitter exponential backoff inside an overall deadline. If the first
+request has not answered after the observed p95 latency, an identical hedged
+request is sent and whichever answers first wins.
+
+Calls run on a shared thread pool, in a copy of the caller's context; a losing
+or timed-out request cannot be interrupted and finishes in the background (the
+client-side timeout set on the chat model bounds how long that takes). Its
+answer is handed to the caller's on_discarded callback so its tokens are still
+accounted for.
+"""
+import contextvars
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable through environment variables)
+LLM_TIMEOUT_DEFAULT = float(os.environ.get("LLM_TIMEOUT_DEFAULT", "15"))
+LLM_TIMEOUT_MIN = float(os.environ.get("LLM_TIMEOUT_MIN", "5"))
+LLM_TIMEOUT_MAX = float(os.environ.get("LLM_TIMEOUT_MAX", "20"))
+LLM_TIMEOUT_P99_MULTIPLIER = float(os.environ.get("LLM_TIMEOUT_P99_MULTIPLIER", "2.0"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", "4"))
+LLM_CALL_DEADLINE = float(os.environ.get("LLM_CALL_DEADLINE", "22"))
+LLM_HEDGE_ENABLED = os.environ.get("LLM_HEDGE_ENABLED", "true").lower() not in ("0", "false", "no")
+LLM_LATENCY_MIN_SAMPLES = int(os.environ.get("LLM_LATENCY_MIN_SAMPLES", "20"))
+LLM_LATENCY_WINDOW = int(os.environ.get("LLM_LATENCY_WINDOW", "200"))
+LLM_WORKERS = int(os.environ.get("LLM_WORKERS", "32"))
+
+# Provider timeout/connection/overload errors (openai, anthropic). A builtin
+# TimeoutError is deliberately absent: it is how the request deadline
+# (timeout_handler's SIGALRM) surfaces, and retrying would defeat it.
+_RETRYABLE_ERROR_NAMES = {"APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError"}
+
+
+class LLMCallTimeout(TimeoutError):
+    """Raised when every attempt of an LLM call timed out"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Connection errors, timeouts, rate limits and 5xx responses are worth retrying"""
+    if type(error).__name__ in _RETRYABLE_ERROR_NAMES:
+        return True
+    status_code = getattr(error, "status_code", None)
+    return isinstance(status_code, int) and (status_code == 429 or status_code >= 500)
+
+
+def backoff_delay(attempt: int, base: float = LLM_BACKOFF_BASE, cap: float = LLM_BACKOFF_MAX) -> float:
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**attempt))"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class LatencyTracker:
+    """Sliding window of successful call latencies for one model"""
+
+    def __init__(self, window: int = LLM_LATENCY_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Nearest-rank percentile (q in 0-100), or None without samples"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = max(0, math.ceil(q / 100 * len(samples)) - 1)
+        return samples[rank]
+
+    def timeout(self) -> float:
+        """Per-attempt timeout: p99 x multiplier clamped to [min, max], or the default while warming up"""
+        if self.count() < LLM_LATENCY_MIN_SAMPLES:
+            return LLM_TIMEOUT_DEFAULT
+        return min(LLM_TIMEOUT_MAX, max(LLM_TIMEOUT_MIN, self.percentile(99) * LLM_TIMEOUT_P99_MULTIPLIER))
+
+    def hedge_delay(self) -> Optional[float]:
+        """Delay before sending a hedged request (the p95 latency), or None while warming up"""
+        if not LLM_HEDGE_ENABLED or self.count() < LLM_LATENCY_MIN_SAMPLES:
+            return None
+        return self.percentile(95)
+
+
+# How often a waiting caller checks whether its queued request has started
+_QUEUE_POLL_SECONDS = 0.005
+
+_executor = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm-call")
+_trackers: Dict[str, LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"calls": 0, "attempts": 0, "retries": 0, "timeouts": 0, "errors": 0,
+          "failures": 0, "hedges": 0, "hedge_wins": 0}
+
+
+def get_latency_tracker(key: str) -> LatencyTracker:
+    """Get (or create) the latency tracker for a model"""
+    with _trackers_lock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            tracker = _trackers[key] = LatencyTracker()
+        return tracker
+
+
+def _count(name: str, amount: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def _attempt(fn: Callable[[], Any], tracker: LatencyTracker, timeout: float, deadline_at: float,
+             on_discarded: Optional[Callable[[Any, float], None]] = None) -> Any:
+    """
+    One attempt: the primary request plus an optional hedge; first success wins.
+
+    The per-attempt timeout and the hedge delay count from when the primary
+    request starts running, not from when it was queued on the pool. No hedge
+    is sent while the primary is still queued: the pool is saturated and a
+    hedge would only add to the queue. Time in the queue is still bounded by
+    the overall deadline.
+    """
+    # future -> perf_counter() when its request started running (set by the worker)
+    started: Dict[Future, Dict[str, float]] = {}
+
+    def submit() -> Future:
+        start: Dict[str, float] = {}
+
+        def run():
+            start["at"] = time.perf_counter()
+            return fn()
+
+        # Run in a copy of the caller's context so request-scoped state
+        # (token usage, tool-log session, profile) is visible inside the call
+        future = _executor.submit(contextvars.copy_context().run, run)
+        started[future] = start
+        return future
+
+    def finish_in_background(future: Future) -> None:
+        # A request that already started cannot be cancelled; account for its answer when it lands
+        if future.cancel() or on_discarded is None:
+            return
+
+        def done(f: Future) -> None:
+            if not f.cancelled() and f.exception() is None:
+                on_discarded(f.result(), time.perf_counter() - started[f].get("at", time.perf_counter()))
+        future.add_done_callback(done)
+
+    primary = submit()
+    pending = {primary}
+    hedge = None
+    hedge_delay = tracker.hedge_delay()
+    if hedge_delay is not None and hedge_delay >= timeout:
+        hedge_delay = None
+
+    last_error: Optional[BaseException] = None
+    while pending:
+        now = time.perf_counter()
+        primary_start = started[primary].get("at")
+        if primary_start is None:
+            # Still queued: poll until it starts, so its timeout and hedge delay can be scheduled
+            attempt_end = min(now + timeout, deadline_at)
+            next_event = min(attempt_end, now + _QUEUE_POLL_SECONDS)
+        else:
+            attempt_end = min(primary_start + timeout, deadline_at)
+            next_event = attempt_end
+            if hedge is None and hedge_delay is not None and primary in pending:
+                hedge_at = primary_start + hedge_delay
+                if now >= hedge_at:
+                    hedge = submit()
+                    pending.add(hedge)
+                    _count("hedges")
+                else:
+                    next_event = min(next_event, hedge_at)
+        if now >= attempt_end:
+            break
+        done, pending = wait(pending, timeout=max(0.0, next_event - now), return_when=FIRST_COMPLETED)
+        for future in done:
+            error = future.exception()
+            if error is None:
+                tracker.observe(time.perf_counter() - started[future]["at"])
+                if future is hedge:
+                    _count("hedge_wins")
+                for other in pending:
+                    finish_in_background(other)
+                return future.result()
+            last_error = error
+    for other in pending:
+        finish_in_background(other)
+    if last_error is not None and not pending:
+        raise last_error
+    # Count the timeout in the window so the percentiles reflect the tail
+    tracker.observe(timeout)
+    raise LLMCallTimeout(f"LLM call timed out after {timeout:.1f}s")
+
+
+def resilient_invoke(fn: Callable[[], Any], key: str, deadline: float = LLM_CALL_DEADLINE,
+                     max_retries: int = LLM_MAX_RETRIES,
+                     on_discarded: Optional[Callable[[Any, float], None]] = None) -> Any:
+    """
+    Call an LLM with an adaptive timeout, jittered retries and hedging.
+
+    Args:
+        fn: Zero-argument callable making the request (e.g. lambda: llm.invoke(messages))
+        key: Model label; latency percentiles are tracked per key
+        deadline: Overall time budget for all attempts, in seconds
+        max_retries: Retries after the first attempt
+        on_discarded: Called with (result, seconds) when a request that lost the
+            race (a hedge or primary still running) answers later; it was
+            billed, so callers can record its token usage
+
+    Returns:
+        The first successful result
+
+    Raises:
+        LLMCallTimeout if the attempts time out; the last error for non-retryable
+        failures or when retries are exhausted. A plain TimeoutError (e.g. the
+        request deadline's SIGALRM firing while we wait) is never retried.
+    """
+    tracker = get_latency_tracker(key)
+    start = time.perf_counter()
+    _count("calls")
+    error: Optional[BaseException] = None
+    for attempt in range(max_retries + 1):
+        remaining = deadline - (time.perf_counter() - start)
+        timeout = min(tracker.timeout(), remaining)
+        if timeout <= 0:
+            break
+        _count("attempts")
+        try:
+            return _attempt(fn, tracker, timeout, start + deadline, on_discarded)
+        except LLMCallTimeout as e:
+            _count("timeouts")
+            error = e
+        except TimeoutError:
+            # Not ours: the caller's deadline expired, so stop instead of retrying
+            _count("failures")
+            raise
+        except Exception as e:
+            _count("errors")
+            if not is_retryable(e):
+                _count("failures")
+                raise
+            error = e
+        if attempt == max_retries:
+            break
+        delay = min(backoff_delay(attempt), max(0.0, deadline - (time.perf_counter() - start)))
+        logger.warning(f"LLM call to {key} failed ({type(error).__name__}: {error}); retrying in {delay:.2f}s "
+                       f"(attempt {attempt + 2}/{max_retries + 1}).")
+        _count("retries")
+        time.sleep(delay)
+    _count("failures")
+    raise error or LLMCallTimeout(f"LLM call deadline of {deadline:.1f}s exhausted")
+
+
+def get_llm_resilience_stats() -> Dict[str, Any]:
+    """Get retry/timeout/hedge counters, the hedge win rate and per-model latency percentiles"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["hedge_win_rate"] = stats["hedge_wins"] / stats["hedges"] if stats["hedges"] else 0.0
+    with _trackers_lock:
+        trackers = dict(_trackers)
+    stats["models"] = {
+        key: {
+            "samples": tracker.count(),
+            "p50_seconds": tracker.percentile(50),
+            "p95_seconds": tracker.percentile(95),
+            "p99_seconds": tracker.percentile(99),
+            "timeout_seconds": tracker.timeout(),
+            "hedge_delay_seconds": tracker.hedge_delay(),
+        }
+        for key, tracker in trackers.items()
+    }
+    return stats
+
+
+def reset_llm_resilience() -> None:
+    """Clear latency windows and counters"""
+    with _trackers_lock:
+        _trackers.clear()
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,108 @@
+"""
+Logging policy for large payloads (retrieved documents, tool outputs, responses).
+
+Payloads are never formatted into log messages eagerly. Wrap them instead:
+  - truncated(value): renders at most LOG_PAYLOAD_MAX_BYTES of the value,
+  - digest(value): renders a short hash and size, for when the content itself
+    is not needed (e.g. correlating identical responses),
+and pass them as %-style arguments, so formatting only happens if a handler
+emits the record:
+
+    logger.info("Streaming response %s", digest(content))
+
+log_payload() logs a full (truncated) payload at DEBUG for a sampled share of
+calls (LOG_PAYLOAD_SAMPLE_RATE), and skips the work entirely when DEBUG is off.
+"""
+import hashlib
+import logging
+import os
+import random
+import threading
+from typing import Any, Dict
+
+LOG_PAYLOAD_MAX_BYTES = int(os.environ.get("LOG_PAYLOAD_MAX_BYTES", "512"))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+
+_stats_lock = threading.Lock()
+_stats = {"payloads_logged": 0, "payloads_sampled_out": 0}
+
+
+def _text(value: Any) -> str:
+    return value if isinstance(value, str) else repr(value)
+
+
+class truncated:
+    """Lazily rendered payload, cut to a byte cap with a note of how much was dropped"""
+    __slots__ = ("value", "max_bytes")
+
+    def __init__(self, value: Any, max_bytes: int = None):
+        self.value = value
+        self.max_bytes = LOG_PAYLOAD_MAX_BYTES if max_bytes is None else max_bytes
+
+    def __str__(self) -> str:
+        data = _text(self.value).encode("utf-8", "replace")
+        if len(data) <= self.max_bytes:
+            return data.decode("utf-8", "replace")
+        return f"{data[:self.max_bytes].decode('utf-8', 'ignore')}... [{len(data) - self.max_bytes} more bytes]"
+
+    __repr__ = __str__
+
+
+class digest:
+    """Lazily rendered hash and size of a payload"""
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __str__(self) -> str:
+        hasher = hashlib.sha256()
+        size = 0
+        # Retrieved documents are hashed by content, which is far cheaper than their repr
+        if isinstance(self.value, (list, tuple)) and self.value and all(hasattr(v, "page_content") for v in self.value):
+            parts = [str(v.page_content).encode("utf-8", "replace") for v in self.value]
+        else:
+            parts = [_text(self.value).encode("utf-8", "replace")]
+        for part in parts:
+            hasher.update(part)
+            size += len(part)
+        return f"<sha256:{hasher.hexdigest()[:12]} {size} bytes>"
+
+    __repr__ = __str__
+
+
+def log_payload(logger: logging.Logger, label: str, value: Any, level: int = logging.DEBUG,
+                sample_rate: float = None) -> bool:
+    """
+    Log a truncated payload for a sampled share of calls.
+
+    Args:
+        logger: Logger to write to
+        label: Message prefix
+        value: Payload to log (formatted only if the record is emitted)
+        level: Log level (DEBUG by default)
+        sample_rate: Share of calls that log (default LOG_PAYLOAD_SAMPLE_RATE)
+
+    Returns:
+        True if the payload was logged
+    """
+    if not logger.isEnabledFor(level):
+        return False
+    rate = LOG_PAYLOAD_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate < 1.0 and random.random() >= rate:
+        with _stats_lock:
+            _stats["payloads_sampled_out"] += 1
+        return False
+    logger.log(level, "%s %s", label, truncated(value))
+    with _stats_lock:
+        _stats["payloads_logged"] += 1
+    return True
+
+
+def get_log_policy_stats() -> Dict[str, Any]:
+    """Get payload logging counters and the active policy"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["max_bytes"] = LOG_PAYLOAD_MAX_BYTES
+    stats["sample_rate"] = LOG_PAYLOAD_SAMPLE_RATE
+    return stats
@@ -0,0 +1,210 @@
+"""
+Append-only JSONL writer with a background group-commit thread.
+
+Callers serialize each record to one JSON line (so later mutation of the
+record cannot change what is logged), hand it to a bounded queue and return
+immediately; a daemon thread drains the queue in batches, appends each batch
+to its file with a single write, and optionally fsyncs.
+Logging therefore never blocks the request path:
+  - below the high watermark every record is queued,
+  - above it (TOOL_LOG_OVERFLOW=sample) records are kept with probability
+    TOOL_LOG_SAMPLE_RATE,
+  - when the queue is full (or TOOL_LOG_OVERFLOW=drop above the watermark)
+    records are dropped and counted.
+
+fsync policy (TOOL_LOG_FSYNC): 'off' leaves durability to the OS, 'batch'
+fsyncs after every group commit, 'interval' at most every
+TOOL_LOG_FSYNC_INTERVAL seconds.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable through environment variables)
+TOOL_LOG_QUEUE_SIZE = int(os.environ.get("TOOL_LOG_QUEUE_SIZE", "10000"))
+TOOL_LOG_BATCH_SIZE = int(os.environ.get("TOOL_LOG_BATCH_SIZE", "256"))
+TOOL_LOG_FLUSH_INTERVAL = float(os.environ.get("TOOL_LOG_FLUSH_INTERVAL", "0.2"))
+TOOL_LOG_FSYNC = os.environ.get("TOOL_LOG_FSYNC", "interval").lower()
+TOOL_LOG_FSYNC_INTERVAL = float(os.environ.get("TOOL_LOG_FSYNC_INTERVAL", "1.0"))
+TOOL_LOG_OVERFLOW = os.environ.get("TOOL_LOG_OVERFLOW", "sample").lower()
+TOOL_LOG_HIGH_WATERMARK = float(os.environ.get("TOOL_LOG_HIGH_WATERMARK", "0.8"))
+TOOL_LOG_SAMPLE_RATE = float(os.environ.get("TOOL_LOG_SAMPLE_RATE", "0.1"))
+TOOL_LOG_MAX_RECORD_BYTES = int(os.environ.get("TOOL_LOG_MAX_RECORD_BYTES", "65536"))
+
+
+def _serialize(record: Dict[str, Any], max_bytes: int = TOOL_LOG_MAX_RECORD_BYTES) -> str:
+    """One JSON line; an oversized output is replaced by a truncated preview"""
+    line = json.dumps(record, default=str)
+    if len(line) > max_bytes and "output" in record:
+        output = json.dumps(record["output"], default=str)
+        record = {**record, "output": output[:max_bytes // 2], "output_truncated": True, "output_bytes": len(output)}
+        line = json.dumps(record, default=str)
+    return line
+
+
+class JsonlLogWriter:
+    """Bounded queue of (path, record, line) entries, appended to JSONL files by a background thread"""
+
+    def __init__(self, queue_size: int = TOOL_LOG_QUEUE_SIZE, batch_size: int = TOOL_LOG_BATCH_SIZE,
+                 flush_interval: float = TOOL_LOG_FLUSH_INTERVAL, fsync: str = TOOL_LOG_FSYNC,
+                 overflow: str = TOOL_LOG_OVERFLOW):
+        self._queue: "queue.Queue[Optional[Tuple[str, Dict[str, Any], str]]]" = queue.Queue(maxsize=queue_size)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._fsync = fsync
+        self._overflow = overflow
+        self._high_watermark = int(queue_size * TOOL_LOG_HIGH_WATERMARK)
+        self._last_fsync = time.monotonic()
+        self._unsynced: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stats = {"enqueued": 0, "written": 0, "dropped": 0, "sampled_out": 0,
+                       "batches": 0, "fsyncs": 0, "write_errors": 0}
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="jsonl-log-writer", daemon=True)
+                self._thread.start()
+
+    def write(self, path: str, record: Dict[str, Any]) -> bool:
+        """
+        Queue a record for appending to a JSONL file. Never blocks.
+
+        Returns:
+            True if the record was queued, False if it was dropped, sampled out or not serializable
+        """
+        self._ensure_started()
+        if self._queue.qsize() >= self._high_watermark:
+            if self._overflow != "sample":
+                self._count("dropped")
+                return False
+            if random.random() >= TOOL_LOG_SAMPLE_RATE:
+                self._count("sampled_out")
+                return False
+        try:
+            line = _serialize(record)
+        except (TypeError, ValueError) as e:
+            # e.g. a circular reference; the writer thread never sees the record
+            logger.warning(f"Could not serialize a record for {path}: {e}")
+            self._count("write_errors")
+            return False
+        try:
+            # A shallow copy keeps the top-level fields (used for indexing) as they were at write time
+            self._queue.put_nowait((path, dict(record), line))
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("enqueued")
+        return True
+
+    def _next_batch(self) -> List[Optional[Tuple[str, Dict[str, Any], str]]]:
+        batch = [self._queue.get()]
+        # Wait briefly for more records so bursts are committed together
+        deadline = time.monotonic() + self._flush_interval
+        while len(batch) < self._batch_size and batch[-1] is not None:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit(self, records: List[Tuple[str, Dict[str, Any], str]]) -> None:
+        lines_by_path: Dict[str, List[str]] = defaultdict(list)
+        for path, _, line in records:
+            lines_by_path[path].append(line)
+        for path, lines in lines_by_path.items():
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+                    f.flush()
+                    if self._fsync == "batch":
+                        os.fsync(f.fileno())
+                        self._count("fsyncs")
+                    elif self._fsync == "interval":
+                        self._unsynced.add(path)
+                self._count("written", len(lines))
+            except OSError as e:
+                logger.warning(f"Could not append {len(lines)} record(s) to {path}: {e}")
+                self._count("write_errors", len(lines))
+        self._count("batches")
+        if self._fsync == "interval" and self._unsynced and time.monotonic() - self._last_fsync >= TOOL_LOG_FSYNC_INTERVAL:
+            self._sync_pending()
+
+    def _sync_pending(self) -> None:
+        for path in self._unsynced:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                self._count("fsyncs")
+            except OSError as e:
+                logger.warning(f"Could not fsync {path}: {e}")
+        self._unsynced.clear()
+        self._last_fsync = time.monotonic()
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            records = [item for item in batch if item is not None]
+            if records:
+                try:
+                    self._commit(records)
+                except Exception as e:
+                    # Keep the writer thread alive and the queue's task count balanced
+                    logger.exception(f"Could not commit {len(records)} record(s): {e}")
+                    self._count("write_errors", len(records))
+            # None is a flush marker: everything queued before it is now written
+            for item in batch:
+                if item is None:
+                    if self._unsynced:
+                        self._sync_pending()
+                    self._queue.task_done()
+            for _ in records:
+                self._queue.task_done()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Wait until everything queued so far is written (and fsynced unless fsync is off).
+
+        Returns:
+            True if the queue drained within the timeout
+        """
+        if self._thread is None:
+            return True
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return False
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return not self._queue.unfinished_tasks
+
+    def stats(self) -> Dict[str, Any]:
+        """Get writer counters and the current queue depth"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["fsync_policy"] = self._fsync
+        stats["overflow_policy"] = self._overflow
+        return stats
+
@@ -0,0 +1,214 @@
+"""
+Prometheus metrics for the agent pipeline.
+
+Latency histograms are observed on the request path (a single observation per
+event); cache, prefetch and coalescing statistics are read from their owning
+modules only when /metrics is scraped.
+"""
+import time
+from typing import Callable, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from . import profiling
+
+# Buckets (seconds) spanning in-process tool calls up to slow LLM round-trips
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+REQUEST_DURATION = Histogram(
+    "agent_request_duration_seconds", "End-to-end agent request duration by route", ["route"], buckets=LATENCY_BUCKETS
+)
+NODE_DURATION = Histogram(
+    "agent_node_duration_seconds", "LangGraph node execution time", ["node"], buckets=LATENCY_BUCKETS
+)
+LLM_DURATION = Histogram(
+    "agent_llm_call_duration_seconds", "LLM call latency", ["model"], buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Histogram(
+    "agent_llm_call_tokens", "Tokens per LLM call", ["model", "kind"], buckets=TOKEN_BUCKETS
+)
+LLM_TOKENS_TOTAL = Counter(
+    "agent_llm_tokens_total", "Total tokens across LLM calls", ["model", "kind"]
+)
+LLM_PROMPT_TOKENS_BY_TOOL = Counter(
+    "agent_llm_prompt_tokens_by_tool_total",
+    "Prompt tokens of LLM calls, attributed to the tool results new in the prompt ('none' for the first hop)",
+    ["tool"],
+)
+TOOL_DURATION = Histogram(
+    "agent_tool_duration_seconds", "Tool execution time", ["tool", "status"], buckets=LATENCY_BUCKETS
+)
+RETRIEVAL_DURATION = Histogram(
+    "agent_retrieval_duration_seconds", "Knowledge base retrieval latency", ["source"], buckets=LATENCY_BUCKETS
+)
+
+
+def timed_node(name: str, node: Callable) -> Callable:
+    """Wrap a graph node (state, config) so its duration is recorded"""
+    # Not functools.wraps: LangGraph inspects this signature to decide whether to pass config
+    def wrapper(state, config: RunnableConfig = None):
+        start = time.perf_counter()
+        try:
+            return node(state, config)
+        finally:
+            elapsed = time.perf_counter() - start
+            NODE_DURATION.labels(node=name).observe(elapsed)
+            # Per-request profiling (opt-in); a single integer check otherwise
+            if profiling.active_profiles:
+                profiling.record_node(name, elapsed)
+    wrapper.__name__ = getattr(node, "__name__", name)
+    return wrapper
+
+
+def observe_llm_call(model: str, duration_seconds: float, response, context_tools: Sequence[str] = ()) -> None:
+    """
+    Record LLM latency and the token usage reported in the response metadata.
+
+    Args:
+        model: Model label
+        duration_seconds: Wall time of the call
+        response: The AIMessage returned by the model
+        context_tools: Tools whose results were new in this call's prompt
+    """
+    LLM_DURATION.labels(model=model).observe(duration_seconds)
+    usage = getattr(response, "usage_metadata", None) or {}
+    counts = {
+        "input_tokens": usage.get("input_tokens"),
+        "output_tokens": usage.get("output_tokens"),
+        "cached_input_tokens": (usage.get("input_token_details") or {}).get("cache_read"),
+    }
+    for kind, count in counts.items():
+        if count is not None:
+            LLM_TOKENS.labels(model=model, kind=kind).observe(count)
+            LLM_TOKENS_TOTAL.labels(model=model, kind=kind).inc(count)
+
+    prompt_tokens = counts["input_tokens"]
+    if prompt_tokens:
+        # Split evenly when several tool results arrived together
+        tools = list(context_tools) or ["none"]
+        for tool_name in tools:
+            LLM_PROMPT_TOKENS_BY_TOOL.labels(tool=tool_name).inc(prompt_tokens / len(tools))
+
+
+class _CacheStatsCollector:
+    """Exposes cache, prefetch, coalescing and routing counters at scrape time"""
+
+    def collect(self):
+        # Imported here to avoid import cycles (those modules import this one)
+        from .tool_cache import get_tool_cache_stats
+        from .response_cache import get_response_cache_stats
+        from .rag_cache import get_rag_cache_stats
+        from .rag_prefetch import get_prefetch_stats
+        from .router import get_router_stats
+
+        lookups = CounterMetricFamily("agent_cache_lookups", "Cache lookups by cache and result", labels=["cache", "result"])
+        hit_rate = GaugeMetricFamily("agent_cache_hit_rate", "Cache hit rate since startup", labels=["cache"])
+        size = GaugeMetricFamily("agent_cache_entries", "Current number of cache entries", labels=["cache"])
+        rag_stats = get_rag_cache_stats()
+        for cache_name, stats in (("tool", get_tool_cache_stats()), ("response", get_response_cache_stats()),
+                                  ("query_embedding", rag_stats["query_embedding"]),
+                                  ("retrieval", rag_stats["retrieval"])):
+            lookups.add_metric([cache_name, "hit"], stats["hits"])
+            lookups.add_metric([cache_name, "miss"], stats["misses"])
+            hit_rate.add_metric([cache_name], stats["hit_rate"])
+            size.add_metric([cache_name], stats["size"])
+        yield lookups
+        yield hit_rate
+        yield size
+
+        prefetch_stats = get_prefetch_stats()
+        prefetch = CounterMetricFamily("agent_rag_prefetch", "Speculative RAG prefetches by outcome", labels=["outcome"])
+        for outcome in ("started", "used", "cancelled", "mismatched", "failed", "skipped_busy"):
+            prefetch.add_metric([outcome], prefetch_stats[outcome])
+        yield prefetch
+
+        fast_path = GaugeMetricFamily("agent_fast_path_hit_rate", "Share of requests answered by the fast-path router")
+        fast_path.add_metric([], get_router_stats()["fast_path_hit_rate"])
+        yield fast_path
+
+        from .tool_dedup import get_tool_dedup_stats
+        dedup_stats = get_tool_dedup_stats()
+        tool_calls = CounterMetricFamily("agent_tool_calls", "Tool calls by outcome (executed, deduplicated, budget_rejected)", labels=["outcome"])
+        for outcome in ("executed", "deduplicated", "budget_rejected"):
+            tool_calls.add_metric([outcome], dedup_stats[outcome])
+        yield tool_calls
+        forced = CounterMetricFamily("agent_forced_answers", "Runs that hit the tool call budget and were forced to answer")
+        forced.add_metric([], dedup_stats["forced_answers"])
+        yield forced
+
+        from .cascade import get_cascade_stats
+        cascade_stats = get_cascade_stats()
+        answers = CounterMetricFamily("agent_cascade_answers", "Final answers by model cascade tier", labels=["tier"])
+        for tier, count in cascade_stats["answers"].items():
+            answers.add_metric([tier], count)
+        yield answers
+        escalations = CounterMetricFamily("agent_cascade_escalations", "Escalations to the large model by reason", labels=["reason"])
+        for reason, count in cascade_stats["escalations"].items():
+            escalations.add_metric([reason], count)
+        yield escalations
+
+        from .llm_resilience import get_llm_resilience_stats
+        resilience = get_llm_resilience_stats()
+        events = CounterMetricFamily("agent_llm_call_events", "LLM call attempts, retries, timeouts, hedges and failures", labels=["event"])
+        for event in ("calls", "attempts", "retries", "timeouts", "errors", "failures", "hedges", "hedge_wins"):
+            events.add_metric([event], resilience[event])
+        yield events
+        hedge_win_rate = GaugeMetricFamily("agent_llm_hedge_win_rate", "Share of hedged LLM requests that answered first")
+        hedge_win_rate.add_metric([], resilience["hedge_win_rate"])
+        yield hedge_win_rate
+        latency = GaugeMetricFamily("agent_llm_latency_quantile_seconds", "Sliding-window LLM latency quantiles", labels=["model", "quantile"])
+        timeouts = GaugeMetricFamily("agent_llm_adaptive_timeout_seconds", "Current adaptive per-attempt LLM timeout", labels=["model"])
+        for model, model_stats in resilience["models"].items():
+            for quantile in ("p50", "p95", "p99"):
+                value = model_stats[f"{quantile}_seconds"]
+                if value is not None:
+                    latency.add_metric([model, quantile], value)
+            timeouts.add_metric([model], model_stats["timeout_seconds"])
+        yield latency
+        yield timeouts
+
+        from .log_policy import get_log_policy_stats
+        policy_stats = get_log_policy_stats()
+        payloads = CounterMetricFamily("agent_log_payloads", "DEBUG payload logs by outcome (logged, sampled_out)", labels=["outcome"])
+        payloads.add_metric(["logged"], policy_stats["payloads_logged"])
+        payloads.add_metric(["sampled_out"], policy_stats["payloads_sampled_out"])
+        yield payloads
+
+        from .trace_store import get_trace_store_stats
+        trace_stats = get_trace_store_stats()
+        trace_records = CounterMetricFamily("agent_trace_records", "Trace store records by outcome (written, dropped, sampled_out, write_errors, expired)", labels=["outcome"])
+        for outcome in ("written", "dropped", "sampled_out", "write_errors", "records_expired"):
+            trace_records.add_metric([outcome.replace("records_", "")], trace_stats[outcome])
+        yield trace_records
+        trace_bytes = GaugeMetricFamily("agent_trace_store_bytes", "Bytes held in trace store segments")
+        trace_bytes.add_metric([], trace_stats["bytes"])
+        yield trace_bytes
+        trace_queue = GaugeMetricFamily("agent_trace_queue_depth", "Tool call traces waiting for the trace store's writer thread")
+        trace_queue.add_metric([], trace_stats["queue_depth"])
+        yield trace_queue
+
+        from . import agent
+        coalescing = agent.get_coalescing_stats()
+        requests = CounterMetricFamily("agent_singleflight_requests", "Agent requests by single-flight role", labels=["role"])
+        requests.add_metric(["leader"], coalescing["executions"])
+        requests.add_metric(["follower"], coalescing["coalesced"])
+        yield requests
+
+
+_collector_registered = False
+
+
+def register_collectors() -> None:
+    """Register the scrape-time collector (idempotent)"""
+    global _collector_registered
+    if not _collector_registered:
+        REGISTRY.register(_CacheStatsCollector())
+        _collector_registered = True
+
+
+def render_metrics():
+    """Return (payload, content type) for the /metrics endpoint"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
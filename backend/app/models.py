@@ -6,11 +6,41 @@ class ToolUsage(BaseModel):
     tool: str
     input: Dict[str, Any]
     output: Any = None
+    error: str | None = None
+    started_at: float | None = None # Unix timestamps
+    ended_at: float | None = None
+    duration_ms: float | None = None
+
+class LLMCallUsage(BaseModel):
+    hop: int
+    model: str
+    tier: str | None = None # Cascade tier ("small" or "large")
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_prompt_tokens: int = 0 # Prompt tokens served from the provider's prompt cache
+    latency_ms: float = 0.0
+    tool_calls: List[str] = [] # Tools requested by this call
+    tools_in_context: List[str] = [] # Tools whose results were new in this call's prompt
+    discarded: bool = False # A hedged/timed-out duplicate that answered after the winner (billed, not used)
+
+class TokenUsage(BaseModel):
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    total_tokens: int = 0
+    llm_calls: int = 0
+    estimated_cost_usd: float | None = None # None if a model has no known price
+    hops: List[LLMCallUsage] = []
 
 class DebugInfo(BaseModel):
     tool_usage: List[ToolUsage]
     message_count: int
     error: str | None = None # Added error field based on your log output for debug
+    route: str | None = None # Which path answered: a fast-path route name, "graph", "planner" or "response_cache"
+    token_usage: TokenUsage | None = None
+    model_tier: str | None = None # Cascade tier that produced the final answer
+    escalation_reasons: List[str] = [] # Why hops were escalated to the large model
+    query_id: str | None = None # Key for this run's tool call traces (GET /api/traces)
 
 class AgentLogicResponse(BaseModel):
     response: str
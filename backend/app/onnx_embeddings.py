@@ -0,0 +1,152 @@
+"""
+ONNX Runtime embedding backend (selected with EMBEDDING_BACKEND=onnx in data_processing.py).
+
+Runs the same sentence-transformers model as the default HuggingFace backend
+(all-MiniLM-L6-v2: BERT encoder, mean pooling, L2 normalization), exported to
+ONNX and dynamically quantized to int8. Serving needs only onnxruntime,
+tokenizers and numpy, so neither torch nor sentence-transformers is imported,
+which cuts startup time and memory, and int8 matmuls cut per-query latency on
+CPUs.
+
+The model is exported once into ONNX_MODEL_DIR (model.onnx, model_int8.onnx
+and tokenizer.json). Exporting needs `optimum[onnxruntime]`; run
+`python -m app.onnx_embeddings` at build time to do it ahead of the first start.
+Vectors are 384-d and close to, not identical with, the PyTorch ones: the
+knowledge base manifest records the backend, so switching re-indexes the
+collection (see data_processing.sync_knowledge_base).
+"""
+import logging
+import os
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+ONNX_BATCH_SIZE = int(os.environ.get("ONNX_BATCH_SIZE", "32"))
+# Truncation length of the sentence-transformers model (its max_seq_length)
+ONNX_MAX_LENGTH = int(os.environ.get("ONNX_MAX_LENGTH", "256"))
+ONNX_THREADS = int(os.environ.get("ONNX_THREADS", "0"))  # 0: onnxruntime's default
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+
+def export_model(model_name: str, model_dir: str, quantize: bool = True) -> None:
+    """
+    Export a sentence-transformers model to ONNX (and its int8 quantization) with its tokenizer.
+
+    Raises:
+        ImportError: If optimum is not installed
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+    except ImportError as e:
+        raise ImportError(
+            "Exporting the ONNX embedding model needs optimum: pip install 'optimum[onnxruntime]'. "
+            "Once exported, serving only needs onnxruntime and tokenizers."
+        ) from e
+
+    os.makedirs(model_dir, exist_ok=True)
+    logger.info(f"Exporting {model_name} to ONNX in {model_dir}")
+    ORTModelForFeatureExtraction.from_pretrained(model_name, export=True).save_pretrained(model_dir)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(model_dir)
+    if quantize:
+        quantize_model(model_dir)
+
+
+def quantize_model(model_dir: str) -> None:
+    """Dynamically quantize model.onnx to int8 weights (model_int8.onnx)"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    logger.info(f"Quantizing {os.path.join(model_dir, MODEL_FILE)} to int8")
+    quantize_dynamic(
+        os.path.join(model_dir, MODEL_FILE),
+        os.path.join(model_dir, QUANTIZED_MODEL_FILE),
+        weight_type=QuantType.QInt8,
+    )
+
+
+def mean_pool(hidden_states, attention_mask):
+    """Mean of the token embeddings over non-padding tokens, L2-normalized (as sentence-transformers does)"""
+    import numpy as np
+
+    mask = attention_mask[..., None].astype(hidden_states.dtype)
+    summed = (hidden_states * mask).sum(axis=1)
+    pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+    return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence embeddings computed with ONNX Runtime"""
+
+    def __init__(self, model_name: str, model_dir: str, quantized: bool = True, batch_size: Optional[int] = None,
+                 max_length: Optional[int] = None, threads: Optional[int] = None):
+        """
+        Args:
+            model_name: Hugging Face model to export if model_dir has no exported model
+            model_dir: Directory of the exported model and tokenizer
+            quantized: Use the int8 model (exported or quantized on first use if missing)
+            batch_size: Texts per inference call (default ONNX_BATCH_SIZE)
+            max_length: Token truncation length (default ONNX_MAX_LENGTH)
+            threads: Intra-op threads (default ONNX_THREADS, 0 for onnxruntime's default)
+        """
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.batch_size = batch_size or ONNX_BATCH_SIZE
+        model_file = os.path.join(model_dir, QUANTIZED_MODEL_FILE if quantized else MODEL_FILE)
+        if not os.path.exists(model_file):
+            if quantized and os.path.exists(os.path.join(model_dir, MODEL_FILE)):
+                quantize_model(model_dir)
+            else:
+                export_model(model_name, model_dir, quantize=quantized)
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self._tokenizer.enable_truncation(max_length or ONNX_MAX_LENGTH)
+        self._tokenizer.enable_padding()  # to the longest text of each batch
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = ONNX_THREADS if threads is None else threads
+        if threads:
+            options.intra_op_num_threads = threads
+        self._session = ort.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+        self._input_names = {model_input.name for model_input in self._session.get_inputs()}
+        logger.info(f"Loaded ONNX embedding model {model_file}")
+
+    def _embed_batch(self, texts: List[str]):
+        import numpy as np
+
+        encodings = self._tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden_states = self._session.run(None, {k: v for k, v in inputs.items() if k in self._input_names})[0]
+        return mean_pool(hidden_states, inputs["attention_mask"])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Batch texts of similar length together so little compute goes to padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+
+if __name__ == "__main__":
+    # Export (and quantize) the configured model ahead of time, e.g. in a Docker build step
+    import data_processing
+
+    logging.basicConfig(level=logging.INFO)
+    export_model(data_processing.EMBEDDING_MODEL, data_processing.ONNX_MODEL_DIR, quantize=True)
@@ -0,0 +1,202 @@
+"""
+Opt-in, request-scoped profiling of the agent pipeline.
+
+A request is profiled when it carries an `X-Profile: 1` header or a
+`?profile=1` query flag (see requested()). The profile captures
+  - a cProfile of the request's thread (top functions by cumulative time),
+  - wall time per graph node (reported by metrics.timed_node),
+  - tool timings (reported by tool_usage.end_tool_call),
+  - time spent inside pandas (self time of pandas functions in the cProfile),
+  - allocations (tracemalloc: traced/peak bytes and the top allocation sites).
+
+Nothing is installed unless a request asks for it: the only cost on the normal
+path is one integer check per graph node. tracemalloc is process-wide, so one
+request is profiled at a time (a second one gets ProfilerBusyError) and the
+allocation figures still include unprofiled requests running alongside it;
+cProfile covers only the request's thread, so LLM calls made on the resilience
+pool show up as waiting.
+
+Finished profiles are kept in a small in-memory store so responses that cannot
+carry them inline (the streamed /api/chat response) can point to them by ID.
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+PROFILING_ALLOWED = os.environ.get("PROFILING_ALLOWED", "true").lower() not in ("0", "false", "no")
+PROFILE_HEADER = "x-profile"
+PROFILE_QUERY_PARAM = "profile"
+PROFILE_TOP_FUNCTIONS = int(os.environ.get("PROFILE_TOP_FUNCTIONS", "25"))
+PROFILE_TOP_ALLOCATIONS = int(os.environ.get("PROFILE_TOP_ALLOCATIONS", "10"))
+PROFILE_STORE_SIZE = int(os.environ.get("PROFILE_STORE_SIZE", "50"))
+
+_PANDAS_PATH = os.sep + "pandas" + os.sep
+
+# Number of profiles in progress; hooks return immediately while it is zero
+active_profiles = 0
+_active_lock = threading.Lock()
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+# Held for the whole of a profiled run; tracemalloc's counters are shared by the process
+_run_lock = threading.Lock()
+
+_store: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_store_lock = threading.Lock()
+
+
+class ProfilerBusyError(RuntimeError):
+    """Raised when a profile is requested while another request is being profiled"""
+
+
+def requested(headers: Mapping[str, str], query_params: Mapping[str, str]) -> bool:
+    """True if the request opted into profiling by header or query flag"""
+    if not PROFILING_ALLOWED:
+        return False
+    value = headers.get(PROFILE_HEADER) or query_params.get(PROFILE_QUERY_PARAM)
+    return value is not None and value.lower() in ("1", "true", "yes")
+
+
+def is_active() -> bool:
+    """True if the current context is being profiled"""
+    return bool(active_profiles) and _current.get() is not None
+
+
+def record_node(name: str, seconds: float) -> None:
+    """Record a graph node's wall time in the current profile (if any)"""
+    profile = _current.get()
+    if profile is not None:
+        profile.nodes.append({"node": name, "ms": seconds * 1000})
+
+
+def record_tool(name: str, ms: Optional[float], error: Optional[str] = None) -> None:
+    """Record a finished tool call in the current profile (if any)"""
+    profile = _current.get()
+    if profile is not None:
+        profile.tools.append({"tool": name, "ms": ms, "error": error})
+
+
+class RequestProfile:
+    """Collectors for one profiled request"""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.nodes: List[Dict[str, Any]] = []
+        self.tools: List[Dict[str, Any]] = []
+        self._profiler: Optional[cProfile.Profile] = None
+        self._started_tracemalloc = False
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._start = 0.0
+        self._errors: List[str] = []
+
+    def start(self) -> None:
+        global active_profiles
+        with _active_lock:
+            active_profiles += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        self._snapshot = tracemalloc.take_snapshot()
+        self._profiler = cProfile.Profile()
+        try:
+            self._profiler.enable()
+        except ValueError as e:
+            # Only one profiler can be active per thread
+            self._errors.append(f"cProfile unavailable: {e}")
+            self._profiler = None
+        self._start = time.perf_counter()
+
+    def stop(self) -> Dict[str, Any]:
+        global active_profiles
+        wall = time.perf_counter() - self._start
+        if self._profiler is not None:
+            self._profiler.disable()
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        top_allocations = []
+        if self._snapshot is not None:
+            diff = tracemalloc.take_snapshot().compare_to(self._snapshot, "lineno")
+            top_allocations = [
+                {"location": str(stat.traceback), "size_diff_bytes": stat.size_diff, "count_diff": stat.count_diff}
+                for stat in diff[:PROFILE_TOP_ALLOCATIONS]
+            ]
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        with _active_lock:
+            active_profiles -= 1
+
+        functions, pandas_seconds, stats_text = self._cprofile_summary()
+        return {
+            "profile_id": self.id,
+            "wall_ms": wall * 1000,
+            "nodes": self.nodes,
+            "tools": self.tools,
+            "pandas_ms": pandas_seconds * 1000,
+            "memory": {"traced_bytes": current_bytes, "peak_bytes": peak_bytes, "top_allocations": top_allocations},
+            "functions": functions,
+            "cprofile": stats_text,
+            "errors": self._errors,
+        }
+
+    def _cprofile_summary(self) -> Tuple[List[Dict[str, Any]], float, str]:
+        if self._profiler is None:
+            return [], 0.0, ""
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profiler, stream=stream)
+        pandas_seconds = sum(
+            tottime for (filename, _, _), (_, _, tottime, _, _) in stats.stats.items() if _PANDAS_PATH in filename
+        )
+        top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP_FUNCTIONS]
+        functions = [
+            {"function": f"{filename}:{line}({name})", "calls": calls, "tottime_ms": tottime * 1000, "cumtime_ms": cumtime * 1000}
+            for (filename, line, name), (_, calls, tottime, cumtime, _) in top
+        ]
+        stats.sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        return functions, pandas_seconds, stream.getvalue()
+
+
+def run_profiled(fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Run fn in the current thread under a request profile.
+
+    Returns:
+        (fn's result, the profile dict), the profile also being kept in the profile store
+
+    Raises:
+        ProfilerBusyError: If another request is being profiled
+    """
+    if not _run_lock.acquire(blocking=False):
+        raise ProfilerBusyError("Another request is being profiled; retry when it finishes")
+    try:
+        profile = RequestProfile()
+        token = _current.set(profile)
+        profile.start()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            report = profile.stop()
+            _current.reset(token)
+            store_profile(report)
+    finally:
+        _run_lock.release()
+    return result, report
+
+
+def store_profile(report: Dict[str, Any]) -> None:
+    """Keep a finished profile for download (bounded, oldest evicted first)"""
+    with _store_lock:
+        _store[report["profile_id"]] = report
+        while len(_store) > PROFILE_STORE_SIZE:
+            _store.popitem(last=False)
+
+
+def get_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    """Get a stored profile by ID"""
+    with _store_lock:
+        return _store.get(profile_id)
@@ -0,0 +1,215 @@
+"""
+Declarative analytics queries and a vectorized pandas executor.
+
+In planner mode the LLM compiles an analytical question into one AnalyticsQuery
+(source, filters, time window, group-by, metrics, sort and top-k) instead of
+chaining several tool calls. The executor runs the query in a single pass over
+pre-joined DataFrames built from the tools' data snapshot.
+
+Sources:
+    products: one row per product, joined with its inventory record
+    sales:    one row per order line, joined with its order, product and inventory record
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Literal, Optional, Tuple, Union
+
+import pandas as pd
+from langchain_core.tools import tool
+from pydantic import BaseModel, Field
+
+from .tool_logger import tool_logger
+from .tools import DATA_FILES, _cached_tool, _load_data, get_data_version
+
+logger = logging.getLogger(__name__)
+
+PLANNER_MAX_ROWS = 50
+
+SOURCE_COLUMNS = {
+    "products": ["product_id", "name", "category", "price", "cost", "margin", "margin_pct", "created_at",
+                 "stock_quantity", "warehouse", "last_updated"],
+    "sales": ["order_id", "order_date", "status", "customer_id", "product_id", "name", "category", "quantity",
+              "unit_price", "item_total", "cost", "stock_quantity", "warehouse"],
+}
+
+
+class Filter(BaseModel):
+    field: str = Field(description="Column to filter on")
+    op: Literal["==", "!=", ">", ">=", "<", "<=", "in", "contains"] = Field(description="Comparison operator")
+    value: Any = Field(description="Value to compare with (a list for 'in')")
+
+
+class Metric(BaseModel):
+    op: Literal["sum", "mean", "count", "min", "max", "nunique"] = Field(description="Aggregation")
+    field: str = Field(default="*", description="Column to aggregate ('*' for a row count)")
+    alias: Optional[str] = Field(default=None, description="Output column name (default: '<op>_<field>')")
+
+    def output_name(self) -> str:
+        return self.alias or (f"{self.op}_{self.field}" if self.field != "*" else "row_count")
+
+
+class AnalyticsQuery(BaseModel):
+    """A declarative query over the products or sales data"""
+
+    source: Literal["products", "sales"] = Field(description="'products' (catalog + current stock) or 'sales' (order lines)")
+    filters: List[Filter] = Field(default_factory=list, description="Row filters, combined with AND")
+    window_days: Optional[int] = Field(default=None, description="Sales only: keep orders from the last N days")
+    group_by: List[str] = Field(default_factory=list, description="Columns to group by (empty: no grouping)")
+    metrics: List[Metric] = Field(default_factory=list, description="Aggregations per group (required with group_by)")
+    select: List[str] = Field(default_factory=list, description="Columns to return when not grouping (default: all)")
+    sort_by: Optional[str] = Field(default=None, description="Column or metric name to sort by")
+    descending: bool = Field(default=True, description="Sort order")
+    top_k: int = Field(default=10, description=f"Maximum rows to return (at most {PLANNER_MAX_ROWS})")
+
+
+# --- Pre-joined frames, rebuilt when the data files change ---
+
+_frames_lock = threading.Lock()
+_frames: Dict[str, Tuple[Tuple, pd.DataFrame]] = {}
+
+
+def _build_frame(source: str) -> pd.DataFrame:
+    products = _load_data("products.csv")
+    inventory = _load_data("inventory.csv").rename(columns={"quantity": "stock_quantity"})
+    catalog = products.merge(inventory, on="product_id", how="left")
+    if source == "products":
+        catalog = catalog.assign(margin=catalog["price"] - catalog["cost"])
+        return catalog.assign(margin_pct=catalog["margin"] / catalog["price"] * 100)
+    items = _load_data("order_items.csv").rename(columns={"price": "unit_price"})
+    orders = _load_data("orders.csv")
+    return (
+        items.merge(orders, on="order_id", how="inner")
+        .merge(catalog[["product_id", "name", "category", "cost", "stock_quantity", "warehouse"]], on="product_id", how="left")
+    )
+
+
+def get_frame(source: str) -> pd.DataFrame:
+    """Get the joined DataFrame for a source (cached against the data version)"""
+    version = get_data_version()
+    cached = _frames.get(source)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _frames_lock:
+        cached = _frames.get(source)
+        if cached is None or cached[0] != version:
+            cached = (version, _build_frame(source))
+            _frames[source] = cached
+        return cached[1]
+
+
+# --- Executor ---
+
+def _mask(frame: pd.DataFrame, condition: Filter) -> pd.Series:
+    column = frame[condition.field]
+    value = condition.value
+    if condition.op == "in":
+        return column.isin(value if isinstance(value, list) else [value])
+    if condition.op == "contains":
+        return column.astype(str).str.contains(str(value), case=False, regex=False)
+    if pd.api.types.is_numeric_dtype(column) and isinstance(value, str):
+        value = float(value)
+    return {
+        "==": column.__eq__, "!=": column.__ne__, ">": column.__gt__,
+        ">=": column.__ge__, "<": column.__lt__, "<=": column.__le__,
+    }[condition.op](value)
+
+
+def _validate(query: AnalyticsQuery) -> Optional[str]:
+    columns = set(SOURCE_COLUMNS[query.source])
+    referenced = [f.field for f in query.filters] + query.group_by + query.select
+    referenced += [m.field for m in query.metrics if m.field != "*"]
+    unknown = sorted({c for c in referenced if c not in columns})
+    if unknown:
+        return f"Unknown column(s) for source '{query.source}': {unknown}. Available: {SOURCE_COLUMNS[query.source]}"
+    if query.window_days is not None and query.source != "sales":
+        return "window_days only applies to the 'sales' source"
+    if query.group_by and not query.metrics:
+        return "group_by requires at least one metric"
+    return None
+
+
+def execute_analytics_query(query: Union[AnalyticsQuery, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Run an analytics query.
+
+    Args:
+        query: AnalyticsQuery (or its dict form)
+
+    Returns:
+        Dictionary with 'rows', 'row_count' (before top-k) and 'columns', or 'error'
+    """
+    query = AnalyticsQuery.model_validate(query if isinstance(query, dict) else query.model_dump())
+    error = _validate(query)
+    if error:
+        return {"error": error}
+
+    frame = get_frame(query.source)
+    mask = pd.Series(True, index=frame.index)
+    if query.window_days is not None:
+        threshold = (datetime.now() - timedelta(days=query.window_days)).strftime('%Y-%m-%d')
+        mask &= frame["order_date"] >= threshold
+    try:
+        for condition in query.filters:
+            mask &= _mask(frame, condition)
+    except (TypeError, ValueError) as e:
+        return {"error": f"Invalid filter value: {e}"}
+    result = frame[mask]
+
+    if query.metrics:
+        # '*' metrics count rows whatever the op
+        aggregations = {
+            metric.output_name(): ("product_id", "size") if metric.field == "*" else (metric.field, metric.op)
+            for metric in query.metrics
+        }
+        if query.group_by:
+            result = result.groupby(query.group_by, dropna=False).agg(**aggregations).reset_index()
+        else:
+            result = pd.DataFrame([{
+                name: len(result) if op == "size" else result[column].agg(op)
+                for name, (column, op) in aggregations.items()
+            }])
+    elif query.select:
+        result = result[query.select]
+
+    if query.sort_by:
+        if query.sort_by not in result.columns:
+            return {"error": f"Cannot sort by '{query.sort_by}'. Result columns: {list(result.columns)}"}
+        result = result.sort_values(query.sort_by, ascending=not query.descending)
+
+    row_count = len(result)
+    result = result.head(max(1, min(query.top_k, PLANNER_MAX_ROWS)))
+    return {
+        "rows": result.round(2).to_dict("records"),
+        "row_count": row_count,
+        "columns": list(result.columns),
+    }
+
+
+@_cached_tool(*DATA_FILES)
+def _run_analytics_query(query: Dict[str, Any]) -> Dict[str, Any]:
+    """Memoized executor entry point (keyed on the query and the data version)"""
+    return execute_analytics_query(query)
+
+
+@tool(args_schema=AnalyticsQuery)
+@tool_logger
+def run_analytics_query(source: str, filters: List[Any] = None, window_days: Optional[int] = None,
+                        group_by: List[str] = None, metrics: List[Any] = None, select: List[str] = None,
+                        sort_by: Optional[str] = None, descending: bool = True, top_k: int = 10) -> Dict[str, Any]:
+    """
+    Answer an analytical question about products, stock and sales with one declarative query.
+
+    Use source='products' for catalog, pricing, margin and current stock questions, and
+    source='sales' for order-line questions (units sold, revenue, order counts), with
+    window_days for a lookback period. Filter rows, group them, aggregate with metrics,
+    then sort and keep the top_k rows.
+    """
+    def dump(items):
+        return [item.model_dump() if isinstance(item, BaseModel) else item for item in items or []]
+
+    query = {
+        "source": source, "filters": dump(filters), "window_days": window_days, "group_by": group_by or [],
+        "metrics": dump(metrics), "select": select or [], "sort_by": sort_by, "descending": descending, "top_k": top_k,
+    }
+    return _run_analytics_query(query)
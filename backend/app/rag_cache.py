@@ -0,0 +1,100 @@
+"""
+Caches in front of the knowledge base retriever.
+
+  - Query embeddings, keyed by the normalized query text (lower-cased, with
+    whitespace collapsed; MiniLM's tokenizer is uncased, so this does not
+    change the vector). Shared by retrieval and the semantic response cache.
+  - Retrieval results, keyed by the query embedding, k and the search filter,
+    so differently worded queries that embed identically share an entry.
+
+Both are bounded LRU caches (ToolResultCache without a TTL) and include the
+vector collection's version (data_processing.get_collection_version, bumped
+by every knowledge base sync that changes points) in their keys, so entries
+from before a re-index are never served. A repeated question therefore
+skips both model inference and the vector search.
+"""
+import copy
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from .response_cache import normalize_query
+from .tool_cache import ToolResultCache
+
+RAG_CACHE_ENABLED = os.environ.get("RAG_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+QUERY_EMBEDDING_CACHE_MAXSIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_MAXSIZE", "1024"))
+RETRIEVAL_CACHE_MAXSIZE = int(os.environ.get("RETRIEVAL_CACHE_MAXSIZE", "512"))
+
+_embedding_cache = ToolResultCache(maxsize=QUERY_EMBEDDING_CACHE_MAXSIZE, ttl_seconds=float("inf"))
+_retrieval_cache = ToolResultCache(maxsize=RETRIEVAL_CACHE_MAXSIZE, ttl_seconds=float("inf"))
+
+
+def _collection_version() -> int:
+    # Imported lazily so this module does not pull in data_processing at import time
+    from data_processing import get_collection_version
+    return get_collection_version()
+
+
+def embed_query(text: str, embeddings=None) -> List[float]:
+    """
+    Embed a query through the query embedding cache.
+
+    Args:
+        text: Query text
+        embeddings: Embedding model (default: the shared knowledge base model)
+
+    Returns:
+        The query embedding (a copy the caller may modify)
+    """
+    if embeddings is None:
+        from data_processing import get_embeddings
+        embeddings = get_embeddings()
+    if not RAG_CACHE_ENABLED:
+        return embeddings.embed_query(text)
+    key = (normalize_query(text), _collection_version())
+    hit, vector = _embedding_cache.get(key)
+    if not hit:
+        vector = list(embeddings.embed_query(key[0]))
+        _embedding_cache.set(key, vector)
+    return list(vector)
+
+
+class CachedRetriever(BaseRetriever):
+    """Similarity search over a vector store with cached query embeddings and results"""
+
+    vectorstore: Any
+    k: int = 4
+    filter: Optional[Dict[str, Any]] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        vector = embed_query(query, self.vectorstore.embeddings)
+        if not RAG_CACHE_ENABLED:
+            return self.vectorstore.similarity_search_by_vector(vector, k=self.k, filter=self.filter)
+        key = (
+            np.asarray(vector, dtype=np.float32).tobytes(),
+            self.k,
+            json.dumps(self.filter, sort_keys=True, default=str),
+            _collection_version(),
+        )
+        hit, documents = _retrieval_cache.get(key)
+        if not hit:
+            documents = self.vectorstore.similarity_search_by_vector(vector, k=self.k, filter=self.filter)
+            _retrieval_cache.set(key, documents)
+        # Hand out copies so callers cannot mutate the cached documents
+        return copy.deepcopy(documents)
+
+
+def get_rag_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Get hit/miss statistics for the query embedding and retrieval caches"""
+    return {"query_embedding": _embedding_cache.stats(), "retrieval": _retrieval_cache.stats()}
+
+
+def clear_rag_caches() -> None:
+    """Clear both caches"""
+    _embedding_cache.clear()
+    _retrieval_cache.clear()
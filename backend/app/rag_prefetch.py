@@ -0,0 +1,170 @@
+"""
+Speculative RAG prefetch.
+
+Policy and SOP questions almost always end with a `query_internal_documents`
+call, but retrieval normally starts only after the first LLM round-trip picks
+the tool. A RagPrefetch runs the retrieval for the raw user query on a worker
+thread while the first LLM call is in flight. If the model's first retrieval
+uses a similar query the prefetched result is reused, once; any later or
+refined retrieval runs the tool itself. Otherwise the prefetch is cancelled
+(or its result discarded if it already started).
+
+Only questions the router classifies as document questions are prefetched,
+and only while a prefetch worker is idle: a running retrieval cannot be
+cancelled, so a burst of unused prefetches would otherwise queue new ones
+behind them.
+"""
+import contextvars
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Dict, Optional, Tuple
+
+from langchain_core.tools import BaseTool
+
+from .router import is_document_query
+
+logger = logging.getLogger(__name__)
+
+RAG_TOOL_NAME = "query_internal_documents"
+
+RAG_PREFETCH_ENABLED = os.environ.get("RAG_PREFETCH_ENABLED", "true").lower() not in ("0", "false", "no")
+RAG_PREFETCH_WORKERS = int(os.environ.get("RAG_PREFETCH_WORKERS", "4"))
+# Minimum Jaccard similarity between the content words of the model's retrieval query and the user query
+RAG_PREFETCH_SIMILARITY = float(os.environ.get("RAG_PREFETCH_SIMILARITY", "0.6"))
+# Longest we wait on a prefetch that is still running before retrieving ourselves
+RAG_PREFETCH_WAIT_SECONDS = float(os.environ.get("RAG_PREFETCH_WAIT_SECONDS", "10"))
+
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "do", "does", "did", "what", "which", "who", "how",
+    "when", "where", "why", "our", "we", "i", "you", "your", "my", "of", "for", "to", "in", "on", "at",
+    "and", "or", "can", "could", "should", "would", "there", "any", "about", "with", "it", "be",
+}
+_WORD = re.compile(r"[a-z0-9]+")
+
+_executor = ThreadPoolExecutor(max_workers=RAG_PREFETCH_WORKERS, thread_name_prefix="rag-prefetch")
+
+_stats_lock = threading.Lock()
+_stats = {"started": 0, "used": 0, "cancelled": 0, "mismatched": 0, "failed": 0, "skipped_busy": 0}
+_in_flight = 0
+
+
+def _count(event: str) -> None:
+    with _stats_lock:
+        _stats[event] += 1
+
+
+def _content_words(text: str) -> set:
+    return {w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS}
+
+
+def query_similarity(a: str, b: str) -> float:
+    """
+    Jaccard similarity between the content words of two queries.
+
+    Symmetric, so a refined query that adds words to the original one scores
+    lower the more it adds.
+    """
+    words_a, words_b = _content_words(a), _content_words(b)
+    if not words_a or not words_b:
+        return 1.0 if a.strip().lower() == b.strip().lower() else 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+class RagPrefetch:
+    """A retrieval for the raw user query running ahead of the first LLM call"""
+
+    def __init__(self, rag_tool: BaseTool, query: str):
+        self.query = query
+        # Runs in a copy of the caller's context, so tool tracking and profiling see the request
+        self._future: Future = _executor.submit(contextvars.copy_context().run, rag_tool.invoke, {"query": query})
+        self._future.add_done_callback(_release_worker)
+        self._settled = False
+        self._lock = threading.Lock()
+        _count("started")
+
+    def matches(self, query: str) -> bool:
+        """Whether a retrieval query is close enough to reuse the prefetched result"""
+        return query_similarity(self.query, query) >= RAG_PREFETCH_SIMILARITY
+
+    def take(self, query: str) -> Tuple[bool, Any]:
+        """
+        Use the prefetched result for a retrieval query if it matches. The
+        result is handed out at most once; after that (or after cancel) the
+        caller always retrieves itself.
+
+        Returns:
+            Tuple of (used, result). used is False if the caller must retrieve itself.
+        """
+        with self._lock:
+            if self._settled:
+                return False, None
+            if not self.matches(query):
+                _count("mismatched")
+                return False, None
+            self._settled = True
+        try:
+            result = self._future.result(timeout=RAG_PREFETCH_WAIT_SECONDS)
+        except Exception as e:
+            logger.warning(f"RAG prefetch for '{self.query}' failed, retrieving directly: {e}")
+            _count("failed")
+            return False, None
+        _count("used")
+        logger.info(f"Using prefetched RAG result for '{query}' (prefetched query: '{self.query}').")
+        return True, result
+
+    def cancel(self) -> None:
+        """Cancel the prefetch if its result has not been used"""
+        with self._lock:
+            if self._settled:
+                return
+            self._settled = True
+        self._future.cancel()
+        _count("cancelled")
+
+
+def _reserve_worker() -> bool:
+    global _in_flight
+    with _stats_lock:
+        if _in_flight >= RAG_PREFETCH_WORKERS:
+            _stats["skipped_busy"] += 1
+            return False
+        _in_flight += 1
+        return True
+
+
+def _release_worker(future: Future) -> None:
+    global _in_flight
+    with _stats_lock:
+        _in_flight -= 1
+
+
+def start_rag_prefetch(tools, query: str) -> Optional[RagPrefetch]:
+    """
+    Start prefetching retrieval results for a user query.
+
+    Args:
+        tools: The agent's tool list (the prefetch runs only if the RAG tool is present)
+        query: The raw user query
+
+    Returns:
+        RagPrefetch handle, or None if prefetching is disabled, not useful for
+        this query or every prefetch worker is busy
+    """
+    if not RAG_PREFETCH_ENABLED or not is_document_query(query):
+        return None
+    rag_tool = next((t for t in tools if t is not None and t.name == RAG_TOOL_NAME), None)
+    if rag_tool is None or not _reserve_worker():
+        return None
+    return RagPrefetch(rag_tool, query)
+
+
+def get_prefetch_stats() -> Dict[str, Any]:
+    """Get counters for started, used, cancelled, mismatched and skipped prefetches"""
+    with _stats_lock:
+        stats = dict(_stats)
+        stats["in_flight"] = _in_flight
+    stats["use_rate"] = (stats["used"] / stats["started"]) if stats["started"] else 0.0
+    return stats
@@ -0,0 +1,219 @@
+"""
+Semantic response cache for agent answers.
+
+Incoming queries are embedded with the same MiniLM model used for the knowledge
+base. A new query is served from the cache when a previous query is similar
+enough (cosine similarity above a configurable threshold), mentions the same
+identifiers (product IDs, numbers), and was answered against the same data
+snapshot, knowledge base version and date (answers about "the last 7 days"
+change at midnight).
+"""
+import functools
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from .models import AgentLogicResponse
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable through environment variables)
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+RESPONSE_CACHE_MAXSIZE = int(os.environ.get("RESPONSE_CACHE_MAXSIZE", "512"))
+RESPONSE_CACHE_SIMILARITY = float(os.environ.get("RESPONSE_CACHE_SIMILARITY", "0.92"))
+
+# Tokens that change the meaning of an otherwise similar question
+# (e.g. "stock of P301" vs "stock of P302", "last 7 days" vs "last 30 days")
+_ENTITY_PATTERN = re.compile(r"\b[a-z]*\d+(?:\.\d+)?\b")
+
+
+def normalize_query(query: str) -> str:
+    """Lower-case a query and collapse whitespace"""
+    return " ".join(query.lower().split())
+
+
+def extract_entities(query: str) -> Tuple[str, ...]:
+    """Extract identifier-like tokens (product IDs, numbers) from a query"""
+    return tuple(sorted(set(_ENTITY_PATTERN.findall(normalize_query(query)))))
+
+
+def _default_embed(text: str) -> List[float]:
+    """Embed text with the shared knowledge-base embedding model (through the query embedding cache)"""
+    # Imported lazily: rag_cache imports this module
+    from .rag_cache import embed_query
+    return embed_query(text)
+
+
+def _default_version() -> Hashable:
+    """Current date, data snapshot and knowledge base (vector collection) version"""
+    from data_processing import get_collection_version
+    from .tools import get_data_version
+    # Day-window answers are computed from today's date, like the tool cache's version
+    return (datetime.now().strftime('%Y-%m-%d'), get_data_version(), get_collection_version())
+
+
+class SemanticResponseCache:
+    """LRU cache of agent responses looked up by query embedding similarity"""
+
+    def __init__(
+        self,
+        maxsize: int = RESPONSE_CACHE_MAXSIZE,
+        similarity_threshold: float = RESPONSE_CACHE_SIMILARITY,
+        embed_fn: Callable[[str], List[float]] = _default_embed,
+        version_fn: Callable[[], Hashable] = _default_version,
+    ):
+        self.maxsize = maxsize
+        self.similarity_threshold = similarity_threshold
+        self._embed_fn = embed_fn
+        self._version_fn = version_fn
+        # normalized query -> (unit embedding, entities, response)
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, Tuple[str, ...], AgentLogicResponse]]" = OrderedDict()
+        self._version: Optional[Hashable] = None
+        # A miss embeds the query in lookup() and again in store(); remember recent embeddings
+        self._embed_normalized = functools.lru_cache(maxsize=128)(self._compute_embedding)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _compute_embedding(self, normalized_query: str) -> np.ndarray:
+        vector = np.asarray(self._embed_fn(normalized_query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _embed(self, query: str) -> np.ndarray:
+        return self._embed_normalized(normalize_query(query))
+
+    def _check_version(self) -> None:
+        """Drop every entry if the data snapshot or knowledge base changed (lock held)"""
+        version = self._version_fn()
+        if version != self._version:
+            if self._entries:
+                logger.info(f"Response cache invalidated ({len(self._entries)} entries): data or knowledge base changed.")
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def lookup(self, query: str) -> Optional[AgentLogicResponse]:
+        """
+        Find a cached response for a query or one of its paraphrases.
+
+        Args:
+            query: The user's question
+
+        Returns:
+            A copy of the cached AgentLogicResponse, or None on a miss
+        """
+        key = normalize_query(query)
+        entities = extract_entities(query)
+        embedding = self._embed(query)
+
+        with self._lock:
+            self._check_version()
+
+            best_key, best_score = None, -1.0
+            if key in self._entries:
+                best_key, best_score = key, 1.0
+            elif self._entries:
+                keys = list(self._entries.keys())
+                matrix = np.stack([self._entries[k][0] for k in keys])
+                scores = matrix @ embedding
+                for index in np.argsort(scores)[::-1]:
+                    score = float(scores[index])
+                    if score < self.similarity_threshold:
+                        break
+                    if self._entries[keys[index]][1] == entities:
+                        best_key, best_score = keys[index], score
+                        break
+
+            if best_key is None or best_score < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            response = self._entries[best_key][2]
+
+        logger.info(f"Response cache hit for '{query}' (matched '{best_key}', similarity {best_score:.3f}).")
+        return response.model_copy(deep=True)
+
+    def store(self, query: str, response: AgentLogicResponse) -> None:
+        """Cache a successful response for a query"""
+        if self.maxsize <= 0:
+            return
+        key = normalize_query(query)
+        entities = extract_entities(query)
+        embedding = self._embed(query)
+
+        with self._lock:
+            self._check_version()
+            self._entries[key] = (embedding, entities, response.model_copy(deep=True))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of the cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "similarity_threshold": self.similarity_threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+# Shared cache used by get_agent_response
+_response_cache = SemanticResponseCache()
+
+
+def lookup_response(query: str) -> Optional[AgentLogicResponse]:
+    """Look up a query in the shared response cache (None on a miss or if disabled)"""
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    try:
+        return _response_cache.lookup(query)
+    except Exception as e:
+        # The cache must never break a request (e.g. embedding model unavailable)
+        logger.warning(f"Response cache lookup failed: {e}")
+        return None
+
+
+def store_response(query: str, response: AgentLogicResponse) -> None:
+    """Store a successful response in the shared response cache"""
+    if not RESPONSE_CACHE_ENABLED:
+        return
+    if response.debug is not None and response.debug.error:
+        return
+    try:
+        _response_cache.store(query, response)
+    except Exception as e:
+        logger.warning(f"Response cache store failed: {e}")
+
+
+def get_response_cache_stats() -> Dict[str, Any]:
+    """Get hit/miss statistics for the shared response cache"""
+    return _response_cache.stats()
+
+
+def clear_response_cache() -> None:
+    """Clear the shared response cache"""
+    _response_cache.clear()
@@ -0,0 +1,365 @@
+"""
+Deterministic fast-path router for structured queries.
+
+High-confidence structured questions (single product lookups, low-stock lists,
+top sellers) are recognized with patterns, answered by calling the tool
+function directly and rendered with a template - no LLM call. Anything that
+does not match a route exactly, including a query with words the route cannot
+model, falls back to the full LangGraph agent.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from .models import AgentLogicResponse, DebugInfo, ToolUsage
+from .metrics import REQUEST_DURATION
+from .tools import (
+    _get_product_info,
+    _get_inventory_level,
+    _list_low_stock_products,
+    _get_top_selling_products,
+)
+
+logger = logging.getLogger(__name__)
+
+FAST_PATH_ENABLED = os.environ.get("FAST_PATH_ENABLED", "true").lower() not in ("0", "false", "no")
+
+# Route names recorded for requests answered by the full agent graph, by planner mode
+# and from the semantic response cache
+GRAPH_ROUTE = "graph"
+PLANNER_ROUTE = "planner"
+RESPONSE_CACHE_ROUTE = "response_cache"
+
+_PRODUCT_ID = re.compile(r"\bp\d+\b")
+_NUMBER = r"(\d+)"
+
+# Words that signal a question needs reasoning beyond a single lookup
+_COMPLEX_WORDS = re.compile(
+    r"\b(compare|comparison|versus|vs|why|should|recommend|trend|policy|how do|how to|explain|category|categories)\b"
+)
+_SALES_WORDS = re.compile(r"\b(sales?|sell|sells|sold|selling|seller|sellers|revenue|velocity|orders?)\b")
+_PROJECTION_WORDS = re.compile(r"\b(days?|remaining|run out|runs out|status|reorder|week)\b")
+# Quantities the tools do not track (returns) or that lie in the future
+_UNTRACKED_WORDS = re.compile(r"\b(returns?|returned|refunds?|refunded|forecast|predict\w*|projected|will|next)\b")
+# Negated intents ("not low stock", "except P123") invert what the templates would answer
+_NEGATION = re.compile(r"\b(not|no|never|none|without|except|excluding|other than)\b|n t\b")
+# Any time expression; windows _lookback_days cannot parse send the query to the agent
+_TIME_WORDS = re.compile(
+    r"\b(today|yesterday|tomorrow|tonight|ytd|since|during|until|between|days?|weeks?|weekends?|months?|quarters?|"
+    r"years?|annual\w*|seasons?|seasonal|holidays?|q[1-4]|(?:19|20)\d\d|jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|"
+    r"apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t|tember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\b"
+)
+
+# Intent words for questions answered from the internal documents (policies,
+# SOPs, guides) and for questions answered from the data tools
+_DOCUMENT_WORDS = re.compile(
+    r"\b(polic(?:y|ies)|procedures?|process(?:es|ed|ing)?|sops?|guides?|guidelines?|checklists?|playbooks?|"
+    r"steps?|phases?|campaigns?|marketing|promotions?|discounts?|loyalty|programs?|ship\w*|deliver\w*|"
+    r"returns?|returning|returnable|refunds?|exchanges?|rma|eligib\w*|responsible|purchase orders?|flash sales?|"
+    r"ltv|lifetime value|onboarding|purpose|how (?:do|does|is|are|should|can|long|quickly)|what happens|describe|explain)\b"
+)
+_DATA_WORDS = re.compile(
+    r"\b(stock|inventory|units?|sales?|sold|selling|sellers?|revenue|orders?|profit|margins?|prices?|costs?|"
+    r"warehouses?|quantity|how many|average|total|highest|lowest|most|least|top)\b"
+)
+
+class RouteMatch(NamedTuple):
+    route: str
+    tool_name: str
+    tool_args: Dict[str, Any]
+    tool_fn: Callable
+    render: Callable[[Dict[str, Any], Any], str]
+
+
+def _normalize(query: str) -> str:
+    """Lower-case, strip quotes and collapse whitespace"""
+    return " ".join(query.lower().replace("'", " ").replace('"', " ").split())
+
+
+def _single_product_id(text: str) -> Optional[str]:
+    """Return the product ID if exactly one is mentioned"""
+    ids = set(_PRODUCT_ID.findall(text))
+    if len(ids) != 1:
+        return None
+    return ids.pop().upper()
+
+
+def _lookback_days(text: str, default: int = 30) -> Optional[int]:
+    """
+    Parse a lookback window ('last 7 days', 'past month').
+
+    Returns the default when the query has no time expression, and None when
+    it has one that is not a rolling window ('this quarter', 'yesterday',
+    'in 2023') - not worth guessing.
+    """
+    windows = [
+        (r"\b(?:in\s+)?(?:the\s+)?(?:last|past|previous)\s+" + _NUMBER + r"\s+days?\b", None),
+        (r"\b(?:in\s+)?(?:the\s+)?(?:last|past|previous)\s+month\b", 30),
+        (r"\b(?:in\s+)?(?:the\s+)?(?:last|past|previous)\s+week\b", 7),
+    ]
+    for pattern, days in windows:
+        match = re.search(pattern, text)
+        if match:
+            # A second time expression ("last 7 days of 2023") changes the window
+            if _TIME_WORDS.search(text[:match.start()] + " " + text[match.end():]):
+                return None
+            return int(match.group(1)) if days is None else days
+    if _TIME_WORDS.search(text) or re.search(r"\b(?:last|past|previous|this)\s+\w+", text):
+        return None
+    return default
+
+
+# --- Renderers ---
+
+def _render_inventory(args: Dict[str, Any], result: Dict[str, Any]) -> str:
+    if "error" in result:
+        return f"I couldn't find inventory information for product {args['product_id']}."
+    return (
+        f"Product {result['product_id']} currently has {result['quantity']} units in stock"
+        f" at the {result.get('warehouse', 'unknown')} warehouse (last updated {result.get('last_updated', 'unknown')})."
+    )
+
+
+def _render_product_info(args: Dict[str, Any], result: Dict[str, Any]) -> str:
+    if "error" in result:
+        return f"I couldn't find a product with ID {args['product_id']}."
+    return (
+        f"Product {result['product_id']} is \"{result['name']}\" in the {result['category']} category,"
+        f" priced at ${float(result['price']):,.2f} (cost ${float(result['cost']):,.2f})."
+    )
+
+
+def _render_low_stock(args: Dict[str, Any], result: List[Dict[str, Any]]) -> str:
+    threshold = args["threshold"]
+    if not result:
+        return f"No products have fewer than {threshold} units in stock."
+    lines = [f"{len(result)} products have fewer than {threshold} units in stock:"]
+    for item in result:
+        lines.append(f"- {item['product_id']} ({item.get('name', 'unknown')}): {item['quantity']} units")
+    return "\n".join(lines)
+
+
+def _render_top_sellers(args: Dict[str, Any], result: List[Dict[str, Any]]) -> str:
+    days = args["days"]
+    if not result:
+        return f"There were no sales in the last {days} days."
+    if "error" in result[0]:
+        return result[0]["error"]
+    lines = [f"Top {len(result)} selling products by units sold in the last {days} days:"]
+    for rank, item in enumerate(result, start=1):
+        lines.append(
+            f"{rank}. {item['product_id']} ({item.get('name', 'unknown')}): "
+            f"{int(item['quantity'])} units, ${float(item['item_total']):,.2f} revenue"
+        )
+    return "\n".join(lines)
+
+
+# --- Intent matchers ---
+
+def _match_inventory(text: str) -> Optional[RouteMatch]:
+    if not re.search(r"\b(how many units|in stock|stock level|inventory level|inventory for|inventory of)\b", text):
+        return None
+    if _SALES_WORDS.search(text) or _PROJECTION_WORDS.search(text) or "less than" in text or "below" in text:
+        return None
+    if _TIME_WORDS.search(text):
+        # The tool reports current stock only
+        return None
+    product_id = _single_product_id(text)
+    if not product_id:
+        return None
+    args = {"product_id": product_id}
+    return RouteMatch("inventory_level", "get_inventory_level", args, _get_inventory_level, _render_inventory)
+
+
+def _match_product_info(text: str) -> Optional[RouteMatch]:
+    if not re.search(r"\b(product info|product information|product details|details (?:of|for|about)|info (?:on|for|about)|price of|tell me about)\b", text):
+        return None
+    if _SALES_WORDS.search(text) or _PROJECTION_WORDS.search(text) or re.search(r"\b(stock|inventory)\b", text):
+        return None
+    if _TIME_WORDS.search(text):
+        return None
+    product_id = _single_product_id(text)
+    if not product_id:
+        return None
+    args = {"product_id": product_id}
+    return RouteMatch("product_info", "get_product_info", args, _get_product_info, _render_product_info)
+
+
+def _match_low_stock(text: str) -> Optional[RouteMatch]:
+    if _PRODUCT_ID.search(text) or _SALES_WORDS.search(text):
+        return None
+    match = re.search(r"\b(?:less than|fewer than|below|under)\s+" + _NUMBER + r"\s+units?\b", text)
+    if match and re.search(r"\b(stock|inventory)\b", text):
+        threshold = int(match.group(1))
+    elif re.search(r"\blow[- ]stock\b|\blow on stock\b|\brunning low\b", text):
+        threshold = 10
+    else:
+        return None
+    if _TIME_WORDS.search(text):
+        # "less than a week of inventory" needs sales velocity, not a unit threshold
+        return None
+    args = {"threshold": threshold}
+    return RouteMatch("low_stock", "list_low_stock_products", args, _list_low_stock_products, _render_low_stock)
+
+
+def _match_top_sellers(text: str) -> Optional[RouteMatch]:
+    if not re.search(r"\b(top(?:\s+\d+)?\s+(?:selling|sellers?|products?)|best[- ]?(?:selling|sellers?))\b", text):
+        return None
+    if _PRODUCT_ID.search(text) or re.search(r"\b(revenue|profit|margin|category|categories)\b", text):
+        # The tool ranks by units sold; other rankings need the agent
+        return None
+    match = re.search(r"\btop\s+" + _NUMBER + r"\b", text)
+    limit = int(match.group(1)) if match else 5
+    if re.search(r"\bbest[- ]?(?:selling|seller)\s+product\b", text) and not match:
+        limit = 1
+    days = _lookback_days(text)
+    if days is None:
+        return None
+    args = {"days": days, "limit": limit}
+    return RouteMatch("top_sellers", "get_top_selling_products", args, _get_top_selling_products, _render_top_sellers)
+
+
+_MATCHERS = [_match_inventory, _match_product_info, _match_low_stock, _match_top_sellers]
+
+# A route answers only queries made entirely of its template words, filler words,
+# product IDs and numbers. Any other word is a qualifier the tool call would drop
+# (a category, warehouse, price limit, currency, audience...), so the query goes
+# to the agent instead.
+_WORD_TOKEN = re.compile(r"[a-z0-9]+")
+_FILLER_WORDS = frozenset(
+    "a an the of for in on at by to is are was were be do does did we our us i me my you your "
+    "what which how many much show list give tell get find see let know please can could would "
+    "there any all currently current right now today have has had with product products item items "
+    "id sku number".split()
+)
+_ROUTE_WORDS = {
+    "inventory_level": frozenset("units unit stock level levels inventory quantity available hand left".split()),
+    "product_info": frozenset("info information details detail about price priced cost name".split()),
+    "low_stock": frozenset("less than fewer below under units unit stock inventory low running levels".split()),
+    "top_sellers": frozenset(
+        "top best selling seller sellers units sold over last past previous days day week month".split()
+    ),
+}
+_SYMBOLS = re.compile(r"[$€£%]")
+
+
+def _only_template_words(text: str, route: str) -> bool:
+    """True if every word of the query is modeled by the route's template"""
+    if _SYMBOLS.search(text):
+        return False
+    allowed = _ROUTE_WORDS[route]
+    for word in _WORD_TOKEN.findall(text):
+        if word in _FILLER_WORDS or word in allowed or word.isdigit() or _PRODUCT_ID.fullmatch(word):
+            continue
+        return False
+    return True
+
+
+def match_route(query: str) -> Optional[RouteMatch]:
+    """
+    Match a query against the fast-path routes.
+
+    Args:
+        query: The user's question
+
+    Returns:
+        RouteMatch for a high-confidence structured intent, or None to use the agent graph
+    """
+    text = _normalize(query)
+    if _COMPLEX_WORDS.search(text) or re.search(r"\b(and|or|also)\b", text) or text.count("?") > 1:
+        return None
+    if _UNTRACKED_WORDS.search(text) or _NEGATION.search(text):
+        return None
+    for matcher in _MATCHERS:
+        match = matcher(text)
+        if match:
+            return match if _only_template_words(text, match.route) else None
+    return None
+
+
+def is_document_query(query: str) -> bool:
+    """
+    Whether a question is likely answered from the internal documents.
+
+    Policy, procedure and how-to questions are; questions about a product ID or
+    about stock, sales and other data are answered by the data tools. Questions
+    matching neither count as document questions, as the agent sends anything
+    it is unsure about to the document search.
+    """
+    text = _normalize(query)
+    if _PRODUCT_ID.search(text):
+        return False
+    return bool(_DOCUMENT_WORDS.search(text)) or not _DATA_WORDS.search(text)
+
+
+# --- Route metrics ---
+
+_stats_lock = threading.Lock()
+_route_stats: Dict[str, Dict[str, float]] = {}
+
+
+def record_route(route: str, duration_seconds: float) -> None:
+    """Record that a request was answered by a route and how long it took"""
+    REQUEST_DURATION.labels(route=route).observe(duration_seconds)
+    with _stats_lock:
+        stats = _route_stats.setdefault(route, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        stats["count"] += 1
+        stats["total_seconds"] += duration_seconds
+        stats["max_seconds"] = max(stats["max_seconds"], duration_seconds)
+
+
+def get_router_stats() -> Dict[str, Any]:
+    """Get per-route request counts and latency, plus the fast-path hit rate"""
+    with _stats_lock:
+        routes = {
+            route: {
+                "count": int(stats["count"]),
+                "avg_latency_ms": 1000 * stats["total_seconds"] / stats["count"] if stats["count"] else 0.0,
+                "max_latency_ms": 1000 * stats["max_seconds"],
+            }
+            for route, stats in _route_stats.items()
+        }
+    total = sum(r["count"] for r in routes.values())
+    fast_path = sum(r["count"] for name, r in routes.items() if name not in (GRAPH_ROUTE, PLANNER_ROUTE, RESPONSE_CACHE_ROUTE))
+    return {"routes": routes, "fast_path_hit_rate": (fast_path / total) if total else 0.0}
+
+
+def try_fast_path(query: str) -> Optional[AgentLogicResponse]:
+    """
+    Answer a query without the LLM if it matches a fast-path route.
+
+    Args:
+        query: The user's question
+
+    Returns:
+        AgentLogicResponse rendered from the tool result, or None to fall back to the agent graph
+    """
+    if not FAST_PATH_ENABLED:
+        return None
+    match = match_route(query)
+    if match is None:
+        return None
+
+    start = time.perf_counter()
+    try:
+        result = match.tool_fn(**match.tool_args)
+        response_text = match.render(match.tool_args, result)
+    except Exception as e:
+        logger.warning(f"Fast path '{match.route}' failed for '{query}', falling back to the agent: {e}")
+        return None
+    record_route(match.route, time.perf_counter() - start)
+
+    logger.info(f"Fast path '{match.route}' answered '{query}' with {match.tool_name}({match.tool_args}).")
+    return AgentLogicResponse(
+        response=response_text,
+        debug=DebugInfo(
+            tool_usage=[ToolUsage(step=1, tool=match.tool_name, input=match.tool_args, output=result)],
+            message_count=0,
+            error=None,
+            route=match.route,
+        ),
+        trace_data=None
+    )
@@ -0,0 +1,80 @@
+"""
+Single-flight request coalescing.
+
+Concurrent calls that share a key share one in-flight execution: the first
+caller (the leader) runs the work, later callers (followers) wait for it and
+receive the same result. Nothing is cached once the execution finishes.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent executions with the same key"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn, or wait for the in-flight execution with the same key.
+
+        Args:
+            key: Coalescing key
+            fn: Zero-argument callable doing the work
+
+        Returns:
+            Tuple of (result, shared). shared is True for followers.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> Dict[str, Any]:
+        """Return execution/coalescing counters"""
+        with self._lock:
+            requests = self.executions + self.coalesced
+            return {
+                "in_flight": len(self._calls),
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "coalescing_ratio": (self.coalesced / requests) if requests else 0.0,
+            }
@@ -0,0 +1,117 @@
+"""
+Per-request token and cost accounting for LLM calls.
+
+A TokenUsageTracker is created for each agent run and passed to the graph in
+the run config; the chatbot node records every LLM hop into it from the
+provider's response metadata.
+"""
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+from .models import LLMCallUsage, TokenUsage
+
+# Approximate list prices in USD per 1M tokens: (prompt, cached prompt, completion)
+MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "claude-3-haiku-20240307": (0.25, 0.25, 1.25),
+    "claude-3-sonnet-20240229": (3.00, 3.00, 15.00),
+}
+
+
+def extract_usage(response: Any) -> Tuple[int, int, int]:
+    """
+    Read token counts from an LLM response.
+
+    Returns:
+        Tuple of (prompt_tokens, completion_tokens, cached_prompt_tokens)
+    """
+    usage = getattr(response, "usage_metadata", None) or {}
+    prompt = usage.get("input_tokens") or 0
+    completion = usage.get("output_tokens") or 0
+    cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+
+    if not usage:
+        # Older integrations only report usage in the raw response metadata
+        token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+        prompt = token_usage.get("prompt_tokens") or 0
+        completion = token_usage.get("completion_tokens") or 0
+    if not cached:
+        token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+        cached = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    return int(prompt), int(completion), int(cached)
+
+
+def estimate_cost(model: str, prompt: int, completion: int, cached: int) -> Optional[float]:
+    """Estimated USD cost of a call, or None for models without a known price"""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    prompt_price, cached_price, completion_price = prices
+    return ((prompt - cached) * prompt_price + cached * cached_price + completion * completion_price) / 1_000_000
+
+
+def tools_in_context(messages: Sequence[BaseMessage]) -> List[str]:
+    """Names of the tools whose results were added since the last AI message"""
+    results = []
+    for message in reversed(messages):
+        if isinstance(message, ToolMessage):
+            results.append(message.tool_call_id)
+        else:
+            break
+    if not results:
+        return []
+    names = {}
+    for message in messages:
+        if isinstance(message, AIMessage):
+            for tool_call in message.tool_calls or []:
+                names[tool_call.get("id")] = tool_call.get("name")
+    return [names.get(tool_call_id, "unknown") for tool_call_id in reversed(results)]
+
+
+class TokenUsageTracker:
+    """Accumulates per-hop token usage for one agent run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hops: List[LLMCallUsage] = []
+
+    def record(self, model: str, response: Any, latency_seconds: float, context_tools: List[str],
+               tier: Optional[str] = None, discarded: bool = False) -> LLMCallUsage:
+        """Record one LLM call (discarded: a duplicate request whose answer was not used)"""
+        prompt, completion, cached = extract_usage(response)
+        with self._lock:
+            hop = LLMCallUsage(
+                hop=len(self._hops) + 1,
+                model=model,
+                tier=tier,
+                prompt_tokens=prompt,
+                completion_tokens=completion,
+                cached_prompt_tokens=cached,
+                latency_ms=latency_seconds * 1000,
+                tool_calls=[tc.get("name") for tc in (getattr(response, "tool_calls", None) or [])],
+                tools_in_context=context_tools,
+                discarded=discarded,
+            )
+            self._hops.append(hop)
+        return hop
+
+    def summary(self) -> TokenUsage:
+        """Aggregate the recorded hops"""
+        with self._lock:
+            hops = list(self._hops)
+        prompt = sum(h.prompt_tokens for h in hops)
+        completion = sum(h.completion_tokens for h in hops)
+        cached = sum(h.cached_prompt_tokens for h in hops)
+        costs = [estimate_cost(h.model, h.prompt_tokens, h.completion_tokens, h.cached_prompt_tokens) for h in hops]
+        return TokenUsage(
+            prompt_tokens=prompt,
+            completion_tokens=completion,
+            cached_prompt_tokens=cached,
+            total_tokens=prompt + completion,
+            llm_calls=len(hops),
+            estimated_cost_usd=sum(costs) if hops and all(c is not None for c in costs) else None,
+            hops=hops,
+        )
@@ -0,0 +1,152 @@
+"""
+Memoization cache for tool results.
+
+Tool results are keyed on the tool name, the canonicalized call arguments and a
+data version supplied by the caller (e.g. the mtimes of the CSV files the tool
+reads), so a cached result is never served once the underlying data changes.
+"""
+import copy
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+# Configuration (overridable through environment variables)
+TOOL_CACHE_ENABLED = os.environ.get("TOOL_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+TOOL_CACHE_MAXSIZE = int(os.environ.get("TOOL_CACHE_MAXSIZE", "256"))
+TOOL_CACHE_TTL_SECONDS = float(os.environ.get("TOOL_CACHE_TTL_SECONDS", "300"))
+
+
+class ToolResultCache:
+    """Thread-safe LRU cache with a per-entry TTL and hit/miss counters"""
+
+    def __init__(self, maxsize: int = TOOL_CACHE_MAXSIZE, ttl_seconds: float = TOOL_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Look up a key.
+
+        Returns:
+            Tuple of (hit, value). value is None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                # Stale entry - drop it and report a miss
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entries if full"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of the cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+# Shared cache used by the tools in app/tools.py
+_tool_cache = ToolResultCache()
+
+
+def make_cache_key(tool_name: str, arguments: Dict[str, Any], data_version: Hashable) -> Tuple:
+    """Build a cache key from the tool name, canonicalized arguments and data version"""
+    canonical_args = json.dumps(arguments, sort_keys=True, default=str)
+    return (tool_name, canonical_args, data_version)
+
+
+def memoize_tool(version_fn: Callable[[], Hashable], cache: ToolResultCache = None) -> Callable:
+    """
+    Decorator that memoizes a tool function.
+
+    Positional and keyword arguments are bound to the function signature (with
+    defaults applied), so `f('P1')` and `f(product_id='P1')` share an entry.
+
+    Args:
+        version_fn: Callable returning the current version of the data the tool reads
+        cache: Cache instance to use (default: the shared tool cache)
+
+    Returns:
+        Decorator for the tool function
+    """
+    def decorator(func: Callable) -> Callable:
+        sig = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            target_cache = cache if cache is not None else _tool_cache
+            if not TOOL_CACHE_ENABLED:
+                return func(*args, **kwargs)
+
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {k: v for k, v in bound.arguments.items() if k != 'config'}
+            key = make_cache_key(func.__name__, arguments, version_fn())
+
+            hit, value = target_cache.get(key)
+            if hit:
+                # Hand out a copy so callers cannot mutate the cached result
+                return copy.deepcopy(value)
+
+            result = func(*args, **kwargs)
+            target_cache.set(key, copy.deepcopy(result))
+            return result
+
+        return wrapper
+    return decorator
+
+
+def get_tool_cache_stats() -> Dict[str, Any]:
+    """Get hit/miss statistics for the shared tool cache"""
+    return _tool_cache.stats()
+
+
+def clear_tool_cache() -> None:
+    """Clear the shared tool cache"""
+    _tool_cache.clear()
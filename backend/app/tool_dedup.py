@@ -0,0 +1,87 @@
+"""
+Per-run deduplication and budgeting of tool calls.
+
+A "run" is the current turn: every message after the latest HumanMessage. The
+tool node answers an exact repeat of an earlier call in the run (same tool,
+same arguments) with the earlier result instead of executing it again, and
+stops executing tools once the run has used MAX_TOOL_CALLS_PER_RUN calls; the
+chatbot node then has to produce a final answer.
+
+Everything is derived from the graph state, so it works the same for one-shot
+runs and for checkpointed conversation threads.
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, Hashable, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+MAX_TOOL_CALLS_PER_RUN = int(os.environ.get("MAX_TOOL_CALLS_PER_RUN", "6"))
+
+BUDGET_EXHAUSTED_MESSAGE = (
+    "Tool call budget for this request is exhausted. Do not call any more tools; "
+    "answer the user's question with the information already gathered."
+)
+DUPLICATE_NOTE = "[Duplicate call: this result was already returned earlier in this request] "
+
+_stats_lock = threading.Lock()
+_stats = {"executed": 0, "deduplicated": 0, "budget_rejected": 0, "forced_answers": 0}
+
+
+def current_run(messages: Sequence[BaseMessage]) -> Sequence[BaseMessage]:
+    """Messages after the latest human message"""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i + 1:]
+    return messages
+
+
+def tool_call_key(tool_name: str, tool_args: Any) -> Hashable:
+    """Key identifying a call by tool name and canonicalized arguments"""
+    return tool_name, json.dumps(tool_args, sort_keys=True, default=str)
+
+
+def previous_results(messages: Sequence[BaseMessage]) -> Dict[Hashable, str]:
+    """
+    Map each tool call already answered in the current run to its result content.
+
+    Error results are left out so a failed call can be retried.
+    """
+    run = current_run(messages)
+    results_by_id = {m.tool_call_id: m.content for m in run if isinstance(m, ToolMessage)}
+    results = {}
+    for message in run:
+        if isinstance(message, AIMessage):
+            for tool_call in message.tool_calls or []:
+                content = results_by_id.get(tool_call.get("id"))
+                if isinstance(content, str) and not content.startswith("Error:") and content != BUDGET_EXHAUSTED_MESSAGE:
+                    results.setdefault(tool_call_key(tool_call.get("name"), tool_call.get("args")),
+                                       content.replace(DUPLICATE_NOTE, "", 1))
+    return results
+
+
+def tool_calls_used(messages: Sequence[BaseMessage]) -> int:
+    """Number of tool results (executed or deduplicated) in the current run"""
+    return sum(1 for m in current_run(messages) if isinstance(m, ToolMessage))
+
+
+def budget_exhausted(messages: Sequence[BaseMessage], budget: int = MAX_TOOL_CALLS_PER_RUN) -> bool:
+    """True once the current run has used its tool call budget"""
+    return tool_calls_used(messages) >= budget
+
+
+def record(outcome: str) -> None:
+    """Count an outcome: executed, deduplicated, budget_rejected or forced_answers"""
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def get_tool_dedup_stats() -> Dict[str, Any]:
+    """Get tool call dedup and budget counters"""
+    with _stats_lock:
+        stats = dict(_stats)
+    calls = stats["executed"] + stats["deduplicated"]
+    stats["dedup_rate"] = stats["deduplicated"] / calls if calls else 0.0
+    stats["max_tool_calls_per_run"] = MAX_TOOL_CALLS_PER_RUN
+    return stats
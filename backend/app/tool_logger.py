@@ -1,102 +1,157 @@
 import os
-import json
 import functools
+import inspect
+import random
 import time
-from typing import Dict, Any, List, Callable
-import threading
+from contextvars import ContextVar
+from typing import Dict, Any, List, Callable, Optional
 
 # Import the tool usage tracker
-from .tool_usage import add_tool_usage, update_tool_output
+from .tool_usage import add_tool_usage, current_tool_call_id
+from .trace_store import get_trace_store
 
 # Create logs directory if it doesn't exist
 LOGS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
 os.makedirs(LOGS_DIR, exist_ok=True)
 
-# Thread-local storage for tracking the current session
-_session_local = threading.local()
+# Output capture: the share of calls whose output is logged, and size caps applied to it
+TOOL_LOG_OUTPUT_SAMPLE_RATE = float(os.environ.get("TOOL_LOG_OUTPUT_SAMPLE_RATE", "1.0"))
+TOOL_LOG_MAX_OUTPUT_ITEMS = int(os.environ.get("TOOL_LOG_MAX_OUTPUT_ITEMS", "100"))
+TOOL_LOG_MAX_OUTPUT_CHARS = int(os.environ.get("TOOL_LOG_MAX_OUTPUT_CHARS", "8192"))
+
+class _LogSession:
+    __slots__ = ("query_id", "tool_calls")
+
+    def __init__(self, query_id: str):
+        self.query_id = query_id
+        self.tool_calls: List[Dict[str, Any]] = []
+
+# The current logging session; a ContextVar so concurrent async requests and
+# work offloaded to thread pools each see their own request's session
+_session: ContextVar[Optional[_LogSession]] = ContextVar("tool_log_session", default=None)
 
 def start_session(query_id: str) -> None:
     """Start a new logging session for a specific query"""
-    _session_local.query_id = query_id
-    _session_local.tool_calls = []
-    
-    # Clear previous log file
-    log_file = os.path.join(LOGS_DIR, f"{query_id}.json")
-    with open(log_file, 'w') as f:
-        json.dump([], f)
+    _session.set(_LogSession(query_id))
+
+def end_session() -> None:
+    """Stop logging tool calls for the current context's session"""
+    _session.set(None)
 
 def get_session_tools() -> List[Dict[str, Any]]:
     """Get the tool calls for the current session"""
-    if not hasattr(_session_local, 'tool_calls'):
-        return []
-    return _session_local.tool_calls
+    session = _session.get()
+    return session.tool_calls if session is not None else []
 
-def log_tool_call(tool_name: str, input_data: Dict[str, Any], output_data: Any) -> None:
+def get_session_query_id() -> Optional[str]:
+    """Get the query ID of the current session, if one is active"""
+    session = _session.get()
+    return session.query_id if session is not None else None
+
+def log_tool_call(tool_name: str, input_data: Dict[str, Any], output_data: Any,
+                  duration_ms: Optional[float] = None, error: Optional[str] = None) -> None:
     """Log a tool call to the current session"""
-    if not hasattr(_session_local, 'query_id') or not hasattr(_session_local, 'tool_calls'):
+    session = _session.get()
+    if session is None:
         return
     
+    # Tools report most failures as an {"error": ...} result rather than raising
+    if error is None and isinstance(output_data, dict) and output_data.get("error"):
+        error = str(output_data["error"])
+
     # Record the tool call
-    step = len(_session_local.tool_calls) + 1
+    step = len(session.tool_calls) + 1
     tool_call = {
+        "query_id": session.query_id,
         "step": step,
         "tool": tool_name,
         "input": input_data,
         "output": output_data,
-        "timestamp": time.time()
+        "timestamp": time.time(),
+        "duration_ms": duration_ms,
+        "error": error
     }
     
     # Add to in-memory list
-    _session_local.tool_calls.append(tool_call)
+    session.tool_calls.append(tool_call)
     
-    # Update the log file
-    log_file = os.path.join(LOGS_DIR, f"{_session_local.query_id}.json")
-    with open(log_file, 'w') as f:
-        json.dump(_session_local.tool_calls, f, indent=2)
+    # Append to the trace store without blocking: its writer thread serializes,
+    # indexes and group-commits, and drops or samples records under backpressure
+    get_trace_store().record(tool_call)
     
-    # Also add to the new tool usage tracker
-    add_tool_usage(tool_name, input_data, output_data)
+    # Calls made by the agent's tool node are already tracked there; only
+    # direct calls get their own usage record
+    if current_tool_call_id() is None:
+        add_tool_usage(tool_name, input_data, output_data)
+
+def _cap_output(value: Any) -> Any:
+    """Shallow size cap: long strings and sequences (top level or one dict level down) are cut"""
+    if isinstance(value, str):
+        if len(value) > TOOL_LOG_MAX_OUTPUT_CHARS:
+            return value[:TOOL_LOG_MAX_OUTPUT_CHARS] + f"... [{len(value) - TOOL_LOG_MAX_OUTPUT_CHARS} more chars]"
+        return value
+    if isinstance(value, (list, tuple)):
+        if len(value) > TOOL_LOG_MAX_OUTPUT_ITEMS:
+            return list(value[:TOOL_LOG_MAX_OUTPUT_ITEMS]) + [f"... [{len(value) - TOOL_LOG_MAX_OUTPUT_ITEMS} more items]"]
+        return value
+    if isinstance(value, dict):
+        for v in value.values():
+            if isinstance(v, (str, list, tuple)) and _cap_output(v) is not v:
+                return {k: _cap_output(v) if isinstance(v, (str, list, tuple)) else v for k, v in value.items()}
+    return value
+
+def _capture_output(result: Any) -> Any:
+    """Output as logged: size-capped, or None when the call is not sampled"""
+    if TOOL_LOG_OUTPUT_SAMPLE_RATE < 1.0 and random.random() >= TOOL_LOG_OUTPUT_SAMPLE_RATE:
+        return None
+    return _cap_output(result)
 
 def tool_logger(func: Callable) -> Callable:
     """Decorator to log tool usage"""
+    # Signature metadata is computed once, at decoration time
+    param_names = tuple(inspect.signature(func).parameters)
+    tool_name = func.__name__
+
+    def capture_input(args, kwargs) -> Dict[str, Any]:
+        # Track the input but filter out config
+        if not args:
+            if 'config' not in kwargs:
+                return kwargs  # Built fresh for this call, so no copy is needed
+            return {k: v for k, v in kwargs.items() if k != 'config'}
+        # Map positional args to their parameter names
+        input_data = {name: arg for name, arg in zip(param_names, args) if name != 'config'}
+        for key, value in kwargs.items():
+            if key != 'config':
+                input_data[key] = value
+        return input_data
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        # Track the input but filter out config
-        input_data = kwargs.copy()
-        if 'config' in input_data:
-            input_data.pop('config')
-            
-        # If positional args, convert to dict representation
-        if args and len(args) > 0:
-            # Get the param names from the function signature
-            import inspect
-            sig = inspect.signature(func)
-            param_names = list(sig.parameters.keys())
-            
-            # Map positional args to their parameter names
-            for i, arg in enumerate(args):
-                if i < len(param_names) and param_names[i] != 'config':
-                    input_data[param_names[i]] = arg
-        
         # Execute the tool
+        start = time.perf_counter()
         try:
             result = func(*args, **kwargs)
-            
-            # Log the tool call
-            log_tool_call(
-                tool_name=func.__name__,
-                input_data=input_data,
-                output_data=result
-            )
-            
-            return result
         except Exception as e:
-            # Log the error
+            # Errors are always logged in full
+            if _session.get() is not None or current_tool_call_id() is None:
+                log_tool_call(
+                    tool_name=tool_name,
+                    input_data=capture_input(args, kwargs),
+                    output_data={"error": str(e)},
+                    duration_ms=(time.perf_counter() - start) * 1000,
+                    error=str(e)
+                )
+            raise
+
+        # Inputs and outputs are only captured when something consumes them:
+        # a logging session, or usage tracking outside the agent's tool node
+        if _session.get() is not None or current_tool_call_id() is None:
             log_tool_call(
-                tool_name=func.__name__,
-                input_data=input_data,
-                output_data={"error": str(e)}
+                tool_name=tool_name,
+                input_data=capture_input(args, kwargs),
+                output_data=_capture_output(result),
+                duration_ms=(time.perf_counter() - start) * 1000
             )
-            raise
+        return result
     
-    return wrapper 
\ No newline at end of file
+    return wrapper
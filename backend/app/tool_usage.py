@@ -1,65 +1,156 @@
 """
 Tool usage tracking for agent operations
+
+Tracking state lives in a ContextVar holding a mutable per-request session, so
+it is isolated between concurrent asyncio tasks (each task runs in its own
+context) and stays visible to work offloaded with a copied context
+(run_in_threadpool, asyncio.to_thread, LangGraph's executors). Records are
+keyed by tool call ID, so starting, finishing and updating a call are O(1).
 """
-import json
-from typing import Dict, Any, List
+import time
 import uuid
-import threading
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional
+
+from . import profiling
+
+
+class ToolCallRecord:
+    """One tool call: its input, output and timing"""
+    __slots__ = ("id", "step", "tool", "input", "output", "error", "started_at", "ended_at", "_start", "_token")
+
+    def __init__(self, call_id: str, step: int, tool: str, tool_input: Dict[str, Any]):
+        self.id = call_id
+        self.step = step
+        self.tool = tool
+        self.input = tool_input
+        self.output = None
+        self.error = None
+        self.started_at = time.time()
+        self.ended_at = None
+        self._start = time.perf_counter()
+        self._token = None
+
+    def finish(self, output: Any = None, error: Optional[str] = None) -> None:
+        self.output = output
+        self.error = error
+        if self.ended_at is None:
+            self.ended_at = self.started_at + (time.perf_counter() - self._start)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return None if self.ended_at is None else (self.ended_at - self.started_at) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "step": self.step,
+            "tool": self.tool,
+            "input": self.input,
+            "output": self.output,
+            "error": self.error,
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+            "duration_ms": self.duration_ms,
+        }
+
+
+class _Session:
+    __slots__ = ("records",)
+
+    def __init__(self):
+        # Insertion-ordered, so iteration follows the step order
+        self.records: Dict[str, ToolCallRecord] = {}
+
+
+_session: ContextVar[Optional[_Session]] = ContextVar("tool_usage_session", default=None)
+# The tool call being executed in this context (set by start_tool_call)
+_active_call: ContextVar[Optional[str]] = ContextVar("tool_usage_active_call", default=None)
+
+
+def _current_session() -> _Session:
+    session = _session.get()
+    if session is None:
+        session = _Session()
+        _session.set(session)
+    return session
 
-# Thread-local storage for tracking tool usage
-_local = threading.local()
 
 def reset_tracker():
     """Reset the tool usage tracker for a new session"""
-    _local.tool_calls = []
-    _local.tool_ids = {}  # Map tool call IDs to our internal IDs
+    _session.set(_Session())
+    _active_call.set(None)
+
+
+def start_tool_call(tool_name: str, tool_input: Dict[str, Any], tool_id: Optional[str] = None) -> str:
+    """
+    Record the start of a tool call and mark it as the active call in this context.
+
+    Args:
+        tool_name: Name of the tool
+        tool_input: Tool arguments
+        tool_id: Tool call ID (e.g. the LLM's tool_call_id); generated if omitted
+
+    Returns:
+        The ID to pass to end_tool_call
+    """
+    session = _current_session()
+    call_id = tool_id if tool_id and tool_id not in session.records else str(uuid.uuid4())
+    record = ToolCallRecord(call_id, len(session.records) + 1, tool_name, tool_input)
+    session.records[call_id] = record
+    record._token = _active_call.set(call_id)
+    return call_id
+
+
+def end_tool_call(tool_id: str, output: Any = None, error: Optional[str] = None) -> bool:
+    """Record the result (or error) and end time of a started tool call"""
+    session = _session.get()
+    record = session.records.get(tool_id) if session is not None else None
+    if record is None:
+        return False
+    record.finish(output, error)
+    if profiling.active_profiles:
+        profiling.record_tool(record.tool, record.duration_ms, error)
+    if record._token is not None:
+        try:
+            _active_call.reset(record._token)
+        except ValueError:
+            # Ended from a different context than it was started in
+            _active_call.set(None)
+        record._token = None
+    return True
+
+
+def current_tool_call_id() -> Optional[str]:
+    """ID of the tool call being executed in this context, if any"""
+    return _active_call.get()
+
 
 def add_tool_usage(tool_name: str, tool_input: Dict[str, Any], tool_output: Any = None, tool_id: str = None):
-    """Add a tool usage record to the tracker"""
-    if not hasattr(_local, 'tool_calls'):
-        reset_tracker()
-        
-    # Generate a unique ID for this tool call
-    internal_id = str(uuid.uuid4())
-    
-    # Create the tool usage record
-    step = len(_local.tool_calls) + 1
-    tool_call = {
-        "id": internal_id,
-        "step": step,
-        "tool": tool_name,
-        "input": tool_input,
-        "output": tool_output
-    }
-    
-    # Add to in-memory list
-    _local.tool_calls.append(tool_call)
-    
-    # If there's an external tool ID, map it to our internal ID
-    if tool_id:
-        _local.tool_ids[tool_id] = internal_id
-        
-    return internal_id
+    """Add a completed tool usage record to the tracker (or complete the record with this ID)"""
+    if tool_id and end_tool_call(tool_id, tool_output):
+        return tool_id
+    session = _current_session()
+    call_id = tool_id or str(uuid.uuid4())
+    record = ToolCallRecord(call_id, len(session.records) + 1, tool_name, tool_input)
+    record.finish(tool_output)
+    session.records[call_id] = record
+    return call_id
+
 
 def update_tool_output(tool_id: str, output: Any):
     """Update the output of a specific tool call"""
-    if not hasattr(_local, 'tool_calls'):
+    session = _session.get()
+    record = session.records.get(tool_id) if session is not None else None
+    if record is None:
         return False
-        
-    # Check if this is an external ID that needs mapping
-    internal_id = _local.tool_ids.get(tool_id, tool_id)
-    
-    # Find and update the matching tool call
-    for tool_call in _local.tool_calls:
-        if tool_call.get("id") == internal_id:
-            tool_call["output"] = output
-            return True
-            
-    return False
+    record.output = output
+    return True
+
 
 def get_tool_usage() -> List[Dict[str, Any]]:
     """Get all tool usage records for the current session"""
-    if not hasattr(_local, 'tool_calls'):
+    session = _session.get()
+    if session is None:
         return []
-        
-    return _local.tool_calls 
\ No newline at end of file
+    return [record.to_dict() for record in session.records.values()]
@@ -2,23 +2,76 @@ import pandas as pd
 from datetime import datetime, timedelta
 from langchain_core.tools import tool
 import os
-from typing import List, Dict, Optional, Union, Any
+import threading
+from typing import List, Dict, Optional, Union, Any, Iterable, Tuple
 
 from .tool_logger import tool_logger
+from .tool_cache import memoize_tool
 
 # Path to data files
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+DATA_FILES = ("products.csv", "inventory.csv", "orders.csv", "order_items.csv")
+
+def get_data_version(file_names: Iterable[str] = DATA_FILES) -> Tuple:
+    """
+    Get a version marker for the given data files.
+    
+    Args:
+        file_names: Data files to include (default: all data files)
+        
+    Returns:
+        Tuple of (file_name, mtime_ns, size) entries; changes whenever a file is rewritten
+    """
+    version = []
+    for file_name in file_names:
+        try:
+            stat = os.stat(os.path.join(DATA_DIR, file_name))
+            version.append((file_name, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            version.append((file_name, None, None))
+    return tuple(version)
+
+def _cached_tool(*file_names: str):
+    """Memoize a raw tool function against the version of the data files it reads"""
+    # Day-window tools compute their date threshold from today's date, so the
+    # date is part of the version as well
+    return memoize_tool(lambda: (datetime.now().strftime('%Y-%m-%d'), get_data_version(file_names)))
+
+# In-memory snapshot of each CSV file, reloaded when the file's (mtime_ns, size) changes.
+# Tools only filter/merge these frames and never modify them in place.
+_snapshots: Dict[str, Tuple[Tuple, pd.DataFrame]] = {}
+_snapshot_lock = threading.Lock()
 
 def _load_data(file_name: str) -> pd.DataFrame:
     """Helper function to load CSV data"""
     file_path = os.path.join(DATA_DIR, file_name)
-    print(f"Loading data from {file_path}")
     if not os.path.exists(file_path):
         print(f"WARNING: Data file {file_path} not found!")
         raise FileNotFoundError(f"Data file {file_path} not found. Make sure to run data_generator.py first.")
-    return pd.read_csv(file_path)
+    version = get_data_version((file_name,))
+    snapshot = _snapshots.get(file_name)
+    if snapshot is not None and snapshot[0] == version:
+        return snapshot[1]
+    with _snapshot_lock:
+        snapshot = _snapshots.get(file_name)
+        if snapshot is not None and snapshot[0] == version:
+            return snapshot[1]
+        print(f"Loading data from {file_path}")
+        df = pd.read_csv(file_path)
+        _snapshots[file_name] = (version, df)
+        return df
+
+def warm_data_snapshot(file_names: Iterable[str] = DATA_FILES) -> Dict[str, int]:
+    """
+    Load the data files into the in-memory snapshot.
+    
+    Returns:
+        Dictionary of file name to row count
+    """
+    return {file_name: len(_load_data(file_name)) for file_name in file_names}
 
-# Original raw functions without decorators for direct use in agent.py
+# Original raw functions (memoized, but without tool decorators) for direct use in agent.py
+@_cached_tool("products.csv")
 def _get_product_info(product_id: str) -> Dict[str, Any]:
     """
     Get information about a specific product by its product_id.
@@ -37,6 +90,7 @@ def _get_product_info(product_id: str) -> Dict[str, Any]:
     
     return product.iloc[0].to_dict()
 
+@_cached_tool("products.csv")
 def _list_products(category: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
     """
     List products, optionally filtered by category.
@@ -57,6 +111,7 @@ def _list_products(category: Optional[str] = None, limit: int = 10) -> List[Dict
     
     return filtered_df.head(limit).to_dict('records')
 
+@_cached_tool("inventory.csv")
 def _get_inventory_level(product_id: str) -> Dict[str, Any]:
     """
     Get current inventory level for a specific product.
@@ -75,6 +130,7 @@ def _get_inventory_level(product_id: str) -> Dict[str, Any]:
     
     return inventory.iloc[0].to_dict()
 
+@_cached_tool("inventory.csv", "products.csv")
 def _list_low_stock_products(threshold: int = 10) -> List[Dict[str, Any]]:
     """
     List all products with inventory levels below the specified threshold.
@@ -98,6 +154,7 @@ def _list_low_stock_products(threshold: int = 10) -> List[Dict[str, Any]]:
     result = pd.merge(low_stock, products_df, on='product_id')
     return result.to_dict('records')
 
+@_cached_tool("orders.csv", "order_items.csv")
 def _get_sales_data_for_product(product_id: str, days: int = 30) -> Dict[str, Any]:
     """
     Get sales data for a specific product over the specified number of days.
@@ -147,6 +204,7 @@ def _get_sales_data_for_product(product_id: str, days: int = 30) -> Dict[str, An
         "num_orders": len(sales)
     }
 
+@_cached_tool("inventory.csv", "orders.csv", "order_items.csv")
 def _estimate_days_of_stock_remaining(product_id: str, days_to_analyze: int = 30) -> Dict[str, Any]:
     """
     Estimate how many days of stock remain for a product based on recent sales velocity.
@@ -210,6 +268,7 @@ def _estimate_days_of_stock_remaining(product_id: str, days_to_analyze: int = 30
         "stock_status": stock_status
     }
 
+@_cached_tool("orders.csv", "order_items.csv", "products.csv")
 def _get_top_selling_products(days: int = 30, limit: int = 5) -> List[Dict[str, Any]]:
     """
     Get the top selling products by quantity over the specified time period.
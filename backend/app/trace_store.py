@@ -0,0 +1,311 @@
+"""
+Segmented, indexed store for tool call traces.
+
+Tool calls logged by tool_logger are appended to rolling JSONL segment files
+(logs/traces/traces-<ms>-<seq>.jsonl). A new segment starts when the current
+one exceeds TRACE_SEGMENT_MAX_BYTES or is older than TRACE_SEGMENT_MAX_AGE
+seconds. Every record is also indexed in a local SQLite database by query_id,
+tool, timestamp, duration and error status, together with its segment and
+byte offset, so query_traces() (and GET /api/traces) can find slow or failing
+calls without scanning files.
+
+Writes go through the same bounded queue and group-commit thread as the JSONL
+log writer: a batch is appended to the segment with one write and indexed in
+one SQLite transaction. A maintenance thread periodically
+  - deletes segments older than TRACE_RETENTION_SECONDS, and the oldest ones
+    beyond TRACE_MAX_TOTAL_BYTES (retention), and
+  - merges runs of small closed segments into one file (compaction).
+"""
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .log_writer import TOOL_LOG_FSYNC_INTERVAL, JsonlLogWriter
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable through environment variables)
+TRACE_DIR = os.environ.get("TRACE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "traces"))
+TRACE_SEGMENT_MAX_BYTES = int(os.environ.get("TRACE_SEGMENT_MAX_BYTES", str(8 * 1024 * 1024)))
+TRACE_SEGMENT_MAX_AGE = float(os.environ.get("TRACE_SEGMENT_MAX_AGE", "3600"))
+TRACE_RETENTION_SECONDS = float(os.environ.get("TRACE_RETENTION_SECONDS", str(7 * 24 * 3600)))
+TRACE_MAX_TOTAL_BYTES = int(os.environ.get("TRACE_MAX_TOTAL_BYTES", str(512 * 1024 * 1024)))
+TRACE_COMPACT_BELOW_BYTES = int(os.environ.get("TRACE_COMPACT_BELOW_BYTES", str(1024 * 1024)))
+TRACE_MAINTENANCE_INTERVAL = float(os.environ.get("TRACE_MAINTENANCE_INTERVAL", "300"))
+TRACE_QUERY_MAX_LIMIT = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS traces (
+    id INTEGER PRIMARY KEY,
+    query_id TEXT,
+    step INTEGER,
+    tool TEXT,
+    ts REAL,
+    duration_ms REAL,
+    error INTEGER,
+    segment TEXT,
+    offset INTEGER,
+    length INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_traces_query ON traces (query_id);
+CREATE INDEX IF NOT EXISTS idx_traces_tool_ts ON traces (tool, ts);
+CREATE INDEX IF NOT EXISTS idx_traces_ts ON traces (ts);
+CREATE INDEX IF NOT EXISTS idx_traces_duration ON traces (duration_ms);
+CREATE INDEX IF NOT EXISTS idx_traces_error_ts ON traces (error, ts);
+CREATE INDEX IF NOT EXISTS idx_traces_segment ON traces (segment);
+"""
+
+
+class TraceStore(JsonlLogWriter):
+    """Rolling JSONL segments plus a SQLite index, written by the log writer's background thread"""
+
+    def __init__(self, directory: str = TRACE_DIR, segment_max_bytes: int = TRACE_SEGMENT_MAX_BYTES,
+                 segment_max_age: float = TRACE_SEGMENT_MAX_AGE, maintenance_interval: float = TRACE_MAINTENANCE_INTERVAL,
+                 **writer_options):
+        super().__init__(**writer_options)
+        self.directory = directory
+        self._segment_max_bytes = segment_max_bytes
+        self._segment_max_age = segment_max_age
+        self._maintenance_interval = maintenance_interval
+        self._segment: Optional[str] = None
+        self._segment_started = 0.0
+        self._segment_size = 0
+        self._sequence = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._index_lock = threading.Lock()
+        self._maintenance_thread: Optional[threading.Thread] = None
+        self._stats.update({"segments_created": 0, "segments_deleted": 0, "segments_compacted": 0, "records_expired": 0})
+
+    # --- Index ---
+
+    def _index(self) -> sqlite3.Connection:
+        """The SQLite index (callers hold _index_lock)"""
+        if self._db is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    def _ensure_started(self) -> None:
+        super()._ensure_started()
+        if self._maintenance_interval > 0 and (self._maintenance_thread is None or not self._maintenance_thread.is_alive()):
+            with self._thread_lock:
+                if self._maintenance_thread is None or not self._maintenance_thread.is_alive():
+                    self._maintenance_thread = threading.Thread(target=self._maintain, name="trace-maintenance", daemon=True)
+                    self._maintenance_thread.start()
+
+    # --- Writes (writer thread) ---
+
+    def record(self, record: Dict[str, Any]) -> bool:
+        """Queue a tool call record (query_id, step, tool, timestamp, duration_ms, error, ...). Never blocks."""
+        return self.write(record.get("query_id") or "", record)
+
+    def _segment_path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _rotate_if_needed(self) -> None:
+        now = time.time()
+        if (self._segment is not None and self._segment_size < self._segment_max_bytes
+                and now - self._segment_started < self._segment_max_age):
+            return
+        self._sequence += 1
+        self._segment = f"traces-{int(now * 1000):013d}-{self._sequence:04d}.jsonl"
+        self._segment_started = now
+        self._segment_size = 0
+        self._count("segments_created")
+
+    def _commit(self, records: List[Tuple[str, Dict[str, Any], str]]) -> None:
+        with self._index_lock:
+            db = self._index()
+            self._rotate_if_needed()
+            path = self._segment_path(self._segment)
+            rows = []
+            chunks = []
+            offset = self._segment_size
+            for _, record, line in records:
+                data = (line + "\n").encode("utf-8")
+                rows.append((
+                    record.get("query_id"), record.get("step"), record.get("tool"), record.get("timestamp"),
+                    record.get("duration_ms"), 1 if record.get("error") else 0, self._segment, offset, len(data),
+                ))
+                chunks.append(data)
+                offset += len(data)
+            try:
+                with open(path, "ab") as f:
+                    f.write(b"".join(chunks))
+                    f.flush()
+                    if self._fsync == "batch":
+                        os.fsync(f.fileno())
+                        self._count("fsyncs")
+                    elif self._fsync == "interval":
+                        self._unsynced.add(path)
+                self._segment_size = offset
+                with db:
+                    db.executemany(
+                        "INSERT INTO traces (query_id, step, tool, ts, duration_ms, error, segment, offset, length) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self._count("written", len(rows))
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"Could not write {len(rows)} trace record(s) to {path}: {e}")
+                self._count("write_errors", len(rows))
+        self._count("batches")
+        if self._fsync == "interval" and self._unsynced and time.monotonic() - self._last_fsync >= TOOL_LOG_FSYNC_INTERVAL:
+            self._sync_pending()
+
+    # --- Queries ---
+
+    def query(self, query_id: Optional[str] = None, tool: Optional[str] = None, since: Optional[float] = None,
+              until: Optional[float] = None, min_duration_ms: Optional[float] = None, error: Optional[bool] = None,
+              limit: int = 100, include_records: bool = False) -> List[Dict[str, Any]]:
+        """
+        Find indexed tool calls, newest first.
+
+        Args:
+            query_id: Only calls made while answering this query
+            tool: Only calls to this tool
+            since: Only calls at or after this Unix timestamp
+            until: Only calls before this Unix timestamp
+            min_duration_ms: Only calls that took at least this long
+            error: Only failed (True) or successful (False) calls
+            limit: Maximum number of results (at most TRACE_QUERY_MAX_LIMIT)
+            include_records: Also read each full record (input and output) from its segment
+
+        Returns:
+            List of trace dicts: query_id, step, tool, timestamp, duration_ms, error (and record)
+        """
+        conditions, params = [], []
+        for clause, value in (("query_id = ?", query_id), ("tool = ?", tool), ("ts >= ?", since),
+                              ("ts < ?", until), ("duration_ms >= ?", min_duration_ms)):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        if error is not None:
+            conditions.append("error = ?")
+            params.append(1 if error else 0)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(max(1, min(limit, TRACE_QUERY_MAX_LIMIT)))
+        with self._index_lock:
+            rows = self._index().execute(
+                f"SELECT query_id, step, tool, ts, duration_ms, error, segment, offset, length FROM traces {where} "
+                f"ORDER BY ts DESC, id DESC LIMIT ?", params).fetchall()
+            traces = []
+            for query_id_, step, tool_, ts, duration_ms, failed, segment, offset, length in rows:
+                trace = {"query_id": query_id_, "step": step, "tool": tool_, "timestamp": ts,
+                         "duration_ms": duration_ms, "error": bool(failed)}
+                if include_records:
+                    trace["record"] = self._read_record(segment, offset, length)
+                traces.append(trace)
+        return traces
+
+    def _read_record(self, segment: str, offset: int, length: int) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._segment_path(segment), "rb") as f:
+                f.seek(offset)
+                return json.loads(f.read(length))
+        except (OSError, ValueError):
+            return None
+
+    # --- Retention and compaction (maintenance thread) ---
+
+    def _closed_segments(self) -> List[Tuple[str, int, float]]:
+        """(name, size, mtime) of segments other than the one being written, oldest first"""
+        segments = []
+        for name in sorted(os.listdir(self.directory)) if os.path.isdir(self.directory) else []:
+            if name.startswith("traces-") and name.endswith(".jsonl") and name != self._segment:
+                stat = os.stat(self._segment_path(name))
+                segments.append((name, stat.st_size, stat.st_mtime))
+        return segments
+
+    def _delete_segment(self, db: sqlite3.Connection, name: str) -> None:
+        with db:
+            expired = db.execute("DELETE FROM traces WHERE segment = ?", (name,)).rowcount
+        os.remove(self._segment_path(name))
+        self._count("segments_deleted")
+        self._count("records_expired", max(0, expired))
+
+    def apply_retention(self, now: Optional[float] = None) -> None:
+        """Delete segments past the retention period, then the oldest beyond the total size cap"""
+        now = time.time() if now is None else now
+        with self._index_lock:
+            db = self._index()
+            segments = self._closed_segments()
+            total = sum(size for _, size, _ in segments) + self._segment_size
+            for name, size, mtime in segments:
+                if now - mtime > TRACE_RETENTION_SECONDS or total > TRACE_MAX_TOTAL_BYTES:
+                    self._delete_segment(db, name)
+                    total -= size
+
+    def compact(self) -> None:
+        """Merge consecutive small closed segments into the first segment of each run"""
+        with self._index_lock:
+            db = self._index()
+            target, target_size = None, 0
+            for name, size, _ in self._closed_segments():
+                if size >= TRACE_COMPACT_BELOW_BYTES:
+                    target = None
+                    continue
+                if target is None or target_size + size > TRACE_COMPACT_BELOW_BYTES:
+                    target, target_size = name, size
+                    continue
+                # Append, re-point the index, then delete: a crash leaves a duplicate tail, never a dangling index row
+                with open(self._segment_path(name), "rb") as source, open(self._segment_path(target), "ab") as dest:
+                    dest.write(source.read())
+                with db:
+                    db.execute("UPDATE traces SET segment = ?, offset = offset + ? WHERE segment = ?", (target, target_size, name))
+                os.remove(self._segment_path(name))
+                target_size += size
+                self._count("segments_compacted")
+
+    def run_maintenance(self) -> None:
+        """Apply retention, then compact"""
+        try:
+            self.apply_retention()
+            self.compact()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Trace store maintenance failed: {e}")
+
+    def _maintain(self) -> None:
+        while True:
+            time.sleep(self._maintenance_interval)
+            self.run_maintenance()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get writer counters plus segment count and size"""
+        stats = super().stats()
+        with self._index_lock:
+            segments = self._closed_segments()
+            stats["segments"] = len(segments) + (1 if self._segment else 0)
+            stats["bytes"] = sum(size for _, size, _ in segments) + self._segment_size
+        return stats
+
+
+_store: Optional[TraceStore] = None
+_store_lock = threading.Lock()
+
+
+def get_trace_store() -> TraceStore:
+    """Get the process-wide trace store (created on first use)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TraceStore()
+                # Write out queued records on interpreter exit too (the server also flushes on shutdown)
+                atexit.register(_store.flush, 2.0)
+    return _store
+
+
+def query_traces(**filters) -> List[Dict[str, Any]]:
+    """Query the process-wide trace store (see TraceStore.query)"""
+    return get_trace_store().query(**filters)
+
+
+def get_trace_store_stats() -> Dict[str, Any]:
+    """Get counters of the process-wide trace store"""
+    return get_trace_store().stats()
@@ -0,0 +1,122 @@
+"""
+Background warmup of slow startup dependencies.
+
+The server starts accepting traffic immediately; the embedding model, the
+Qdrant vector store and the CSV data snapshot are loaded in a background thread
+and their progress is reported by /ready. A step that does not apply to this
+deployment (e.g. the LLM client without a provider key) raises SkipStep and
+does not hold back readiness.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+WARMUP_IN_BACKGROUND = os.environ.get("WARMUP_IN_BACKGROUND", "true").lower() not in ("0", "false", "no")
+
+PENDING = "pending"
+RUNNING = "running"
+READY = "ready"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+_state_lock = threading.Lock()
+_steps: Dict[str, Dict[str, Any]] = {}
+_started_at: Optional[float] = None
+_finished_at: Optional[float] = None
+_thread: Optional[threading.Thread] = None
+
+
+class SkipStep(Exception):
+    """Raised by a warmup step that does not apply; the message is reported as the reason"""
+
+
+def _set_step(name: str, **fields: Any) -> None:
+    with _state_lock:
+        _steps.setdefault(name, {}).update(fields)
+
+
+def _run_steps(steps: List[Tuple[str, Callable[[], Any]]]) -> None:
+    global _finished_at
+    for name, step in steps:
+        _set_step(name, status=RUNNING)
+        start = time.perf_counter()
+        try:
+            step()
+            _set_step(name, status=READY, seconds=round(time.perf_counter() - start, 3))
+            logger.info(f"Warmup step '{name}' finished in {time.perf_counter() - start:.2f}s")
+        except SkipStep as e:
+            _set_step(name, status=SKIPPED, seconds=round(time.perf_counter() - start, 3), reason=str(e))
+            logger.warning(f"Warmup step '{name}' skipped: {e}")
+        except Exception as e:
+            _set_step(name, status=FAILED, seconds=round(time.perf_counter() - start, 3), error=str(e))
+            logger.error(f"Warmup step '{name}' failed: {e}", exc_info=True)
+    with _state_lock:
+        _finished_at = time.time()
+
+
+def start_warmup(steps: List[Tuple[str, Callable[[], Any]]], background: bool = WARMUP_IN_BACKGROUND) -> None:
+    """
+    Run warmup steps in order, in a daemon thread unless background is False.
+
+    A failing step is recorded and does not stop the following steps.
+
+    Args:
+        steps: (name, callable) pairs
+        background: Run in a background thread (default from WARMUP_IN_BACKGROUND)
+    """
+    global _started_at, _finished_at, _thread
+    with _state_lock:
+        _steps.clear()
+        for name, _ in steps:
+            _steps[name] = {"status": PENDING}
+        _started_at = time.time()
+        _finished_at = None
+    if background:
+        _thread = threading.Thread(target=_run_steps, args=(steps,), name="warmup", daemon=True)
+        _thread.start()
+    else:
+        _run_steps(steps)
+
+
+def wait_for_warmup(timeout: Optional[float] = None) -> bool:
+    """Block until the warmup thread finishes; returns True if it has finished"""
+    if _thread is not None:
+        _thread.join(timeout)
+        return not _thread.is_alive()
+    return True
+
+
+def warmup_complete() -> bool:
+    """
+    True once every warmup step has succeeded or been skipped, or if no warmup
+    was started (scripts and tests that set up their own dependencies).
+    Answers produced before then may lack dependencies such as the RAG tool.
+    """
+    with _state_lock:
+        return all(step["status"] in (READY, SKIPPED) for step in _steps.values())
+
+
+def get_warmup_state() -> Dict[str, Any]:
+    """
+    Get the warmup progress.
+
+    Returns:
+        Dictionary with 'ready' (every step succeeded or was skipped), 'finished', elapsed seconds
+        and per-step status
+    """
+    with _state_lock:
+        steps = {name: dict(fields) for name, fields in _steps.items()}
+        started_at, finished_at = _started_at, _finished_at
+    elapsed = None
+    if started_at is not None:
+        elapsed = round((finished_at or time.time()) - started_at, 3)
+    return {
+        "ready": bool(steps) and all(step["status"] in (READY, SKIPPED) for step in steps.values()),
+        "finished": finished_at is not None,
+        "elapsed_seconds": elapsed,
+        "steps": steps,
+    }
@@ -0,0 +1,161 @@
+"""
+Benchmark of the embedding backends: PyTorch (huggingface) vs ONNX Runtime (onnx, onnx-int8).
+
+For each backend it reports
+  - startup: a fresh interpreter's time to import and load the model and
+    embed one query, and its peak RSS,
+  - query latency: mean / p50 / p95 of embed_query over the questions in
+    knowledge_base/rag_questions.md,
+  - document throughput: chunks per second embedding the knowledge base,
+  - retrieval recall against the huggingface backend: the share of the
+    reference top-k chunks each question retrieves when both the questions
+    and the chunks are embedded by the backend (a re-indexed collection),
+    and when only the questions are (querying a collection left as it was).
+
+The ONNX model is exported on first use (needs optimum; see app/onnx_embeddings.py).
+
+Examples:
+    python benchmark_embeddings.py
+    python benchmark_embeddings.py --backends huggingface onnx-int8 --repeats 5 --output load_results/embeddings.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+import data_processing
+
+BACKENDS = ("huggingface", "onnx", "onnx-int8")
+REFERENCE_BACKEND = "huggingface"
+
+
+def build_embeddings(backend: str):
+    """Construct a backend's embedding model (not the shared instance)"""
+    if backend == "huggingface":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=data_processing.EMBEDDING_MODEL)
+    from app.onnx_embeddings import OnnxEmbeddings
+    return OnnxEmbeddings(data_processing.EMBEDDING_MODEL, data_processing.ONNX_MODEL_DIR,
+                          quantized=backend == "onnx-int8")
+
+
+def startup_probe(backend: str) -> None:
+    """Run in a fresh interpreter: time import + load + first query, print JSON"""
+    import resource
+    start = time.perf_counter()
+    embeddings = build_embeddings(backend)
+    loaded = time.perf_counter()
+    embeddings.embed_query("What is the return policy for damaged goods?")
+    done = time.perf_counter()
+    print(json.dumps({
+        "load_seconds": loaded - start,
+        "first_query_seconds": done - loaded,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def measure_startup(backend: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", f"import benchmark_embeddings as b; b.startup_probe({backend!r})"],
+        cwd=data_processing.SCRIPT_DIR, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup probe for {backend} failed:\n{result.stderr[-2000:]}")
+    return {"wall_seconds": wall, **json.loads(result.stdout.strip().splitlines()[-1])}
+
+
+def load_questions() -> List[str]:
+    path = os.path.join(data_processing.KNOWLEDGE_BASE_DIR, "rag_questions.md")
+    with open(path, encoding="utf-8") as f:
+        return [line[2:].strip() for line in f if line.startswith("- ")]
+
+
+def load_chunks() -> List[str]:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=data_processing.CHUNK_SIZE * 4,
+                                              chunk_overlap=data_processing.CHUNK_OVERLAP * 4)
+    chunks = []
+    for name in sorted(os.listdir(data_processing.KNOWLEDGE_BASE_DIR)):
+        if name.endswith(".txt"):
+            with open(os.path.join(data_processing.KNOWLEDGE_BASE_DIR, name), encoding="utf-8") as f:
+                chunks.extend(splitter.split_text(f.read()))
+    return chunks
+
+
+def top_k(query_vectors, doc_vectors, k: int):
+    import numpy as np
+    scores = np.asarray(query_vectors) @ np.asarray(doc_vectors).T  # vectors are unit length
+    return [set(row) for row in np.argsort(-scores, axis=1)[:, :k]]
+
+
+def recall(reference: List[set], candidate: List[set]) -> float:
+    return statistics.mean(len(r & c) / len(r) for r, c in zip(reference, candidate))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backends")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--repeats", type=int, default=3, help="Passes over the questions for latency")
+    parser.add_argument("--k", type=int, default=4, help="Top-k for retrieval recall")
+    parser.add_argument("--skip-startup", action="store_true")
+    parser.add_argument("--output", help="Optional path for a JSON report")
+    args = parser.parse_args()
+
+    backends = list(dict.fromkeys([REFERENCE_BACKEND] + args.backends))
+    questions, chunks = load_questions(), load_chunks()
+    results: Dict[str, Any] = {"questions": len(questions), "chunks": len(chunks), "k": args.k, "backends": {}}
+    vectors = {}
+    for backend in backends:
+        r: Dict[str, Any] = {}
+        if not args.skip_startup:
+            r["startup"] = measure_startup(backend)
+        embeddings = build_embeddings(backend)
+        embeddings.embed_query("warmup")
+        latencies = []
+        for _ in range(args.repeats):
+            for question in questions:
+                start = time.perf_counter()
+                embeddings.embed_query(question)
+                latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        r["query_ms"] = {"mean": statistics.mean(latencies), "p50": latencies[len(latencies) // 2],
+                         "p95": latencies[int(len(latencies) * 0.95)]}
+        start = time.perf_counter()
+        doc_vectors = embeddings.embed_documents(chunks)
+        r["docs_per_second"] = len(chunks) / (time.perf_counter() - start)
+        vectors[backend] = ([embeddings.embed_query(q) for q in questions], doc_vectors)
+        results["backends"][backend] = r
+
+    import numpy as np
+    ref_queries, ref_docs = vectors[REFERENCE_BACKEND]
+    reference = top_k(ref_queries, ref_docs, args.k)
+    for backend, (queries, docs) in vectors.items():
+        r = results["backends"][backend]
+        r["recall_reindexed"] = recall(reference, top_k(queries, docs, args.k))
+        r["recall_mixed"] = recall(reference, top_k(queries, ref_docs, args.k))
+        r["mean_cosine_to_reference"] = float(np.mean(np.sum(np.asarray(docs) * np.asarray(ref_docs), axis=1)))
+
+    print(f"{len(questions)} questions, {len(chunks)} chunks, recall@{args.k} vs {REFERENCE_BACKEND}")
+    print(f"{'backend':<12} {'startup s':>9} {'RSS MB':>7} {'p50 ms':>7} {'p95 ms':>7} {'docs/s':>8} "
+          f"{'recall':>7} {'mixed':>6} {'cosine':>7}")
+    for backend, r in results["backends"].items():
+        startup = r.get("startup", {})
+        print(f"{backend:<12} {startup.get('wall_seconds', float('nan')):>9.2f} "
+              f"{startup.get('peak_rss_mb', float('nan')):>7.0f} {r['query_ms']['p50']:>7.2f} "
+              f"{r['query_ms']['p95']:>7.2f} {r['docs_per_second']:>8.1f} {r['recall_reindexed']:>7.3f} "
+              f"{r['recall_mixed']:>6.3f} {r['mean_cosine_to_reference']:>7.4f}")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Throughput benchmark for knowledge base indexing.
+
+Generates a synthetic knowledge base of policy-style documents, then indexes
+it into a throwaway local Qdrant collection
+  - the previous way (langchain's Qdrant.add_documents over every chunk in one call), and
+  - through the embedding pipeline, for each batch size / process count given,
+and reports chunks per second for each run.
+
+--fake-embeddings swaps the model for deterministic fake vectors, which
+measures the pipeline itself (chunking, batching, upserts) without inference.
+
+Examples:
+    python benchmark_indexing.py --docs 2000
+    python benchmark_indexing.py --docs 100000 --batch-sizes 64 256 --processes 1 4 --skip-baseline
+    python benchmark_indexing.py --docs 5000 --fake-embeddings --output load_results/indexing.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import data_processing
+
+_WORDS = ("order refund shipping carrier inventory restock discount customer policy return warehouse "
+          "supplier invoice damaged express standard threshold approval manager weekly seasonal").split()
+
+
+def fake_embeddings():
+    """Deterministic stand-in model (module level so worker processes can build it)"""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    return DeterministicFakeEmbedding(size=data_processing.VECTOR_SIZE)
+
+
+def write_corpus(directory: str, docs: int, paragraphs: int, seed: int = 7) -> int:
+    """Write docs synthetic .txt files; returns total bytes"""
+    rng = random.Random(seed)
+    total = 0
+    for i in range(docs):
+        body = "\n\n".join(
+            f"Section {p}. " + " ".join(rng.choice(_WORDS) for _ in range(rng.randint(40, 120)))
+            for p in range(paragraphs)
+        )
+        with open(os.path.join(directory, f"doc_{i:06d}.txt"), "w", encoding="utf-8") as f:
+            f.write(body)
+        total += len(body)
+    return total
+
+
+def _new_store(embeddings):
+    from langchain_qdrant import Qdrant
+    from qdrant_client import QdrantClient, models
+
+    client = QdrantClient(":memory:")
+    client.create_collection(data_processing.COLLECTION_NAME, vectors_config=models.VectorParams(
+        size=data_processing.VECTOR_SIZE, distance=models.Distance.COSINE))
+    return Qdrant(client=client, collection_name=data_processing.COLLECTION_NAME, embeddings=embeddings)
+
+
+def run_baseline(kb_dir: str, embeddings, splitter) -> Dict[str, Any]:
+    """Load everything, split everything, then add_documents in one call"""
+    from langchain_community.document_loaders import DirectoryLoader, TextLoader
+
+    start = time.perf_counter()
+    documents = DirectoryLoader(kb_dir, glob="**/*.txt", loader_cls=TextLoader).load()
+    doc_splits = splitter.split_documents(documents)
+    _new_store(embeddings).add_documents(doc_splits)
+    seconds = time.perf_counter() - start
+    return {"chunks": len(doc_splits), "seconds": seconds, "chunks_per_second": len(doc_splits) / seconds}
+
+
+def run_pipeline(kb_dir: str, embeddings, factory, splitter, batch_size: int, processes: int) -> Dict[str, Any]:
+    """Full sync (load, chunk, embed, upsert) through the pipeline"""
+    store = _new_store(embeddings)
+    with tempfile.TemporaryDirectory() as tmp:
+        original_get_embeddings = data_processing.get_embeddings
+        data_processing.get_embeddings = factory  # what worker processes build
+        try:
+            report = data_processing.sync_knowledge_base(
+                store, kb_dir=kb_dir, manifest_path=os.path.join(tmp, "manifest.json"), text_splitter=splitter,
+                processes=processes, batch_size=batch_size,
+            )
+        finally:
+            data_processing.get_embeddings = original_get_embeddings
+    return {"chunks": report["chunks_embedded"], "seconds": report["seconds"],
+            "chunks_per_second": report["chunks_embedded"] / report["seconds"], "pipeline": report["pipeline"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure knowledge base indexing throughput")
+    parser.add_argument("--docs", type=int, default=1000, help="Synthetic documents to generate")
+    parser.add_argument("--paragraphs", type=int, default=4, help="Paragraphs per document")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 128])
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--fake-embeddings", action="store_true", help="Measure the pipeline without a model")
+    parser.add_argument("--tiktoken", action="store_true", help="Chunk with the tiktoken splitter (needs its encoding)")
+    parser.add_argument("--skip-baseline", action="store_true")
+    parser.add_argument("--output", help="Optional path for a JSON report")
+    args = parser.parse_args()
+
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = (data_processing._get_text_splitter() if args.tiktoken else
+                RecursiveCharacterTextSplitter(chunk_size=data_processing.CHUNK_SIZE * 4,
+                                               chunk_overlap=data_processing.CHUNK_OVERLAP * 4))
+    factory = fake_embeddings if args.fake_embeddings else data_processing.get_embeddings
+    embeddings = factory()
+
+    kb_dir = tempfile.mkdtemp(prefix="kb_bench_")
+    results: Dict[str, Any] = {"docs": args.docs, "fake_embeddings": args.fake_embeddings, "runs": []}
+    try:
+        results["corpus_bytes"] = write_corpus(kb_dir, args.docs, args.paragraphs)
+        runs: List[Dict[str, Any]] = results["runs"]
+        if not args.skip_baseline:
+            runs.append({"name": "add_documents", **run_baseline(kb_dir, embeddings, splitter)})
+        for processes in args.processes:
+            for batch_size in args.batch_sizes:
+                run = run_pipeline(kb_dir, embeddings, factory, splitter, batch_size, processes)
+                runs.append({"name": f"pipeline b={batch_size} p={processes}", **run})
+    finally:
+        shutil.rmtree(kb_dir, ignore_errors=True)
+
+    print(f"{args.docs} docs, {results['corpus_bytes'] / 1e6:.1f} MB")
+    print(f"{'run':<28} {'chunks':>8} {'seconds':>9} {'chunks/s':>10}")
+    for run in results["runs"]:
+        print(f"{run['name']:<28} {run['chunks']:>8} {run['seconds']:>9.2f} {run['chunks_per_second']:>10.1f}")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
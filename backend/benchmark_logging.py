@@ -0,0 +1,112 @@
+"""
+Benchmark of logging overhead per request.
+
+Replays the log calls one RAG-backed request makes (tool args, the retriever
+result, the streamed response) against a real file handler, once with the
+previous eager f-string logging of full payloads and once with the logging
+policy in app/log_policy.py (lazy %-formatting, truncation, hashing, sampled
+DEBUG payloads). Reports microseconds and bytes written per request at INFO
+and at DEBUG level.
+
+Examples:
+    python benchmark_logging.py
+    python benchmark_logging.py --requests 5000 --docs 8 --output load_results/logging.json
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+from langchain_core.documents import Document
+
+from app.log_policy import digest, log_payload, truncated
+
+logger = logging.getLogger("benchmark_logging")
+
+
+def make_payload(docs: int) -> Dict[str, Any]:
+    """A retriever result and a response the size of typical RAG requests"""
+    result = [
+        Document(page_content="Return policy: damaged items can be returned within 30 days. " * 20,
+                 metadata={"source": f"docs/policy_{i}.md", "chunk": i})
+        for i in range(docs)
+    ]
+    response = "You can return damaged goods within 30 days of delivery. " * 15
+    return {"args": {"query": "return policy for damaged goods"}, "result": result, "response": response}
+
+
+def eager_request(payload: Dict[str, Any]) -> None:
+    """The log calls of a request before the logging policy"""
+    tool_args, result, response_content = payload["args"], payload["result"], payload["response"]
+    logger.info(f"Executing tool 'query_internal_documents' (ID: call_1) with args: {tool_args}")
+    logger.info(f"<<< RAG TOOL CALL >>> Querying retriever with: '{tool_args['query']}'")
+    logger.info(f"<<< RAG TOOL RAW RESULT >>> Retriever returned: {result}")
+    logger.info(f"<<< RAG TOOL RAW RESULT >>> Number of documents: {len(result)}")
+    logger.info(f"Tool 'query_internal_documents' (ID: call_1) completed successfully.")
+    logger.info(f"Preparing to stream response content: '{response_content}'")
+
+
+def policy_request(payload: Dict[str, Any]) -> None:
+    """The same log calls under the logging policy"""
+    tool_args, result, response_content = payload["args"], payload["result"], payload["response"]
+    logger.info("Executing tool '%s' (ID: %s) with args: %s", "query_internal_documents", "call_1", truncated(tool_args))
+    logger.info("<<< RAG TOOL CALL >>> Querying retriever with: '%s'", truncated(tool_args["query"]))
+    logger.info("<<< RAG TOOL RAW RESULT >>> Number of documents: %s, content: %s", len(result), digest(result))
+    log_payload(logger, "<<< RAG TOOL RAW RESULT >>> Retriever returned:", result)
+    logger.info("Tool '%s' (ID: %s) completed successfully.", "query_internal_documents", "call_1")
+    logger.info("Preparing to stream response content: %s", digest(response_content))
+    log_payload(logger, "Response content:", response_content)
+
+
+def measure(request: Callable[[Dict[str, Any]], None], payload: Dict[str, Any], requests: int,
+            level: int, path: str) -> Dict[str, float]:
+    handler = logging.FileHandler(path, mode="w")
+    handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(levelname)s %(message)s"))
+    logger.handlers = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+    start = time.perf_counter()
+    for _ in range(requests):
+        request(payload)
+    elapsed = time.perf_counter() - start
+    handler.close()
+    return {"us_per_request": elapsed / requests * 1e6, "bytes_per_request": os.path.getsize(path) / requests}
+
+
+def run(requests: int, docs: int) -> Dict[str, Any]:
+    payload = make_payload(docs)
+    results: Dict[str, Any] = {"requests": requests, "docs": docs, "levels": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.log")
+        for level_name, level in (("INFO", logging.INFO), ("DEBUG", logging.DEBUG)):
+            results["levels"][level_name] = {
+                "before": measure(eager_request, payload, requests, level, path),
+                "after": measure(policy_request, payload, requests, level, path),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure logging overhead per request")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests to replay per variant")
+    parser.add_argument("--docs", type=int, default=5, help="Documents in the retriever result")
+    parser.add_argument("--output", help="Optional path for a JSON report")
+    args = parser.parse_args()
+
+    results = run(args.requests, args.docs)
+    print(f"{'level':<6} {'variant':<8} {'us/request':>11} {'bytes/request':>14}")
+    for level_name, variants in results["levels"].items():
+        for variant, r in variants.items():
+            print(f"{level_name:<6} {variant:<8} {r['us_per_request']:>11.1f} {r['bytes_per_request']:>14.0f}")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
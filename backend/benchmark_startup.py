@@ -0,0 +1,130 @@
+"""
+Startup-time benchmark for the agent backend.
+
+Imports `main` in fresh interpreters with `python -X importtime` and reports
+the total import time and the most expensive modules (cumulative and
+self time, plus per top-level package). With --warmup it also runs the
+background warmup steps in-process and reports how long each takes.
+
+Examples:
+    python benchmark_startup.py --runs 5
+    python benchmark_startup.py --runs 3 --top 30 --warmup --output load_results/startup.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure_imports(module: str = "main") -> Dict[str, Any]:
+    """
+    Import a module in a fresh interpreter and parse the -X importtime report.
+
+    Returns:
+        Dictionary with wall-clock seconds and per-module self/cumulative microseconds
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SCRIPT_DIR, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = {"self_us": int(self_us), "cumulative_us": int(cumulative_us), "depth": len(indent) // 2}
+    return {"wall_seconds": wall, "modules": modules}
+
+
+def summarize(runs: List[Dict[str, Any]], module: str, top: int) -> Dict[str, Any]:
+    """Median per-module costs across runs"""
+    cumulative = defaultdict(list)
+    self_time = defaultdict(list)
+    packages = defaultdict(lambda: [0] * len(runs))
+    for i, run in enumerate(runs):
+        for name, stats in run["modules"].items():
+            cumulative[name].append(stats["cumulative_us"])
+            self_time[name].append(stats["self_us"])
+            packages[name.split(".")[0]][i] += stats["self_us"]
+
+    def top_ms(values: Dict[str, List[int]]) -> List[Dict[str, Any]]:
+        medians = {name: statistics.median(v) / 1000 for name, v in values.items()}
+        return [{"module": name, "ms": round(ms, 1)} for name, ms in sorted(medians.items(), key=lambda kv: -kv[1])[:top]]
+
+    return {
+        "module": module,
+        "runs": len(runs),
+        "import_ms_median": round(statistics.median(cumulative[module]) / 1000, 1) if cumulative[module] else None,
+        "interpreter_wall_seconds_median": round(statistics.median(r["wall_seconds"] for r in runs), 3),
+        "top_cumulative": top_ms(cumulative),
+        "top_self": top_ms(self_time),
+        "top_packages": top_ms(packages),
+    }
+
+
+def measure_warmup() -> Dict[str, Any]:
+    """Run the server's lifespan startup in-process and wait for the warmup steps to finish"""
+    import asyncio
+    sys.path.insert(0, SCRIPT_DIR)
+    import main
+    from app.warmup import get_warmup_state, wait_for_warmup
+
+    async def run_lifespan():
+        async with main.lifespan(main.app):
+            await asyncio.to_thread(wait_for_warmup)
+
+    asyncio.run(run_lifespan())
+    return get_warmup_state()
+
+
+def print_report(summary: Dict[str, Any], warmup_state: Dict[str, Any] = None) -> None:
+    print(f"\nImport of '{summary['module']}' (median of {summary['runs']} runs): {summary['import_ms_median']} ms")
+    print(f"Interpreter start + import wall time: {summary['interpreter_wall_seconds_median']} s")
+    for title, key in (("Cumulative", "top_cumulative"), ("Self", "top_self"), ("Per package (self)", "top_packages")):
+        print(f"\n{title}:")
+        for row in summary[key]:
+            print(f"  {row['ms']:>9.1f} ms  {row['module']}")
+    if warmup_state:
+        print(f"\nWarmup (ready={warmup_state['ready']}, {warmup_state['elapsed_seconds']} s):")
+        for name, step in warmup_state["steps"].items():
+            print(f"  {name:<16} {step['status']:<8} {step.get('seconds', '-')} s {step.get('error', '')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import and warmup cost of the backend")
+    parser.add_argument("--module", default="main", help="Module to import (default: main)")
+    parser.add_argument("--runs", type=int, default=3, help="Number of fresh-interpreter imports")
+    parser.add_argument("--top", type=int, default=15, help="Number of modules to list")
+    parser.add_argument("--warmup", action="store_true", help="Also time the warmup steps (loads the embedding model)")
+    parser.add_argument("--output", default=None, help="Optional JSON output path")
+    args = parser.parse_args()
+
+    runs = [measure_imports(args.module) for _ in range(args.runs)]
+    summary = summarize(runs, args.module, args.top)
+    warmup_state = measure_warmup() if args.warmup else None
+    print_report(summary, warmup_state)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"imports": summary, "warmup": warmup_state}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Micro-benchmark of the per-call overhead of the tool_logger decorator.
+
+Times a trivial tool undecorated, wrapped by the previous implementation
+(inspect.signature and a kwargs copy on every call, full output logged) and
+wrapped by the current one, in three situations:
+  - tool_node:  called inside a tracked tool call without a logging session
+                (the agent's tool node; nothing consumes the capture),
+  - session:    a logging session is active (records go to a trace store),
+  - large_output: as 'session', with a 5,000-item result.
+Traces are written to a temporary directory.
+
+Examples:
+    python benchmark_tool_logger.py
+    python benchmark_tool_logger.py --calls 200000 --output load_results/tool_logger.json
+"""
+import argparse
+import functools
+import json
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict
+
+from app import tool_logger
+from app.tool_usage import reset_tracker, start_tool_call, end_tool_call
+from app.trace_store import TraceStore
+
+
+def legacy_tool_logger(func: Callable) -> Callable:
+    """The decorator before signature caching and capped, on-demand capture"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        input_data = kwargs.copy()
+        if 'config' in input_data:
+            input_data.pop('config')
+        if args and len(args) > 0:
+            import inspect
+            sig = inspect.signature(func)
+            param_names = list(sig.parameters.keys())
+            for i, arg in enumerate(args):
+                if i < len(param_names) and param_names[i] != 'config':
+                    input_data[param_names[i]] = arg
+        result = func(*args, **kwargs)
+        tool_logger.log_tool_call(tool_name=func.__name__, input_data=input_data, output_data=result)
+        return result
+    return wrapper
+
+
+def small_tool(product_id: str, days: int = 30) -> Dict[str, Any]:
+    return {"product_id": product_id, "days": days, "units": 12}
+
+
+def large_tool(product_id: str, days: int = 30) -> Dict[str, Any]:
+    return {"product_id": product_id, "rows": [{"day": i, "units": i % 7} for i in range(5000)]}
+
+
+def time_calls(fn: Callable, calls: int) -> float:
+    """Mean seconds per call of fn('P301', 30)"""
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn("P301", 30)
+    return (time.perf_counter() - start) / calls
+
+
+def run(calls: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {"calls": calls, "scenarios": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Large queue so the benchmark measures the request path, not backpressure
+        store = TraceStore(directory=tmp, maintenance_interval=0, fsync="off", queue_size=calls * 2)
+        original_get_trace_store = tool_logger.get_trace_store
+        tool_logger.get_trace_store = lambda: store
+        try:
+            for scenario, tool, n in (("tool_node", small_tool, calls), ("session", small_tool, calls),
+                                      ("large_output", large_tool, max(1, calls // 100))):
+                reset_tracker()
+                if scenario == "tool_node":
+                    call_id = start_tool_call(tool.__name__, {})
+                else:
+                    tool_logger.start_session(f"bench-{scenario}")
+                timings = {}
+                for name, fn in (("undecorated", tool), ("before", legacy_tool_logger(tool)),
+                                 ("after", tool_logger.tool_logger(tool))):
+                    time_calls(fn, min(n, 1000))  # warm up
+                    timings[name] = time_calls(fn, n)
+                    store.flush(timeout=60)
+                if scenario == "tool_node":
+                    end_tool_call(call_id)
+                tool_logger.end_session()
+                base = timings["undecorated"]
+                results["scenarios"][scenario] = {
+                    "calls": n,
+                    "undecorated_us": base * 1e6,
+                    "before_overhead_us": (timings["before"] - base) * 1e6,
+                    "after_overhead_us": (timings["after"] - base) * 1e6,
+                }
+        finally:
+            tool_logger.get_trace_store = original_get_trace_store
+        results["trace_store"] = store.stats()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure tool_logger per-call overhead")
+    parser.add_argument("--calls", type=int, default=50000, help="Calls per variant")
+    parser.add_argument("--output", help="Optional path for a JSON report")
+    args = parser.parse_args()
+
+    results = run(args.calls)
+    print(f"{'scenario':<14} {'calls':>8} {'tool (us)':>10} {'before (us)':>12} {'after (us)':>11}")
+    for scenario, r in results["scenarios"].items():
+        print(f"{scenario:<14} {r['calls']:>8} {r['undecorated_us']:>10.2f} "
+              f"{r['before_overhead_us']:>12.2f} {r['after_overhead_us']:>11.2f}")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,15 @@
 import os
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_qdrant import Qdrant
-from qdrant_client import QdrantClient, models
+import hashlib
+import json
 import logging
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+# The embedding, loader and Qdrant libraries are imported inside the functions
+# that use them: they dominate import time, and the server loads them in a
+# background warmup task instead of on the startup path.
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,21 +22,315 @@ KNOWLEDGE_BASE_DIR = os.path.join(SCRIPT_DIR, "knowledge_base") # Path relative
 QDRANT_PATH = os.path.join(SCRIPT_DIR, "qdrant_db") # Path relative to this script
 COLLECTION_NAME = "internal_docs"
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# "huggingface" (PyTorch via sentence-transformers) or "onnx" (ONNX Runtime, see app/onnx_embeddings.py)
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "huggingface").lower()
+ONNX_MODEL_DIR = os.environ.get("ONNX_MODEL_DIR", os.path.join(SCRIPT_DIR, "models", "all-MiniLM-L6-v2-onnx"))
+ONNX_QUANTIZED = os.environ.get("ONNX_QUANTIZED", "true").lower() not in ("0", "false", "no")
 CHUNK_SIZE = 700
 CHUNK_OVERLAP = 50
 VECTOR_SIZE = 384
+# Per-file and per-chunk content hashes of what is indexed (see sync_knowledge_base)
+MANIFEST_PATH = os.path.join(QDRANT_PATH, "kb_manifest.json")
+# Bring the collection up to date with the knowledge base when the server starts
+KB_SYNC_ON_STARTUP = os.environ.get("KB_SYNC_ON_STARTUP", "true").lower() not in ("0", "false", "no")
+
+# Chunk IDs are derived from the file path and chunk content, so re-indexing a
+# chunk overwrites the same point instead of adding a duplicate
+_CHUNK_ID_NAMESPACE = uuid.UUID("5b0f6f1e-2f4c-4b7a-9d59-0c7d3f2a8e41")
+_MANIFEST_VERSION = 1
+
+# Shared embedding model instance (loaded on first use)
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+# Vector store set up by setup_vector_store(), reused by sync_knowledge_base()
+_vectorstore = None
+_sync_lock = threading.Lock()
+_last_sync: Optional[Dict[str, Any]] = None
+# Bumped whenever a sync changes the collection's points (keys the RAG caches)
+_collection_version = 0
+
+
+def get_embedding_backend():
+    """
+    Returns the configured embedding backend as recorded in the index manifest:
+    "huggingface", "onnx-int8" or "onnx".
+    """
+    if EMBEDDING_BACKEND == "huggingface":
+        return "huggingface"
+    if EMBEDDING_BACKEND == "onnx":
+        return "onnx-int8" if ONNX_QUANTIZED else "onnx"
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{EMBEDDING_BACKEND}' (expected 'huggingface' or 'onnx')")
+
+
+def get_embeddings():
+    """
+    Returns the shared embedding model (EMBEDDING_BACKEND), loading it on first use.
+    The same instance is used for the vector store and for query-level caches.
+    """
+    global _embeddings
+    if _embeddings is None:
+        # The warmup thread and the first requests may get here together; load the model once
+        with _embeddings_lock:
+            if _embeddings is None:
+                backend = get_embedding_backend()
+                logger.info(f"Initializing embedding model: {EMBEDDING_MODEL} ({backend})")
+                if backend == "huggingface":
+                    from langchain_huggingface import HuggingFaceEmbeddings
+                    _embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+                else:
+                    from app.onnx_embeddings import OnnxEmbeddings
+                    _embeddings = OnnxEmbeddings(EMBEDDING_MODEL, ONNX_MODEL_DIR, quantized=ONNX_QUANTIZED)
+    return _embeddings
+
+
+def _get_text_splitter():
+    """Returns the splitter used to chunk knowledge base files"""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, disallowed_special=()
+    )
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _index_settings() -> Dict[str, Any]:
+    """Settings that change every chunk's content or vector; a change forces a rebuild"""
+    return {
+        "version": _MANIFEST_VERSION,
+        "collection": COLLECTION_NAME,
+        "embedding_model": EMBEDDING_MODEL,
+        # Backends give close but not identical vectors; switching re-indexes
+        "embedding_backend": get_embedding_backend(),
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+    }
+
+
+def _load_manifest(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable knowledge base manifest {path}: {e}")
+        return None
+
+
+def _save_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    # Write to a temporary file first so a crash never leaves a partial manifest
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def _chunk_file(path: str, relative_path: str, text: str, text_splitter) -> Dict[str, Dict[str, Any]]:
+    """
+    Splits one file into chunks keyed by stable chunk ID.
+
+    The ID is derived from the file's relative path, the chunk's content hash
+    and the occurrence of that content within the file, so unchanged chunks of
+    an edited file keep their IDs.
+    """
+    chunks = {}
+    occurrences: Dict[str, int] = {}
+    for chunk_text in text_splitter.split_text(text):
+        chunk_hash = _sha256(chunk_text.encode("utf-8"))
+        occurrence = occurrences.get(chunk_hash, 0)
+        occurrences[chunk_hash] = occurrence + 1
+        chunk_id = str(uuid.uuid5(_CHUNK_ID_NAMESPACE, f"{relative_path}\0{chunk_hash}\0{occurrence}"))
+        chunks[chunk_id] = {"sha256": chunk_hash, "text": chunk_text, "metadata": {"source": path}}
+    return chunks
+
+
+def _clear_collection(vectorstore) -> None:
+    """Drops and recreates the collection (used when the manifest cannot be trusted)"""
+    from qdrant_client import models
+
+    client = vectorstore.client
+    client.delete_collection(collection_name=vectorstore.collection_name)
+    client.create_collection(
+        collection_name=vectorstore.collection_name,
+        vectors_config=models.VectorParams(size=VECTOR_SIZE, distance=models.Distance.COSINE)
+    )
+
+
+def sync_knowledge_base(vectorstore=None, kb_dir: str = KNOWLEDGE_BASE_DIR, manifest_path: str = MANIFEST_PATH,
+                        text_splitter=None, rebuild: bool = False, processes: Optional[int] = None,
+                        batch_size: Optional[int] = None, progress=None) -> Dict[str, Any]:
+    """
+    Brings the vector store up to date with the knowledge base directory.
+
+    The manifest records, per file, its size, mtime and content hash, and the
+    ID and content hash of each of its chunks. Files whose size and mtime are
+    unchanged are skipped without being read; files whose content hash is
+    unchanged are skipped without being chunked. Only chunks that are new are
+    embedded and upserted, and chunks that no longer exist (edited or deleted
+    files) are deleted, so the work scales with the size of the change.
+
+    New chunks stream through the embedding pipeline (app/embedding_pipeline.py)
+    as files are chunked: batched embedding, optionally on worker processes,
+    overlapped with the Qdrant upserts.
+
+    Args:
+        vectorstore: Qdrant vector store to update (default: the one set up by setup_vector_store)
+        kb_dir: Knowledge base directory
+        manifest_path: Where the manifest is kept
+        text_splitter: Chunking splitter (default: the tiktoken splitter)
+        rebuild: Clear the collection and index everything, e.g. when the
+            collection was (re)created or the manifest is missing or stale
+        processes: Embedding worker processes. By default a rebuild with the
+            shared embedding model uses one per CPU core (KB_EMBED_PROCESSES)
+            and incremental syncs, which are small, embed in-process
+        batch_size: Chunks per embedding batch (default KB_EMBED_BATCH_SIZE)
+        progress: Optional callback (chunks done, total, chunks per second)
+
+    Returns:
+        A report of files and chunks added, changed, removed and unchanged,
+        with the pipeline's throughput under "pipeline"
+    """
+    global _last_sync, _collection_version
+    from app.embedding_pipeline import EmbeddingPipeline, default_processes
+
+    vectorstore = vectorstore or _vectorstore
+    if vectorstore is None:
+        raise RuntimeError("Vector store is not initialized")
+    start = time.perf_counter()
+
+    with _sync_lock:
+        manifest = _load_manifest(manifest_path)
+        settings = _index_settings()
+        if manifest is None or manifest.get("settings") != settings:
+            if not rebuild:
+                logger.info("Knowledge base manifest missing or built with other settings; rebuilding the collection.")
+            rebuild = True
+        if rebuild:
+            _clear_collection(vectorstore)
+            # Forget the old files right away, so a rebuild that fails part-way is redone by the next sync
+            _save_manifest(manifest_path, {"settings": settings, "files": {}})
+            manifest = None
+        old_files: Dict[str, Any] = (manifest or {}).get("files", {})
+        new_files: Dict[str, Any] = {}
+        report = {"rebuilt": rebuild, "files_added": 0, "files_changed": 0, "files_removed": 0,
+                  "files_unchanged": 0, "chunks_embedded": 0, "chunks_deleted": 0, "chunks_unchanged": 0}
+        deletes = []
+        splitter = text_splitter or _get_text_splitter()
+
+        def new_chunks():
+            """Walks the knowledge base, updating the manifest and yielding chunks to embed"""
+            for root, _, files in os.walk(kb_dir):
+                for file_name in sorted(files):
+                    if not file_name.endswith(".txt"):
+                        continue
+                    path = os.path.join(root, file_name)
+                    relative_path = os.path.relpath(path, kb_dir).replace(os.sep, "/")
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    old = old_files.get(relative_path)
+                    if old and old["mtime_ns"] == stat.st_mtime_ns and old["size"] == stat.st_size:
+                        new_files[relative_path] = old
+                        report["files_unchanged"] += 1
+                        report["chunks_unchanged"] += len(old["chunks"])
+                        continue
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    file_hash = _sha256(data)
+                    if old and old["sha256"] == file_hash:
+                        # Touched but not edited
+                        new_files[relative_path] = {**old, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+                        report["files_unchanged"] += 1
+                        report["chunks_unchanged"] += len(old["chunks"])
+                        continue
+
+                    chunks = _chunk_file(path, relative_path, data.decode("utf-8", "replace"), splitter)
+                    old_chunks = old["chunks"] if old else {}
+                    deletes.extend(chunk_id for chunk_id in old_chunks if chunk_id not in chunks)
+                    report["chunks_unchanged"] += sum(1 for chunk_id in chunks if chunk_id in old_chunks)
+                    report["files_changed" if old else "files_added"] += 1
+                    new_files[relative_path] = {
+                        "mtime_ns": stat.st_mtime_ns,
+                        "size": stat.st_size,
+                        "sha256": file_hash,
+                        "chunks": {chunk_id: chunk["sha256"] for chunk_id, chunk in chunks.items()},
+                    }
+                    for chunk_id, chunk in chunks.items():
+                        if chunk_id not in old_chunks:
+                            yield chunk_id, chunk["text"], chunk["metadata"]
+
+        if processes is None:
+            # Worker processes load their own copy of the shared model, which only pays off for a full index
+            processes = default_processes() if rebuild and vectorstore.embeddings is _embeddings else 1
+        pipeline = EmbeddingPipeline(
+            vectorstore.client, vectorstore.collection_name, embeddings=vectorstore.embeddings,
+            embeddings_factory=get_embeddings, batch_size=batch_size, processes=processes, progress=progress,
+            content_payload_key=vectorstore.content_payload_key, metadata_payload_key=vectorstore.metadata_payload_key,
+        )
+        pipeline_report = pipeline.run(new_chunks())
+
+        for relative_path, old in old_files.items():
+            if relative_path not in new_files:
+                deletes.extend(old["chunks"])
+                report["files_removed"] += 1
+        if deletes:
+            logger.info(f"Deleting {len(deletes)} removed chunks from '{vectorstore.collection_name}'.")
+            vectorstore.delete(ids=deletes)
+        report["chunks_embedded"] = pipeline_report["chunks"]
+        report["chunks_deleted"] = len(deletes)
+        report["pipeline"] = pipeline_report
+        if rebuild or report["chunks_embedded"] or report["chunks_deleted"]:
+            _collection_version += 1
+
+        _save_manifest(manifest_path, {"settings": settings, "files": new_files})
+        report["seconds"] = time.perf_counter() - start
+        report["synced_at"] = time.time()
+        _last_sync = report
+
+    logger.info(
+        f"Knowledge base sync: {report['files_added']} added, {report['files_changed']} changed, "
+        f"{report['files_removed']} removed, {report['files_unchanged']} unchanged files; "
+        f"{report['chunks_embedded']} chunks embedded ({pipeline_report['chunks_per_second']:.1f} chunks/s), "
+        f"{report['chunks_deleted']} deleted in {report['seconds']:.2f}s"
+    )
+    return report
+
+
+def get_collection_version() -> int:
+    """Returns a counter that changes whenever the collection's points change"""
+    return _collection_version
+
+
+def _make_retriever(vectorstore):
+    """Retriever over the vector store with cached query embeddings and results (see app/rag_cache.py)"""
+    from app.rag_cache import CachedRetriever
+    return CachedRetriever(vectorstore=vectorstore)
+
+
+def get_kb_index_stats() -> Optional[Dict[str, Any]]:
+    """Returns the report of the last knowledge base sync (None if none ran)"""
+    return dict(_last_sync) if _last_sync else None
 
 
 def setup_vector_store():
     """
-    Loads documents from the knowledge base, chunks them, generates embeddings,
-    and sets up a persistent Qdrant vector store.
+    Sets up the persistent Qdrant vector store and brings it up to date with
+    the knowledge base (see sync_knowledge_base): a new collection is fully
+    indexed, an existing one only re-embeds what changed.
     """
+    global _vectorstore
+    from langchain_qdrant import Qdrant
+    from qdrant_client import QdrantClient, models
+
     logger.info(f"Knowledge base directory configured to: {KNOWLEDGE_BASE_DIR}")
     logger.info(f"Qdrant database path configured to: {QDRANT_PATH}")
     
-    logger.info(f"Initializing embedding model: {EMBEDDING_MODEL}")
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    embeddings = get_embeddings()
     vectorstore = None
     client = None # Define client outside try/except to ensure it's available if needed later
 
@@ -51,7 +350,14 @@ def setup_vector_store():
                 embeddings=embeddings
             )
             logger.info("Successfully loaded existing vector store.")
-            return vectorstore.as_retriever() # Successfully loaded existing store
+            _vectorstore = vectorstore
+            if KB_SYNC_ON_STARTUP:
+                try:
+                    sync_knowledge_base(vectorstore)
+                except Exception as sync_e:
+                    # Serve the collection as it is; /api/admin/reindex can retry
+                    logger.error(f"Knowledge base sync failed, serving the existing collection: {sync_e}", exc_info=True)
+            return _make_retriever(vectorstore) # Successfully loaded existing store
 
         except ValueError as e: # Specifically catch "Collection not found"
             if "not found" in str(e).lower():
@@ -74,12 +380,6 @@ def setup_vector_store():
     # In either case, we attempt to create/recreate the collection and populate.
 
     try:
-        logger.info(f"Loading documents from: {KNOWLEDGE_BASE_DIR}")
-        loader = DirectoryLoader(
-            KNOWLEDGE_BASE_DIR, glob="**/*.txt", loader_cls=TextLoader, show_progress=True
-        )
-        documents = loader.load()
-
         if not client: # If initial client creation failed, try creating one now for the new DB
             logger.info("Re-initializing QdrantClient for new database creation.")
             client = QdrantClient(path=QDRANT_PATH) # This might recreate the db dir if deleted
@@ -95,28 +395,13 @@ def setup_vector_store():
                 vectors_config=models.VectorParams(size=VECTOR_SIZE, distance=models.Distance.COSINE)
             )
 
-        if not documents:
-            logger.warning(f"No documents found in {KNOWLEDGE_BASE_DIR}. Collection '{COLLECTION_NAME}' will be empty (or remain as is if it existed).")
-            # Initialize Qdrant wrapper for the (potentially empty) collection
-            vectorstore = Qdrant(client=client, collection_name=COLLECTION_NAME, embeddings=embeddings)
-        else:
-            logger.info(f"Loaded {len(documents)} documents.")
-            text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-                chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, disallowed_special=()
-            )
-            doc_splits = text_splitter.split_documents(documents)
-            logger.info(f"Split documents into {len(doc_splits)} chunks.")
-            
-            logger.info(f"Initializing Qdrant wrapper for collection '{COLLECTION_NAME}' before adding documents.")
-            vectorstore = Qdrant(
-                client=client,
-                collection_name=COLLECTION_NAME,
-                embeddings=embeddings
-            )
-            logger.info(f"Adding {len(doc_splits)} document chunks to collection '{COLLECTION_NAME}'...")
-            # Use the add_documents method of the Langchain Qdrant wrapper
-            vectorstore.add_documents(doc_splits)
-            logger.info(f"Successfully added documents to collection '{COLLECTION_NAME}'.")
+        vectorstore = Qdrant(client=client, collection_name=COLLECTION_NAME, embeddings=embeddings)
+        _vectorstore = vectorstore
+        # Any manifest left over describes a collection that no longer exists
+        logger.info(f"Indexing {KNOWLEDGE_BASE_DIR} into collection '{COLLECTION_NAME}'...")
+        report = sync_knowledge_base(vectorstore, rebuild=True)
+        if not report["chunks_embedded"]:
+            logger.warning(f"No documents found in {KNOWLEDGE_BASE_DIR}. Collection '{COLLECTION_NAME}' will be empty.")
 
     except Exception as creation_e:
         logger.error(f"CRITICAL FAILURE during collection creation/population: {creation_e}", exc_info=True)
@@ -126,7 +411,7 @@ def setup_vector_store():
         logger.error("Vectorstore initialization failed. RAG tool will not be available.")
         return None
 
-    return vectorstore.as_retriever()
+    return _make_retriever(vectorstore)
 
 
 if __name__ == "__main__":
@@ -80,6 +80,20 @@ def run_evaluation(output_file: str = "evaluation_results.json"):
             "answer": response_obj.model_dump(),
         })
         
+    # Summarize which model cascade tier answered, with token totals and estimated cost
+    tier_summary = {}
+    for r in results:
+        debug = r["answer"].get("debug") or {}
+        tier = debug.get("model_tier") or debug.get("route") or "unknown"
+        summary = tier_summary.setdefault(tier, {"answers": 0, "tokens": 0, "cost_usd": 0.0})
+        summary["answers"] += 1
+        token_usage = debug.get("token_usage") or {}
+        summary["tokens"] += token_usage.get("total_tokens") or 0
+        summary["cost_usd"] += token_usage.get("estimated_cost_usd") or 0.0
+    print("\n--- Answers by model tier ---")
+    for tier, summary in tier_summary.items():
+        print(f"{tier}: {summary['answers']} answers, {summary['tokens']} tokens, ${summary['cost_usd']:.4f}")
+
     # Save raw results
     print(f"Saving results to {output_file}...")
     with open(output_file, "w") as f:
@@ -0,0 +1,87 @@
+"""
+OpenAI-compatible HTTP server backed by the offline scripted model.
+
+Serves POST /v1/chat/completions with the ScriptedChatModel from
+app/fake_llm.py, so the real ChatOpenAI client, its network timeouts and the
+retry/hedging policy in app/llm_resilience.py can be exercised without an API
+key. Latency, a slow tail and retryable errors are configured with the same
+FAKE_LLM_* environment variables (a simulated error returns HTTP 503).
+
+Examples:
+    FAKE_LLM_LATENCY_MS=400 FAKE_LLM_SLOW_RATE=0.05 FAKE_LLM_SLOW_MS=8000 \\
+        uvicorn fake_llm_server:app --port 9000
+
+    # Point the backend at it
+    OPENAI_API_KEY=fake OPENAI_BASE_URL=http://localhost:9000/v1 uvicorn main:app --port 8000
+"""
+import json
+import time
+import uuid
+from typing import Any, Dict, List
+
+from fastapi import FastAPI
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+from app.fake_llm import FakeLLMServerError, get_fake_llm
+
+app = FastAPI(title="Fake OpenAI-compatible LLM server")
+
+
+def to_messages(payload: List[Dict[str, Any]]) -> List[BaseMessage]:
+    """Convert OpenAI chat messages to LangChain messages"""
+    messages = []
+    for message in payload:
+        role = message.get("role")
+        content = message.get("content") or ""
+        if role == "system":
+            messages.append(SystemMessage(content=content))
+        elif role == "user":
+            messages.append(HumanMessage(content=content))
+        elif role == "assistant":
+            tool_calls = [
+                {"name": tc["function"]["name"], "args": json.loads(tc["function"].get("arguments") or "{}"), "id": tc["id"]}
+                for tc in message.get("tool_calls") or []
+            ]
+            messages.append(AIMessage(content=content, tool_calls=tool_calls))
+        elif role == "tool":
+            messages.append(ToolMessage(content=content, tool_call_id=message.get("tool_call_id", "")))
+    return messages
+
+
+def to_completion(message: AIMessage, model: str) -> Dict[str, Any]:
+    """Convert a LangChain AIMessage to an OpenAI chat completion response"""
+    tool_calls = [
+        {"id": tc["id"], "type": "function", "function": {"name": tc["name"], "arguments": json.dumps(tc["args"])}}
+        for tc in message.tool_calls
+    ]
+    usage = message.usage_metadata or {}
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": message.content or None, "tool_calls": tool_calls or None},
+            "finish_reason": "tool_calls" if tool_calls else "stop",
+        }],
+        "usage": {
+            "prompt_tokens": usage.get("input_tokens", 0),
+            "completion_tokens": usage.get("output_tokens", 0),
+            "total_tokens": usage.get("total_tokens", 0),
+        },
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(body: Dict[str, Any]):
+    tool_names = [t["function"]["name"] for t in body.get("tools") or [] if t.get("type") == "function"]
+    model = get_fake_llm().model_copy(update={"tool_names": tool_names})
+    try:
+        # The scripted model sleeps to emulate latency; keep the event loop free
+        message = await run_in_threadpool(model.invoke, to_messages(body.get("messages") or []))
+    except FakeLLMServerError as e:
+        return JSONResponse(status_code=503, content={"error": {"message": str(e), "type": "server_error"}})
+    return to_completion(message, body.get("model", "fake"))
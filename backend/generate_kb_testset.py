@@ -17,6 +17,8 @@ from ragas.embeddings import LangchainEmbeddingsWrapper
 from ragas.testset.graph import KnowledgeGraph, Node, NodeType
 from ragas.testset.transforms import apply_transforms, default_transforms
 
+from app.log_policy import log_payload, truncated
+
 # Explicitly import transforms we will use
 # from ragas.testset.transforms import (
 #     SummaryExtractor, 
@@ -114,16 +116,20 @@ def generate_testset_for_document(source_file_path: Path, output_dir: Path, gene
     print(f"Applying default transformations to KG for {source_file_path.name}...")
     try:
         apply_transforms(kg, transforms_to_apply) 
-        logger.info(f"Finished applying default transforms. KG for {source_file_path.name}: {kg}")
+        logger.info("Finished applying default transforms. KG for %s: %s", source_file_path.name, truncated(kg))
         print(f"Finished default transformations. KG for {source_file_path.name}: {kg}")
         
-        # Detailed KG logging
-        logger.info(f"--- KG Details for {source_file_path.name} POST-TRANSFORM ---")
-        for i, node in enumerate(kg.nodes):
-            logger.info(f"Node {i}: id={node.id}, type={node.type}, properties={node.properties}")
-        for i, rel in enumerate(kg.relationships):
-            logger.info(f"Relationship {i}: source_id={rel.source.id if rel.source else None}, target_id={rel.target.id if rel.target else None}, type={rel.type}, properties={rel.properties}")
-        logger.info(f"--- End KG Details for {source_file_path.name} ---")
+        # Detailed KG logging: counts at INFO; per-node/relationship details at DEBUG,
+        # sampled (LOG_PAYLOAD_SAMPLE_RATE) with properties (e.g. embeddings) truncated
+        logger.info("--- KG Details for %s POST-TRANSFORM: %d nodes, %d relationships ---",
+                    source_file_path.name, len(kg.nodes), len(kg.relationships))
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, node in enumerate(kg.nodes):
+                log_payload(logger, f"Node {i}: id={node.id}, type={node.type}, properties=", node.properties)
+            for i, rel in enumerate(kg.relationships):
+                log_payload(logger, f"Relationship {i}: source_id={rel.source.id if rel.source else None}, "
+                                    f"target_id={rel.target.id if rel.target else None}, type={rel.type}, properties=", rel.properties)
+        logger.info("--- End KG Details for %s ---", source_file_path.name)
 
     except Exception as e:
         logger.error(f"Error applying default transforms for {source_file_path.name}: {e}", exc_info=True)
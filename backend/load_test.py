@@ -0,0 +1,293 @@
+"""
+HTTP load generator for the agent backend.
+
+Replays question sets against /api/chat, /api/test_rag and /api/debug on a
+running server, either closed-loop (a fixed number of concurrent workers) or
+open-loop (Poisson arrivals at a fixed rate), and reports throughput, latency
+percentiles, time-to-first-byte and error rates per endpoint.
+
+Examples:
+    # 8 concurrent workers, 200 requests spread over all endpoints
+    python load_test.py --concurrency 8 --requests 200
+
+    # Open-loop at 5 requests/second for 60 seconds against /api/chat only,
+    # compared with an earlier run
+    python load_test.py --endpoints chat --rate 5 --duration 60 --compare load_results/baseline.json
+
+Start the server offline with the scripted model to measure our own overhead:
+    LLM_PROVIDER=fake FAKE_LLM_LATENCY_MS=500 uvicorn main:app --port 8000
+"""
+import argparse
+import ast
+import asyncio
+import glob
+import json
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(SCRIPT_DIR)
+
+DEFAULT_BASE_URL = os.getenv("LOAD_TEST_BASE_URL", "http://localhost:8000")
+DEFAULT_RESULTS_DIR = os.path.join(SCRIPT_DIR, "load_results")
+
+ENDPOINTS = {
+    "chat": "/api/chat",
+    "test_rag": "/api/test_rag",
+    "debug": "/api/debug",
+}
+
+
+# --- Question sets ---
+
+def load_evaluation_questions() -> List[str]:
+    """
+    Read TEST_QUESTIONS from evaluation.py without importing it
+    (importing would pull in ragas and the whole agent stack).
+    """
+    path = os.path.join(SCRIPT_DIR, "evaluation.py")
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == "TEST_QUESTIONS" for t in node.targets):
+            return list(ast.literal_eval(node.value))
+    return []
+
+
+def load_csv_questions(path: str) -> List[str]:
+    """Read questions from a testset CSV ('question' or 'user_input' column)"""
+    df = pd.read_csv(path)
+    for column in ("question", "user_input"):
+        if column in df.columns:
+            return [str(q) for q in df[column].dropna().tolist()]
+    print(f"Warning: {path} has no 'question' or 'user_input' column, skipping.")
+    return []
+
+
+def load_questions(sources: List[str]) -> List[str]:
+    """
+    Collect questions from the requested sources.
+
+    Args:
+        sources: Any of 'evaluation' (evaluation.TEST_QUESTIONS), 'sop_returns'
+            (kb_sop_returns_testset.csv), 'generated' (generated_testsets/testset_*.csv)
+            or a path to a CSV file
+
+    Returns:
+        List of questions
+    """
+    questions = []
+    for source in sources:
+        if source == "evaluation":
+            questions += load_evaluation_questions()
+        elif source == "sop_returns":
+            path = os.path.join(REPO_ROOT, "kb_sop_returns_testset.csv")
+            if os.path.exists(path):
+                questions += load_csv_questions(path)
+        elif source == "generated":
+            for path in sorted(glob.glob(os.path.join(SCRIPT_DIR, "generated_testsets", "testset_*.csv"))):
+                questions += load_csv_questions(path)
+        else:
+            questions += load_csv_questions(source)
+    return questions
+
+
+# --- Requests ---
+
+def build_payload(endpoint: str, question: str) -> Dict[str, Any]:
+    if endpoint == "chat":
+        return {"messages": [{"role": "user", "content": question}]}
+    return {"query": question}
+
+
+async def send_request(session: aiohttp.ClientSession, base_url: str, endpoint: str, question: str) -> Dict[str, Any]:
+    """Send one request and time it (TTFB is measured at the first body chunk)"""
+    sample = {"endpoint": endpoint, "question": question, "status": None, "error": None}
+    start = time.perf_counter()
+    ttfb = None
+    try:
+        async with session.post(base_url + ENDPOINTS[endpoint], json=build_payload(endpoint, question)) as response:
+            sample["status"] = response.status
+            async for _ in response.content.iter_any():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+            if response.status >= 400:
+                sample["error"] = f"HTTP {response.status}"
+    except Exception as e:
+        sample["error"] = f"{type(e).__name__}: {e}"
+    end = time.perf_counter()
+    sample["start"] = start
+    sample["latency"] = end - start
+    sample["ttfb"] = ttfb if ttfb is not None else end - start
+    return sample
+
+
+def _next_job(questions: List[str], endpoints: List[str], index: int):
+    return endpoints[index % len(endpoints)], questions[index % len(questions)]
+
+
+async def run_closed_loop(base_url, questions, endpoints, concurrency, total_requests, duration, timeout):
+    """A fixed number of workers, each sending its next request as soon as the last one finishes"""
+    samples = []
+    counter = {"next": 0}
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def worker(session):
+        while True:
+            index = counter["next"]
+            if total_requests and index >= total_requests:
+                return
+            if deadline and time.perf_counter() >= deadline:
+                return
+            counter["next"] += 1
+            endpoint, question = _next_job(questions, endpoints, index)
+            samples.append(await send_request(session, base_url, endpoint, question))
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    return samples
+
+
+async def run_open_loop(base_url, questions, endpoints, rate, total_requests, duration, timeout):
+    """Poisson arrivals at a fixed rate, independent of how fast the server responds"""
+    tasks = []
+    index = 0
+    start = time.perf_counter()
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        while True:
+            if total_requests and index >= total_requests:
+                break
+            if duration and time.perf_counter() - start >= duration:
+                break
+            endpoint, question = _next_job(questions, endpoints, index)
+            tasks.append(asyncio.create_task(send_request(session, base_url, endpoint, question)))
+            index += 1
+            await asyncio.sleep(random.expovariate(rate))
+        return list(await asyncio.gather(*tasks))
+
+
+# --- Reporting ---
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    series = pd.Series(values) * 1000
+    return {
+        "p50": float(series.quantile(0.50)),
+        "p95": float(series.quantile(0.95)),
+        "p99": float(series.quantile(0.99)),
+        "mean": float(series.mean()),
+        "max": float(series.max()),
+    }
+
+
+def summarize(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per-endpoint throughput, latency/TTFB percentiles (ms) and error rate"""
+    summary = {}
+    for endpoint in sorted({s["endpoint"] for s in samples}):
+        endpoint_samples = [s for s in samples if s["endpoint"] == endpoint]
+        ok = [s for s in endpoint_samples if s["error"] is None]
+        first_start = min(s["start"] for s in endpoint_samples)
+        last_end = max(s["start"] + s["latency"] for s in endpoint_samples)
+        wall = max(last_end - first_start, 1e-9)
+        summary[endpoint] = {
+            "requests": len(endpoint_samples),
+            "errors": len(endpoint_samples) - len(ok),
+            "error_rate": (len(endpoint_samples) - len(ok)) / len(endpoint_samples),
+            "throughput_rps": len(ok) / wall,
+            "latency_ms": _percentiles([s["latency"] for s in ok]),
+            "ttfb_ms": _percentiles([s["ttfb"] for s in ok]),
+            "error_examples": sorted({s["error"] for s in endpoint_samples if s["error"]})[:5],
+        }
+    return summary
+
+
+def print_summary(summary: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    print(f"\n{'endpoint':<10} {'reqs':>6} {'err%':>6} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'ttfb p50':>9}")
+    for endpoint, stats in summary.items():
+        lat, ttfb = stats["latency_ms"], stats["ttfb_ms"]
+        fmt = lambda v: f"{v:9.1f}" if v is not None else f"{'-':>9}"
+        print(
+            f"{endpoint:<10} {stats['requests']:>6} {100 * stats['error_rate']:>5.1f}% {stats['throughput_rps']:>8.2f}"
+            f" {fmt(lat['p50'])} {fmt(lat['p95'])} {fmt(lat['p99'])} {fmt(ttfb['p50'])}"
+        )
+        if baseline and endpoint in baseline:
+            base = baseline[endpoint]
+            for key in ("p50", "p95", "p99"):
+                new, old = lat[key], base["latency_ms"][key]
+                if new is not None and old:
+                    print(f"{'':<10} latency {key}: {old:.1f} -> {new:.1f} ms ({100 * (new - old) / old:+.1f}%)")
+            old_rps = base["throughput_rps"]
+            if old_rps:
+                print(f"{'':<10} throughput: {old_rps:.2f} -> {stats['throughput_rps']:.2f} rps "
+                      f"({100 * (stats['throughput_rps'] - old_rps) / old_rps:+.1f}%)")
+        for error in stats["error_examples"]:
+            print(f"{'':<10} error: {error}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test the AI COO Agent backend")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL, help="Server base URL")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=list(ENDPOINTS), help="Endpoints to exercise (round-robin)")
+    parser.add_argument("--questions", nargs="+", default=["evaluation", "sop_returns", "generated"],
+                        help="Question sources: evaluation, sop_returns, generated, or CSV paths")
+    parser.add_argument("--concurrency", type=int, default=4, help="Closed-loop workers (ignored with --rate)")
+    parser.add_argument("--rate", type=float, default=None, help="Open-loop arrival rate in requests/second")
+    parser.add_argument("--requests", type=int, default=None, help="Total number of requests")
+    parser.add_argument("--duration", type=float, default=None, help="Test duration in seconds")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--shuffle", action="store_true", help="Shuffle questions (seeded)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for shuffling and arrivals")
+    parser.add_argument("--output", default=None, help="Results JSON path (default: load_results/load_<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    if not args.requests and not args.duration:
+        args.requests = 100
+
+    random.seed(args.seed)
+    questions = load_questions(args.questions)
+    if not questions:
+        print("No questions found for the requested sources. Exiting.")
+        return
+    if args.shuffle:
+        random.shuffle(questions)
+
+    mode = f"open-loop at {args.rate} rps" if args.rate else f"closed-loop with {args.concurrency} workers"
+    print(f"Replaying {len(questions)} questions against {args.base_url} ({mode}), endpoints: {args.endpoints}")
+
+    started_at = time.time()
+    if args.rate:
+        samples = await run_open_loop(args.base_url, questions, args.endpoints, args.rate, args.requests, args.duration, args.timeout)
+    else:
+        samples = await run_closed_loop(args.base_url, questions, args.endpoints, args.concurrency, args.requests, args.duration, args.timeout)
+
+    summary = summarize(samples)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f).get("summary")
+    print_summary(summary, baseline)
+
+    output = args.output or os.path.join(DEFAULT_RESULTS_DIR, f"load_{time.strftime('%Y%m%d_%H%M%S', time.localtime(started_at))}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    results = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "started_at": started_at,
+        "summary": summary,
+        "samples": [{k: v for k, v in s.items() if k != "start"} for s in samples],
+    }
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,15 +1,17 @@
 import os
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 # from pydantic import BaseModel # No longer needed directly if all models imported
 import uvicorn
 from app.agent import get_agent_response, agent_app
-from typing import Dict, Any, List, Literal # Keep for type hinting if used outside models
+from typing import Dict, Any, List, Literal, Optional # Keep for type hinting if used outside models
 import json
 import logging
 from contextlib import asynccontextmanager
 # from vercel_ai.fastapi import StreamingTextResponse # Commenting out Vercel specific
 from starlette.responses import StreamingResponse # Using Starlette's generic StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, JSONResponse
 from pydantic import BaseModel # Add Pydantic BaseModel if not already explicitly imported for new model
 
 # Import models from app.models
@@ -24,44 +26,64 @@ from app.models import (
 
 # Import RAG setup functions and the agent module using relative paths
 # since main.py is run from within the backend directory
-from data_processing import setup_vector_store
+from data_processing import setup_vector_store, get_embeddings, sync_knowledge_base
 from tools import create_query_internal_docs_tool
 from app import agent as agent_module # To access agent_module.instrumented_tools
+from app.metrics import register_collectors, render_metrics, RETRIEVAL_DURATION
+from app.token_usage import TokenUsageTracker
+from app.tools import warm_data_snapshot
+from app.warmup import start_warmup, get_warmup_state, SkipStep
+from app.log_policy import digest, log_payload
+from app.tool_usage import reset_tracker
+from app import profiling
+from app.trace_store import get_trace_store, query_traces
 
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    try:
-        # --- Startup ---
-        logger.info("Application startup: Initializing RAG retriever and tool...")
-        retriever = setup_vector_store()
-        if retriever:
-            agent_module.rag_retriever = retriever # Store retriever if needed elsewhere
-            rag_tool = create_query_internal_docs_tool(retriever)
-            if rag_tool:
-                logger.info(f"RAG tool '{rag_tool.name}' created successfully.")
-                # Append the raw RAG tool directly to the agent's tool list
-                # No instrumentation needed here anymore
-                agent_module.tools.append(rag_tool)
-                logger.info(f"Appended '{rag_tool.name}' to agent_module.tools. Current tools: {[t.name for t in agent_module.tools]}")
-            else:
-                logger.error("Failed to create RAG tool from retriever.")
-        else:
-            logger.error("RAG retriever initialization failed. RAG tool will not be available.")
+    # --- Startup ---
+    # The slow dependencies load in the background so the server accepts traffic
+    # right away; /ready reports when they are warm.
+    start_warmup([
+        ("data_snapshot", warm_data_snapshot),
+        ("embedding_model", _warm_embedding_model),
+        ("vector_store", _setup_rag_tool),
+        ("llm_client", _warm_llm_client),
+    ])
+    yield
+    # --- Shutdown ---
+    logger.info("Application shutdown.")
+    # Write out trace records still queued for the trace store's writer
+    await run_in_threadpool(get_trace_store().flush)
 
-        yield
-        # --- Shutdown ---
-        logger.info("Application shutdown.")
-        # Add any cleanup logic here if needed
 
-    except Exception as e:
-        logger.critical(f"Critical error during RAG setup on application startup: {e}", exc_info=True)
-        # Depending on policy, either raise the exception to stop the app
-        # or yield to allow the app to start without the RAG tool.
-        # Raising is safer if RAG is critical.
-        # raise # Uncomment to prevent app start on critical RAG error
-        yield # Allow app to start but RAG tool might be missing
+def _warm_embedding_model():
+    """Load the embedding model and run one query through it"""
+    get_embeddings().embed_query("warmup")
+
+
+def _warm_llm_client():
+    """Build the LLM client; skipped (not failed) when no provider is configured"""
+    if not agent_module.llm_configured():
+        raise SkipStep("No API key found for OpenAI or Anthropic")
+    agent_module.get_llm()
+
+
+def _setup_rag_tool():
+    """Initialize the RAG retriever and add the RAG tool to the agent's tools"""
+    logger.info("Initializing RAG retriever and tool...")
+    retriever = setup_vector_store()
+    if not retriever:
+        raise RuntimeError("RAG retriever initialization failed. RAG tool will not be available.")
+    agent_module.rag_retriever = retriever # Store retriever if needed elsewhere
+    rag_tool = create_query_internal_docs_tool(retriever)
+    if not rag_tool:
+        raise RuntimeError("Failed to create RAG tool from retriever.")
+    logger.info(f"RAG tool '{rag_tool.name}' created successfully.")
+    # Append the raw RAG tool directly to the agent's tool list
+    agent_module.tools.append(rag_tool)
+    logger.info(f"Appended '{rag_tool.name}' to agent_module.tools. Current tools: {[t.name for t in agent_module.tools]}")
 
 
 # Create FastAPI app with lifespan manager
@@ -96,9 +118,49 @@ async def read_root():
         "message": "AI COO Agent Backend is running"
     }
 
+# Readiness endpoint: 200 once every warmup step has succeeded, 503 until then
+@app.get("/ready")
+async def ready():
+    state = get_warmup_state()
+    return JSONResponse(content=state, status_code=200 if state["ready"] else 503)
+
+# Prometheus metrics endpoint
+register_collectors()
+
+@app.get("/metrics")
+async def metrics():
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+# Recent tool call traces, filtered through the trace store's index
+@app.get("/api/traces")
+async def traces(query_id: Optional[str] = None, tool: Optional[str] = None, since: Optional[float] = None,
+                 until: Optional[float] = None, min_duration_ms: Optional[float] = None, error: Optional[bool] = None,
+                 limit: int = 100, include_records: bool = False):
+    results = await run_in_threadpool(
+        query_traces, query_id=query_id, tool=tool, since=since, until=until,
+        min_duration_ms=min_duration_ms, error=error, limit=limit, include_records=include_records,
+    )
+    return {"traces": results, "count": len(results)}
+
+# Re-index the knowledge base: only new or edited chunks are embedded, removed ones are deleted
+@app.post("/api/admin/reindex")
+async def reindex_knowledge_base(rebuild: bool = False):
+    if agent_module.rag_retriever is None:
+        raise HTTPException(status_code=503, detail="Vector store is not initialized yet")
+    return await run_in_threadpool(sync_knowledge_base, rebuild=rebuild)
+
+# Stored request profiles (see app/profiling.py)
+@app.get("/api/profiles/{profile_id}")
+async def get_request_profile(profile_id: str):
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
 # Detailed debug information endpoint
 @app.post("/api/debug")
-async def debug_agent(request: QueryRequest):
+async def debug_agent(request: QueryRequest, http_request: Request):
     try:
         if not request.query.strip():
             raise HTTPException(status_code=400, detail="Query cannot be empty")
@@ -110,10 +172,22 @@ async def debug_agent(request: QueryRequest):
         }
         
         # Enable full trace
-        config = {"recursion_limit": 25, "traceable": True}
+        token_tracker = TokenUsageTracker()
+        config = {"recursion_limit": 25, "traceable": True, "configurable": {"token_tracker": token_tracker}}
         
-        # Run the agent
-        result = agent_app.invoke(initial_state, config=config)
+        # Run the agent (profiled on request: X-Profile header or ?profile=1)
+        # in the threadpool, so the event loop keeps serving other requests meanwhile
+        profile = None
+        if profiling.requested(http_request.headers, http_request.query_params):
+            reset_tracker()
+            try:
+                result, profile = await run_in_threadpool(
+                    profiling.run_profiled, agent_app.invoke, initial_state, config=config
+                )
+            except profiling.ProfilerBusyError as e:
+                raise HTTPException(status_code=409, detail=str(e))
+        else:
+            result = await run_in_threadpool(agent_app.invoke, initial_state, config=config)
         
         # Examine each message
         message_data = []
@@ -161,13 +235,18 @@ async def debug_agent(request: QueryRequest):
                 trace_data = json.loads(json.dumps(trace_data, default=str))
             except Exception as e:
                 trace_data = {"error": str(e)}
+        if profile is not None:
+            trace_data = {**(trace_data or {}), "profile": profile}
         
         return {
             "response": result["messages"][-1].content if result["messages"] else "",
             "message_data": message_data,
             "message_count": len(result["messages"]),
+            "token_usage": token_tracker.summary().model_dump(),
             "trace_data": trace_data
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -187,7 +266,8 @@ async def test_rag_tool(request: RAGTestRequest):
 
     logger.info(f"/api/test_rag called with query: '{request.query}'")
     try:
-        retrieved_docs = await agent_module.rag_retriever.ainvoke(request.query)
+        with RETRIEVAL_DURATION.labels(source="test_rag").time():
+            retrieved_docs = await agent_module.rag_retriever.ainvoke(request.query)
         contexts = [doc.page_content for doc in retrieved_docs]
         
         answer = ""
@@ -205,7 +285,7 @@ async def test_rag_tool(request: RAGTestRequest):
 
 # Chat endpoint - MODIFIED
 @app.post("/api/chat")
-async def chat_with_agent_sdk(request: ChatRequestVercelAI): # Uses ChatRequestVercelAI from app.models
+async def chat_with_agent_sdk(request: ChatRequestVercelAI, http_request: Request): # Uses ChatRequestVercelAI from app.models
     try:
         if not request.messages:
             raise HTTPException(status_code=400, detail="No messages provided")
@@ -219,13 +299,32 @@ async def chat_with_agent_sdk(request: ChatRequestVercelAI): # Uses ChatRequestV
             raise HTTPException(status_code=400, detail="User query content cannot be empty")
 
         # get_agent_response will now return an AgentLogicResponse Pydantic model instance
-        agent_response_obj: AgentLogicResponse = get_agent_response(user_query)
+        # Run it in the threadpool so concurrent requests overlap (and identical ones coalesce)
+        # Clients continue a conversation by sending the same data.thread_id with each request;
+        # earlier turns then come from the checkpointer instead of being re-queried
+        thread_id = (request.data or {}).get("thread_id")
+        # data.mode selects 'react' or 'planner' per request (default: AGENT_MODE)
+        mode = (request.data or {}).get("mode")
+        profile = None
+        if profiling.requested(http_request.headers, http_request.query_params):
+            # The profile runs inside the worker thread so cProfile sees the agent's work
+            try:
+                agent_response_obj, profile = await run_in_threadpool(
+                    profiling.run_profiled, get_agent_response, user_query, thread_id, mode
+                )
+            except profiling.ProfilerBusyError as e:
+                raise HTTPException(status_code=409, detail=str(e))
+            agent_response_obj.trace_data = {**(agent_response_obj.trace_data or {}), "profile": profile}
+        else:
+            agent_response_obj: AgentLogicResponse = await run_in_threadpool(get_agent_response, user_query, thread_id, mode)
         
         # Log the Pydantic model (optional, but can be useful)
         # logger.info(f"AgentLogicResponse object: {agent_response_obj.model_dump_json(indent=2)}")
 
         response_content = agent_response_obj.response # Access via attribute
-        logger.info(f"Preparing to stream response content: '{response_content}'") # Log the content
+        # Log a hash of the content; the (truncated) content itself only in sampled DEBUG logs
+        logger.info("Preparing to stream response content: %s", digest(response_content))
+        log_payload(logger, "Response content:", response_content)
 
         async def content_stream():
             if response_content: # Check if there is content to send
@@ -233,7 +332,9 @@ async def chat_with_agent_sdk(request: ChatRequestVercelAI): # Uses ChatRequestV
                 yield f"0:{json.dumps(response_content)}\n"
             # else: yield nothing or an empty marker if required by protocol
 
-        return StreamingResponse(content_stream(), media_type="text/plain")
+        # The text stream cannot carry the profile; clients fetch it from /api/profiles/<id>
+        headers = {"X-Profile-Id": profile["profile_id"]} if profile is not None else None
+        return StreamingResponse(content_stream(), media_type="text/plain", headers=headers)
 
     except HTTPException: # Re-raise HTTPExceptions directly
         raise
@@ -0,0 +1,104 @@
+"""
+Test the small/large model cascade policy
+"""
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from app import agent
+from app.cascade import escalation_reason, run_start_tier, SMALL_TIER, LARGE_TIER, TIER_METADATA_KEY
+from app.tools import get_inventory_level, get_sales_data_for_product
+
+TOOLS = [get_inventory_level, get_sales_data_for_product]
+
+class ToolFakeModel(GenericFakeChatModel):
+    """Fake model that accepts bind_tools"""
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+def _call(name, args, call_id="c1"):
+    return {"name": name, "args": args, "id": call_id}
+
+def test_tool_call_escalation():
+    """Test escalation on multi-tool plans and invalid tool calls"""
+    print("\n=== Testing tool call escalation ===")
+    question = [HumanMessage(content="Stock and sales for P301?")]
+    single = AIMessage(content="", tool_calls=[_call("get_inventory_level", {"product_id": "P301"})])
+    assert escalation_reason(single, question, TOOLS) is None
+    multi = AIMessage(content="", tool_calls=[
+        _call("get_inventory_level", {"product_id": "P301"}),
+        _call("get_sales_data_for_product", {"product_id": "P301"}, "c2"),
+    ])
+    assert escalation_reason(multi, question, TOOLS) == "multi_tool"
+    unknown = AIMessage(content="", tool_calls=[_call("delete_product", {"product_id": "P301"})])
+    assert escalation_reason(unknown, question, TOOLS) == "validation"
+    bad_args = AIMessage(content="", tool_calls=[_call("get_inventory_level", {"sku": "P301"})])
+    assert escalation_reason(bad_args, question, TOOLS) == "validation"
+
+def test_answer_escalation():
+    """Test escalation on hedged, low-probability or ungrounded answers"""
+    print("\n=== Testing final answer escalation ===")
+    run = [
+        HumanMessage(content="How many units of P301?"),
+        AIMessage(content="", tool_calls=[_call("get_inventory_level", {"product_id": "P301"})]),
+        ToolMessage(content='{"product_id": "P301", "quantity": 30}', tool_call_id="c1"),
+    ]
+    assert escalation_reason(AIMessage(content="P301 has 30 units."), run, TOOLS) is None
+    assert escalation_reason(AIMessage(content="I'm not sure how many units."), run, TOOLS) == "low_confidence"
+    assert escalation_reason(AIMessage(content="P999 has 30 units."), run, TOOLS) == "validation"
+    unsure = AIMessage(content="P301 has 30 units.", response_metadata={"logprobs": {"content": [{"logprob": -2.0}]}})
+    assert escalation_reason(unsure, run, TOOLS) == "low_confidence"
+
+def test_graph_escalates_and_records_tier():
+    """Test that an escalated run stays on the large tier and records it"""
+    print("\n=== Testing escalation in a graph run ===")
+    small = ToolFakeModel(messages=iter([
+        AIMessage(content="", tool_calls=[_call("get_inventory_level", {"product_id": "P301"})]),
+        AIMessage(content="I don't know."),
+    ]))
+    large = ToolFakeModel(messages=iter([AIMessage(content="P301 has plenty of stock.")]))
+    original_get_llm = agent.get_llm
+    agent.get_llm = lambda tier=LARGE_TIER: small if tier == SMALL_TIER else large
+    try:
+        result = agent.agent_app.invoke({"messages": [HumanMessage(content="How many units of P301 do we have?")]})
+    finally:
+        agent.get_llm = original_get_llm
+    tiers = [m.response_metadata.get(TIER_METADATA_KEY) for m in result["messages"] if isinstance(m, AIMessage)]
+    print(tiers, result["messages"][-1].content)
+    assert tiers == [SMALL_TIER, LARGE_TIER]
+    assert result["messages"][-1].response_metadata["escalation_reason"] == "low_confidence"
+    assert run_start_tier(result["messages"][1:]) == LARGE_TIER
+
+def test_conversation_validates_each_turn():
+    """Test that answers are validated against the current turn, not earlier turns of the thread"""
+    print("\n=== Testing escalation across conversation turns ===")
+    small = ToolFakeModel(messages=iter([
+        AIMessage(content="", tool_calls=[_call("get_inventory_level", {"product_id": "P301"})]),
+        AIMessage(content="P301 is in stock."),
+        # Turn 2 quotes the question's product ID: grounded, no escalation
+        AIMessage(content="P302 is the product you asked about."),
+        # Turn 3 repeats an ID from turn 1 that this turn never mentioned
+        AIMessage(content="P301 is in stock."),
+    ]))
+    large = ToolFakeModel(messages=iter([AIMessage(content="I would need to look that up.")]))
+    original_get_llm = agent.get_llm
+    agent.get_llm = lambda tier=LARGE_TIER: small if tier == SMALL_TIER else large
+    config = {"configurable": {"thread_id": "cascade-multi-turn"}}
+    try:
+        turns = [agent.conversation_app.invoke({"messages": [HumanMessage(content=question)]}, config=config)
+                 for question in ("How many units of P301 do we have?", "Which product is P302?", "And what about it?")]
+    finally:
+        agent.get_llm = original_get_llm
+        agent.conversation_checkpointer.delete_thread("cascade-multi-turn")
+    last = [result["messages"][-1] for result in turns]
+    print([(m.content, m.response_metadata.get(TIER_METADATA_KEY)) for m in last])
+    assert [m.response_metadata[TIER_METADATA_KEY] for m in last] == [SMALL_TIER, SMALL_TIER, LARGE_TIER]
+    assert last[2].response_metadata["escalation_reason"] == "validation"
+
+def main():
+    """Run all the cascade tests"""
+    test_tool_call_escalation()
+    test_answer_escalation()
+    test_graph_escalates_and_records_tier()
+    test_conversation_validates_each_turn()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Test conversation history bounding and trimming
+"""
+import threading
+from typing import Annotated, List, TypedDict
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
+from langgraph.graph import StateGraph, START, END
+from app.conversation import (add_bounded_messages, trim_context, approximate_token_count, BoundedMemorySaver,
+                              MAX_THREAD_MESSAGES)
+
+def make_turn(i):
+    return [
+        HumanMessage(content=f"question {i}"),
+        AIMessage(content="", tool_calls=[{"name": "get_inventory_level", "args": {"product_id": f"P{i}"}, "id": f"c{i}"}]),
+        ToolMessage(content="x" * 200, tool_call_id=f"c{i}"),
+        AIMessage(content=f"answer {i}"),
+    ]
+
+def test_bounded_reducer_drops_whole_turns():
+    """Test that the state reducer keeps the thread bounded and starts on a human turn"""
+    print("\n=== Testing bounded message reducer ===")
+    messages = []
+    for i in range(MAX_THREAD_MESSAGES):
+        messages = add_bounded_messages(messages, make_turn(i))
+    print(f"Thread holds {len(messages)} messages")
+    assert len(messages) <= MAX_THREAD_MESSAGES
+    assert isinstance(messages[0], HumanMessage)
+    assert messages[-1].content == f"answer {MAX_THREAD_MESSAGES - 1}"
+
+def test_trim_context_to_budget():
+    """Test that the prompt history is trimmed to the token budget"""
+    print("\n=== Testing context trimming ===")
+    messages = [m for i in range(20) for m in make_turn(i)]
+    trimmed = trim_context(messages, max_tokens=300)
+    print(f"Trimmed {len(messages)} messages to {len(trimmed)} ({approximate_token_count(trimmed)} tokens)")
+    assert approximate_token_count(trimmed) <= 300
+    assert isinstance(trimmed[0], HumanMessage)
+    assert trimmed[-1].content == "answer 19"
+
+def test_trim_context_keeps_oversized_turn():
+    """Test that the current turn is kept even if it alone exceeds the budget"""
+    print("\n=== Testing oversized turn ===")
+    messages = make_turn(0)
+    trimmed = trim_context(messages, max_tokens=10)
+    assert trimmed == messages
+
+def test_long_thread_keeps_latest_checkpoint():
+    """Test that a thread with many turns holds one checkpoint and its current blobs, not one per step"""
+    print("\n=== Testing checkpoint pruning ===")
+
+    class State(TypedDict):
+        messages: Annotated[List[BaseMessage], add_bounded_messages]
+        turns: int
+
+    def answer(state):
+        return {"messages": [AIMessage(content=f"answer to {state['messages'][-1].content}")]}
+
+    def count(state):
+        return {"turns": state.get("turns", 0) + 1}
+
+    graph = StateGraph(State)
+    graph.add_node("answer", answer)
+    graph.add_node("count", count)
+    graph.add_edge(START, "answer")
+    graph.add_edge("answer", "count")
+    graph.add_edge("count", END)
+    saver = BoundedMemorySaver(max_threads=10)
+    app = graph.compile(checkpointer=saver)
+    config = {"configurable": {"thread_id": "long"}}
+
+    turns = MAX_THREAD_MESSAGES
+    for i in range(turns):
+        state = app.invoke({"messages": [HumanMessage(content=f"question {i}")]}, config=config)
+    print(f"{saver.pruned_checkpoints} checkpoints pruned, {len(saver.blobs)} blobs, {len(saver.writes)} writes")
+    assert state["turns"] == turns and state["messages"][-1].content == f"answer to question {turns - 1}"
+    assert len(saver.storage["long"][""]) == 1
+    assert len(saver.blobs) <= len(State.__annotations__) + 3  # channel values of the latest checkpoint
+    assert len(saver.writes) <= 1
+    # The conversation continues from the kept checkpoint
+    state = app.invoke({"messages": [HumanMessage(content="one more")]}, config=config)
+    assert state["turns"] == turns + 1 and len(state["messages"]) <= MAX_THREAD_MESSAGES
+
+def test_concurrent_threads_are_evicted_safely():
+    """Test that many conversations checkpointing at once are bounded without racing on the blob index"""
+    print("\n=== Testing concurrent eviction ===")
+
+    class State(TypedDict):
+        messages: Annotated[List[BaseMessage], add_bounded_messages]
+
+    graph = StateGraph(State)
+    graph.add_node("answer", lambda state: {"messages": [AIMessage(content="ok")]})
+    graph.add_edge(START, "answer")
+    graph.add_edge("answer", END)
+    saver = BoundedMemorySaver(max_threads=4)
+    app = graph.compile(checkpointer=saver)
+    errors = []
+
+    def converse(worker):
+        try:
+            for i in range(20):
+                config = {"configurable": {"thread_id": f"t{worker}-{i}"}}
+                app.invoke({"messages": [HumanMessage(content="hi")]}, config=config)
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=converse, args=(w,)) for w in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    print(f"{saver.evicted_threads} threads evicted, {len(saver.blobs)} blobs")
+    assert not errors, errors
+    assert saver.evicted_threads >= 8 * 20 - 4 and len(saver.storage) <= 4
+    assert len(saver._thread_blobs) <= 4
+
+def main():
+    """Run all the conversation tests"""
+    test_bounded_reducer_drops_whole_turns()
+    test_trim_context_to_budget()
+    test_trim_context_keeps_oversized_turn()
+    test_long_thread_keeps_latest_checkpoint()
+    test_concurrent_threads_are_evicted_safely()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Test the batched, pipelined embedding of knowledge base chunks
+"""
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from qdrant_client import QdrantClient, models
+from app.embedding_pipeline import EmbeddingPipeline
+
+COLLECTION = "pipeline_test"
+SIZE = 16
+
+def fake_embeddings():
+    """Embedding factory for worker processes (must be importable, hence module level)"""
+    return DeterministicFakeEmbedding(size=SIZE)
+
+def _client():
+    client = QdrantClient(":memory:")
+    client.create_collection(COLLECTION, vectors_config=models.VectorParams(size=SIZE, distance=models.Distance.COSINE))
+    return client
+
+def _chunks(n):
+    for i in range(n):
+        yield f"00000000-0000-0000-0000-{i:012d}", f"chunk number {i}", {"source": f"doc_{i // 10}.txt"}
+
+def test_batches_and_progress():
+    """Test that a stream is embedded in batches, upserted in the wrapper's payload layout and reported"""
+    print("\n=== Testing in-process pipeline ===")
+    client = _client()
+    progress = []
+    pipeline = EmbeddingPipeline(client, COLLECTION, embeddings=fake_embeddings(), batch_size=16,
+                                 progress=lambda done, total, rate: progress.append((done, total)),
+                                 progress_interval=0)
+    report = pipeline.run(_chunks(100), total=100)
+    print(report)
+    assert report["chunks"] == 100 and report["batches"] == 7 and report["chunks_per_second"] > 0
+    assert client.count(COLLECTION).count == 100
+    assert progress[-1] == (100, 100) and [done for done, _ in progress] == sorted(done for done, _ in progress)
+    point = client.retrieve(COLLECTION, ids=["00000000-0000-0000-0000-000000000042"])[0]
+    assert point.payload == {"page_content": "chunk number 42", "metadata": {"source": "doc_4.txt"}}
+
+def test_worker_processes_match_in_process():
+    """Test that embedding on worker processes yields the same points"""
+    print("\n=== Testing multi-process pipeline ===")
+    in_process, workers = _client(), _client()
+    EmbeddingPipeline(in_process, COLLECTION, embeddings=fake_embeddings(), batch_size=8).run(_chunks(40))
+    report = EmbeddingPipeline(workers, COLLECTION, embeddings_factory=fake_embeddings, batch_size=8,
+                               processes=2).run(_chunks(40))
+    print(report)
+    assert report["processes"] == 2 and report["chunks"] == 40
+    ids = [f"00000000-0000-0000-0000-{i:012d}" for i in range(40)]
+    expected = {p.id: p.vector for p in in_process.retrieve(COLLECTION, ids=ids, with_vectors=True)}
+    actual = {p.id: p.vector for p in workers.retrieve(COLLECTION, ids=ids, with_vectors=True)}
+    assert actual == expected
+
+def test_upsert_errors_propagate():
+    """Test that a failed upsert stops the run with the error"""
+    print("\n=== Testing upsert failure ===")
+    client = _client()
+
+    def failing_upsert(**kwargs):
+        raise RuntimeError("disk full")
+
+    client.upsert = failing_upsert
+    try:
+        EmbeddingPipeline(client, COLLECTION, embeddings=fake_embeddings(), batch_size=4).run(_chunks(50))
+    except RuntimeError as e:
+        assert "disk full" in str(e)
+    else:
+        raise AssertionError("Expected the upsert error to propagate")
+
+def main():
+    """Run all the embedding pipeline tests"""
+    test_batches_and_progress()
+    test_worker_processes_match_in_process()
+    test_upsert_errors_propagate()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Test incremental knowledge base indexing
+"""
+import os
+import tempfile
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_qdrant import Qdrant
+from qdrant_client import QdrantClient, models
+import data_processing
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """Deterministic embeddings that count the texts they embed"""
+    embedded: list = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+def _write(kb_dir, name, paragraphs):
+    path = os.path.join(kb_dir, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(paragraphs))
+    # Distinct mtimes even on coarse-grained filesystems
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+def _paragraph(topic, i):
+    return f"{topic} section {i}: " + " ".join(f"{topic}-word-{i}-{j}" for j in range(20))
+
+def test_sync_embeds_only_changes():
+    """Test that re-syncs embed only new chunks and delete removed ones"""
+    print("\n=== Testing incremental sync ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        kb_dir = os.path.join(tmp, "kb")
+        os.makedirs(kb_dir)
+        manifest_path = os.path.join(tmp, "manifest.json")
+        _write(kb_dir, "returns.txt", [_paragraph("returns", i) for i in range(5)])
+        _write(kb_dir, "shipping.txt", [_paragraph("shipping", i) for i in range(5)])
+
+        client = QdrantClient(":memory:")
+        client.create_collection(data_processing.COLLECTION_NAME, vectors_config=models.VectorParams(
+            size=data_processing.VECTOR_SIZE, distance=models.Distance.COSINE))
+        embeddings = CountingEmbeddings(size=data_processing.VECTOR_SIZE, embedded=[])
+        store = Qdrant(client=client, collection_name=data_processing.COLLECTION_NAME, embeddings=embeddings)
+        splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=0)
+
+        def sync():
+            embeddings.embedded.clear()
+            report = data_processing.sync_knowledge_base(store, kb_dir=kb_dir, manifest_path=manifest_path,
+                                                         text_splitter=splitter)
+            print(report)
+            return report
+
+        def point_count():
+            return client.count(data_processing.COLLECTION_NAME).count
+
+        first = sync()
+        total = first["chunks_embedded"]
+        assert first["rebuilt"] and first["files_added"] == 2 and total >= 10
+        assert point_count() == total
+
+        # Nothing changed: nothing is read, chunked or embedded
+        second = sync()
+        assert second["files_unchanged"] == 2 and second["chunks_embedded"] == 0 and not embeddings.embedded
+
+        # Editing one paragraph re-embeds that paragraph's chunk(s) only
+        _write(kb_dir, "returns.txt", [_paragraph("returns", i) for i in range(4)] + [_paragraph("refunds", 4)])
+        third = sync()
+        assert third["files_changed"] == 1 and 0 < third["chunks_embedded"] < total / 2
+        assert third["chunks_embedded"] == third["chunks_deleted"] == len(embeddings.embedded)
+        assert point_count() == total
+        points, _ = client.scroll(data_processing.COLLECTION_NAME, limit=100, with_payload=True)
+        edited = [p.payload for p in points if "refunds" in p.payload["page_content"]]
+        assert edited and edited[0]["metadata"]["source"].endswith("returns.txt")
+
+        # Deleting a file deletes its chunks
+        os.remove(os.path.join(kb_dir, "shipping.txt"))
+        fourth = sync()
+        assert fourth["files_removed"] == 1 and fourth["chunks_embedded"] == 0
+        assert point_count() == total - fourth["chunks_deleted"]
+
+        # A manifest built with other settings forces a rebuild
+        original_chunk_size = data_processing.CHUNK_SIZE
+        data_processing.CHUNK_SIZE = original_chunk_size + 1
+        try:
+            fifth = sync()
+        finally:
+            data_processing.CHUNK_SIZE = original_chunk_size
+        assert fifth["rebuilt"] and point_count() == fifth["chunks_embedded"]
+
+def test_failed_rebuild_is_redone():
+    """Test that a rebuild which fails after clearing the collection re-embeds everything on the next sync"""
+    print("\n=== Testing failed rebuild ===")
+    from app import embedding_pipeline
+    with tempfile.TemporaryDirectory() as tmp:
+        kb_dir = os.path.join(tmp, "kb")
+        os.makedirs(kb_dir)
+        manifest_path = os.path.join(tmp, "manifest.json")
+        _write(kb_dir, "returns.txt", [_paragraph("returns", i) for i in range(5)])
+
+        client = QdrantClient(":memory:")
+        client.create_collection(data_processing.COLLECTION_NAME, vectors_config=models.VectorParams(
+            size=data_processing.VECTOR_SIZE, distance=models.Distance.COSINE))
+        embeddings = CountingEmbeddings(size=data_processing.VECTOR_SIZE, embedded=[])
+        store = Qdrant(client=client, collection_name=data_processing.COLLECTION_NAME, embeddings=embeddings)
+        splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=0)
+
+        def sync(rebuild=False):
+            return data_processing.sync_knowledge_base(store, kb_dir=kb_dir, manifest_path=manifest_path,
+                                                       text_splitter=splitter, rebuild=rebuild)
+
+        total = sync()["chunks_embedded"]
+        original_run = embedding_pipeline.EmbeddingPipeline.run
+
+        def failing_run(self, chunks):
+            raise RuntimeError("embedding worker died")
+
+        embedding_pipeline.EmbeddingPipeline.run = failing_run
+        try:
+            sync(rebuild=True)
+            raise AssertionError("Expected the rebuild to fail")
+        except RuntimeError as e:
+            assert "worker died" in str(e)
+        finally:
+            embedding_pipeline.EmbeddingPipeline.run = original_run
+        assert client.count(data_processing.COLLECTION_NAME).count == 0
+
+        report = sync()
+        print(report)
+        assert report["files_added"] == 1 and report["chunks_embedded"] == total
+        assert client.count(data_processing.COLLECTION_NAME).count == total
+
+def main():
+    """Run all the knowledge base indexing tests"""
+    test_sync_embeds_only_changes()
+    test_failed_rebuild_is_redone()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Test the LLM timeout, retry and hedging policy
+"""
+import contextvars
+import itertools
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.messages import HumanMessage
+from app.fake_llm import ScriptedChatModel, FakeLLMServerError
+from app import llm_resilience
+from app.llm_resilience import resilient_invoke, get_latency_tracker, get_llm_resilience_stats, LLMCallTimeout
+
+class ServerError(Exception):
+    status_code = 503
+
+class BadRequest(Exception):
+    status_code = 400
+
+def test_retries_retryable_errors():
+    """Test that 5xx errors are retried and 4xx errors are not"""
+    print("\n=== Testing retries ===")
+    llm_resilience.reset_llm_resilience()
+    attempts = itertools.count()
+    def flaky():
+        if next(attempts) < 2:
+            raise ServerError("unavailable")
+        return "ok"
+    assert resilient_invoke(flaky, key="retry-test", max_retries=2) == "ok"
+    assert get_llm_resilience_stats()["retries"] == 2
+
+    def bad_request():
+        raise BadRequest("invalid")
+    try:
+        resilient_invoke(bad_request, key="retry-test")
+        assert False, "expected BadRequest"
+    except BadRequest:
+        pass
+    assert get_llm_resilience_stats()["retries"] == 2
+
+def test_hedged_request_wins_over_slow_primary():
+    """Test that a hedge is sent after the p95 delay and the faster response wins"""
+    print("\n=== Testing hedged request ===")
+    llm_resilience.reset_llm_resilience()
+    tracker = get_latency_tracker("hedge-test")
+    for _ in range(llm_resilience.LLM_LATENCY_MIN_SAMPLES):
+        tracker.observe(0.02)
+    calls = itertools.count()
+    def slow_then_fast():
+        if next(calls) == 0:
+            time.sleep(1.0)
+            return "slow"
+        return "fast"
+    start = time.perf_counter()
+    assert resilient_invoke(slow_then_fast, key="hedge-test") == "fast"
+    elapsed = time.perf_counter() - start
+    stats = get_llm_resilience_stats()
+    print(f"answered in {elapsed:.3f}s, {stats['hedges']} hedge(s), win rate {stats['hedge_win_rate']}")
+    assert elapsed < 0.5
+    assert stats["hedges"] == 1 and stats["hedge_win_rate"] == 1.0
+
+def test_deadline_and_fake_llm_errors():
+    """Test the overall deadline and retryable errors from the fake LLM"""
+    print("\n=== Testing deadline and fake LLM errors ===")
+    llm_resilience.reset_llm_resilience()
+    try:
+        resilient_invoke(lambda: time.sleep(1.0), key="deadline-test", deadline=0.2, max_retries=0)
+        assert False, "expected LLMCallTimeout"
+    except LLMCallTimeout:
+        pass
+
+    failing = ScriptedChatModel(error_rate=1.0)
+    try:
+        resilient_invoke(lambda: failing.invoke([HumanMessage(content="hi")]), key="fake", max_retries=1)
+        assert False, "expected FakeLLMServerError"
+    except FakeLLMServerError:
+        pass
+    stats = get_llm_resilience_stats()
+    assert stats["retries"] == 1 and stats["failures"] == 2
+
+def test_request_deadline_is_not_retried():
+    """Test that the caller's SIGALRM TimeoutError propagates instead of being retried"""
+    print("\n=== Testing request deadline ===")
+    llm_resilience.reset_llm_resilience()
+
+    def on_alarm(signum, frame):
+        raise TimeoutError("request deadline")
+
+    original_handler = signal.signal(signal.SIGALRM, on_alarm)
+    signal.alarm(1)
+    start = time.perf_counter()
+    try:
+        resilient_invoke(lambda: time.sleep(2.5) or "late", key="alarm-test")
+        assert False, "expected TimeoutError"
+    except LLMCallTimeout:
+        assert False, "the request deadline must not become a per-attempt timeout"
+    except TimeoutError as e:
+        assert "request deadline" in str(e)
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, original_handler)
+    elapsed = time.perf_counter() - start
+    print(f"raised after {elapsed:.2f}s")
+    assert elapsed < 2.0 and get_llm_resilience_stats()["retries"] == 0
+
+def test_calls_see_the_callers_context():
+    """Test that attempts run in a copy of the caller's contextvars"""
+    print("\n=== Testing context propagation ===")
+    llm_resilience.reset_llm_resilience()
+    request_id = contextvars.ContextVar("request_id", default=None)
+    request_id.set("req-1")
+    assert resilient_invoke(lambda: request_id.get(), key="context-test") == "req-1"
+
+def test_queue_time_does_not_count_against_the_timeout():
+    """Test that the per-attempt timer starts when the request starts running"""
+    print("\n=== Testing queued attempts ===")
+    llm_resilience.reset_llm_resilience()
+    original_executor, original_timeout = llm_resilience._executor, llm_resilience.LLM_TIMEOUT_DEFAULT
+    llm_resilience._executor = ThreadPoolExecutor(max_workers=1)
+    llm_resilience.LLM_TIMEOUT_DEFAULT = 0.3
+    try:
+        blocker = llm_resilience._executor.submit(time.sleep, 0.4)
+        result = resilient_invoke(lambda: time.sleep(0.1) or "ok", key="queue-test", max_retries=0)
+        blocker.result()
+    finally:
+        llm_resilience._executor.shutdown(wait=True)
+        llm_resilience._executor, llm_resilience.LLM_TIMEOUT_DEFAULT = original_executor, original_timeout
+    assert result == "ok" and get_llm_resilience_stats()["timeouts"] == 0
+
+def test_losing_hedge_is_reported():
+    """Test that a losing request's late answer reaches on_discarded (its tokens were billed)"""
+    print("\n=== Testing discarded answers ===")
+    llm_resilience.reset_llm_resilience()
+    tracker = get_latency_tracker("discard-test")
+    for _ in range(llm_resilience.LLM_LATENCY_MIN_SAMPLES):
+        tracker.observe(0.02)
+    calls = itertools.count()
+    discarded = []
+    landed = threading.Event()
+
+    def slow_then_fast():
+        if next(calls) == 0:
+            time.sleep(0.3)
+            return "slow"
+        return "fast"
+
+    def on_discarded(result, seconds):
+        discarded.append((result, seconds))
+        landed.set()
+
+    assert resilient_invoke(slow_then_fast, key="discard-test", on_discarded=on_discarded) == "fast"
+    assert landed.wait(2.0)
+    print(discarded)
+    assert discarded[0][0] == "slow" and discarded[0][1] >= 0.3
+
+def main():
+    """Run all the LLM resilience tests"""
+    test_retries_retryable_errors()
+    test_hedged_request_wins_over_slow_primary()
+    test_deadline_and_fake_llm_errors()
+    test_request_deadline_is_not_retried()
+    test_calls_see_the_callers_context()
+    test_queue_time_does_not_count_against_the_timeout()
+    test_losing_hedge_is_reported()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Test the payload logging policy
+"""
+import logging
+from langchain_core.documents import Document
+from app.log_policy import digest, log_payload, truncated
+
+class _Exploding:
+    """Payload that fails the test if it is ever formatted"""
+    def __repr__(self):
+        raise AssertionError("payload was formatted")
+
+def test_truncation_and_digest():
+    """Test that payloads are cut to the byte cap and hashed by content"""
+    print("\n=== Testing truncation and digests ===")
+    text = str(truncated("x" * 5000, max_bytes=100))
+    print(text[-30:])
+    assert text.startswith("x" * 100) and text.endswith("[4900 more bytes]")
+    assert str(truncated("short", max_bytes=100)) == "short"
+    docs = [Document(page_content="a" * 10), Document(page_content="b" * 10)]
+    assert str(digest(docs)).endswith(" 20 bytes>")
+    assert str(digest(docs)) == str(digest([Document(page_content="a" * 10, metadata={"x": 1}), Document(page_content="b" * 10)]))
+    assert str(digest("hello")) != str(digest("hello!"))
+
+def test_payloads_are_lazy_and_sampled():
+    """Test that disabled or unsampled payload logs never format the payload"""
+    print("\n=== Testing lazy, sampled payload logs ===")
+    logger = logging.getLogger("test_log_policy")
+    logger.setLevel(logging.INFO)
+    # Below the logger level: neither formatted nor counted
+    assert not log_payload(logger, "payload:", _Exploding(), sample_rate=1.0)
+    logger.debug("lazy %s", truncated(_Exploding()))
+    logger.setLevel(logging.DEBUG)
+    assert not log_payload(logger, "payload:", _Exploding(), sample_rate=0.0)
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger.addHandler(handler)
+    try:
+        assert log_payload(logger, "payload:", "y" * 10_000, sample_rate=1.0)
+    finally:
+        logger.removeHandler(handler)
+    message = records[0].getMessage()
+    assert message.startswith("payload: yyy") and len(message) < 1000
+
+def main():
+    """Run all the log policy tests"""
+    test_truncation_and_digest()
+    test_payloads_are_lazy_and_sampled()
+
+if __name__ == "__main__":
+    main()
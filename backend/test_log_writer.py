@@ -0,0 +1,98 @@
+"""
+Test the append-only JSONL tool log writer
+"""
+import json
+import os
+import tempfile
+import time
+from app.log_writer import JsonlLogWriter
+
+def _read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_records_are_appended_in_order():
+    """Test that queued records are group-committed to the file in order"""
+    print("\n=== Testing append-only writes ===")
+    writer = JsonlLogWriter(fsync="batch")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.jsonl")
+        for i in range(500):
+            assert writer.write(path, {"step": i, "output": {"value": i}})
+        assert writer.flush()
+        records = _read_lines(path)
+        stats = writer.stats()
+        print(stats)
+        assert [r["step"] for r in records] == list(range(500))
+        assert stats["written"] == 500
+        # Bursts are committed in far fewer batches than records
+        assert stats["batches"] < 50
+        assert stats["fsyncs"] >= 1
+
+def test_oversized_outputs_are_truncated():
+    """Test that a huge tool output is replaced by a bounded preview"""
+    print("\n=== Testing oversized outputs ===")
+    writer = JsonlLogWriter(fsync="off")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.jsonl")
+        writer.write(path, {"step": 1, "output": "x" * 1_000_000})
+        writer.flush()
+        record = _read_lines(path)[0]
+        assert record["output_truncated"] and record["output_bytes"] > 1_000_000
+        assert os.path.getsize(path) < 100_000
+
+def test_backpressure_drops_without_blocking():
+    """Test that a full queue drops records instead of blocking the caller"""
+    print("\n=== Testing backpressure ===")
+    writer = JsonlLogWriter(queue_size=10, overflow="drop", fsync="off")
+    # Fill the queue before the writer thread exists so nothing drains it
+    writer._ensure_started = lambda: None
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.jsonl")
+        start = time.perf_counter()
+        accepted = sum(writer.write(path, {"step": i}) for i in range(1000))
+        elapsed = time.perf_counter() - start
+        stats = writer.stats()
+        print(f"accepted {accepted}, dropped {stats['dropped']} in {elapsed * 1000:.1f}ms")
+        assert accepted == 8  # up to the 80% high watermark
+        assert stats["dropped"] == 1000 - accepted
+        assert elapsed < 1.0
+
+def test_bad_records_do_not_stop_the_writer():
+    """Test that unserializable records and failed commits are counted and later records still land"""
+    print("\n=== Testing writer error handling ===")
+    writer = JsonlLogWriter(fsync="off")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.jsonl")
+        circular = {"step": 1}
+        circular["output"] = circular
+        assert not writer.write(path, circular)
+        # The record is snapshotted when queued, so a later mutation is not logged
+        record = {"step": 2, "output": ["row"]}
+        assert writer.write(path, record)
+        record["output"].append(circular)
+        assert writer.flush()
+
+        commit = writer._commit
+        def failing_commit(records):
+            writer._commit = commit
+            raise RuntimeError("disk on fire")
+        writer._commit = failing_commit
+        assert writer.write(path, {"step": 3})
+        assert writer.flush()
+        assert writer.write(path, {"step": 4})
+        assert writer.flush()
+        stats = writer.stats()
+        print(stats)
+        assert _read_lines(path) == [{"step": 2, "output": ["row"]}, {"step": 4}]
+        assert stats["write_errors"] == 2 and stats["written"] == 2
+
+def main():
+    """Run all the log writer tests"""
+    test_records_are_appended_in_order()
+    test_oversized_outputs_are_truncated()
+    test_backpressure_drops_without_blocking()
+    test_bad_records_do_not_stop_the_writer()
+
+if __name__ == "__main__":
+    main()
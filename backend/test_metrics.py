@@ -0,0 +1,56 @@
+"""
+Test the Prometheus metrics: node timing and the /metrics endpoint
+"""
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from app.metrics import timed_node
+
+def _node_count(name):
+    return REGISTRY.get_sample_value("agent_node_duration_seconds_count", {"node": name}) or 0.0
+
+def test_timed_node_observes_duration():
+    """Test that running a node through timed_node adds a histogram sample, also when it raises"""
+    print("\n=== Testing timed_node ===")
+    calls = []
+
+    def node(state, config=None):
+        calls.append(config)
+        if state.get("fail"):
+            raise ValueError("node failed")
+        return {"messages": []}
+
+    wrapped = timed_node("metrics_test_node", node)
+    before = _node_count("metrics_test_node")
+    assert wrapped({}, {"configurable": {}}) == {"messages": []}
+    try:
+        wrapped({"fail": True})
+    except ValueError:
+        pass
+    after = _node_count("metrics_test_node")
+    print(before, after)
+    assert after - before == 2 and calls == [{"configurable": {}}, None]
+    assert REGISTRY.get_sample_value("agent_node_duration_seconds_sum", {"node": "metrics_test_node"}) >= 0
+
+def test_metrics_endpoint():
+    """Test that /metrics serves the Prometheus text format with the agent's metrics"""
+    print("\n=== Testing /metrics ===")
+    import main
+    timed_node("metrics_test_node", lambda state, config=None: state)({})
+    response = TestClient(main.app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    for name in ("agent_request_duration_seconds", "agent_node_duration_seconds", "agent_llm_call_duration_seconds",
+                 "agent_tool_duration_seconds", "agent_cache_hit_rate", "agent_fast_path_hit_rate",
+                 "agent_trace_records", "agent_trace_queue_depth"):
+        assert f"# TYPE {name}" in body, name
+    assert "agent_tool_log_records" not in body
+    assert 'agent_node_duration_seconds_count{node="metrics_test_node"}' in body
+
+def main():
+    """Run all the metrics tests"""
+    test_timed_node_observes_duration()
+    test_metrics_endpoint()
+
+if __name__ == "__main__":
+    main()
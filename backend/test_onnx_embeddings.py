@@ -0,0 +1,73 @@
+"""
+Test the ONNX embedding backend's pooling and backend selection
+(inference itself needs onnxruntime and an exported model; see benchmark_embeddings.py)
+"""
+import threading
+import time
+import numpy as np
+import data_processing
+from app import onnx_embeddings
+from app.onnx_embeddings import mean_pool
+
+def test_mean_pool_ignores_padding():
+    """Test that pooling averages real tokens only and L2-normalizes"""
+    print("\n=== Testing mean pooling ===")
+    hidden = np.array([[[1.0, 0.0], [3.0, 4.0], [100.0, 100.0]]], dtype=np.float32)
+    mask = np.array([[1, 1, 0]], dtype=np.int64)
+    pooled = mean_pool(hidden, mask)
+    print(pooled)
+    expected = np.array([2.0, 2.0]) / np.linalg.norm([2.0, 2.0])
+    assert np.allclose(pooled[0], expected) and np.isclose(np.linalg.norm(pooled[0]), 1.0)
+
+def test_backend_selection_is_part_of_the_index_settings():
+    """Test that switching backends changes the manifest settings (forcing a re-index)"""
+    print("\n=== Testing backend selection ===")
+    original = (data_processing.EMBEDDING_BACKEND, data_processing.ONNX_QUANTIZED)
+    try:
+        data_processing.EMBEDDING_BACKEND = "huggingface"
+        torch_settings = data_processing._index_settings()
+        data_processing.EMBEDDING_BACKEND, data_processing.ONNX_QUANTIZED = "onnx", True
+        onnx_settings = data_processing._index_settings()
+        assert onnx_settings["embedding_backend"] == "onnx-int8" and onnx_settings != torch_settings
+        data_processing.EMBEDDING_BACKEND = "tensorflow"
+        try:
+            data_processing.get_embedding_backend()
+        except ValueError as e:
+            assert "tensorflow" in str(e)
+        else:
+            raise AssertionError("Expected an unknown backend to be rejected")
+    finally:
+        data_processing.EMBEDDING_BACKEND, data_processing.ONNX_QUANTIZED = original
+
+def test_concurrent_first_use_loads_once():
+    """Test that threads racing on the first get_embeddings call share one model"""
+    print("\n=== Testing concurrent model loading ===")
+    loads = []
+
+    class SlowEmbeddings:
+        def __init__(self, *args, **kwargs):
+            loads.append(args)
+            time.sleep(0.1)
+
+    original = (data_processing._embeddings, data_processing.EMBEDDING_BACKEND, onnx_embeddings.OnnxEmbeddings)
+    data_processing._embeddings, data_processing.EMBEDDING_BACKEND = None, "onnx"
+    onnx_embeddings.OnnxEmbeddings = SlowEmbeddings
+    results = []
+    try:
+        threads = [threading.Thread(target=lambda: results.append(data_processing.get_embeddings())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        data_processing._embeddings, data_processing.EMBEDDING_BACKEND, onnx_embeddings.OnnxEmbeddings = original
+    assert len(loads) == 1 and len(results) == 8 and all(r is results[0] for r in results)
+
+def main():
+    """Run all the ONNX embedding tests"""
+    test_mean_pool_ignores_padding()
+    test_backend_selection_is_part_of_the_index_settings()
+    test_concurrent_first_use_loads_once()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Test opt-in request profiling
+"""
+import threading
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage, HumanMessage
+from test_query_planner import ScriptedModel
+from app import agent, profiling
+from app.tool_usage import reset_tracker
+from app.llm_resilience import reset_llm_resilience
+
+def _scripted_model():
+    # Without latency history no hedged request is sent, so each call consumes one scripted reply;
+    # the answer names no product ID, so the cascade accepts it on the small tier
+    reset_llm_resilience()
+    tool_call = {"name": "get_sales_data_for_product", "args": {"product_id": "P301", "days": 30}, "id": "sales_1"}
+    return ScriptedModel(messages=iter([AIMessage(content="", tool_calls=[tool_call]), AIMessage(content="It sold 5 units.")]))
+
+def test_opt_in_flags():
+    """Test the header and query flag"""
+    print("\n=== Testing opt-in flags ===")
+    assert profiling.requested({"x-profile": "1"}, {})
+    assert profiling.requested({}, {"profile": "true"})
+    assert not profiling.requested({}, {})
+    assert not profiling.requested({"x-profile": "0"}, {})
+
+def test_profile_captures_nodes_tools_and_allocations():
+    """Test that a profiled graph run reports nodes, tools, pandas time, allocations and functions"""
+    print("\n=== Testing a profiled run ===")
+    original_get_llm = agent.get_llm
+    model = _scripted_model()
+    agent.get_llm = lambda *args, **kwargs: model
+    try:
+        reset_tracker()
+        result, profile = profiling.run_profiled(
+            agent.agent_app.invoke, {"messages": [HumanMessage(content="How did P301 sell in the last 30 days?")]}
+        )
+    finally:
+        agent.get_llm = original_get_llm
+    print({k: v for k, v in profile.items() if k not in ("functions", "cprofile")})
+    assert result["messages"][-1].content == "It sold 5 units."
+    assert [n["node"] for n in profile["nodes"]] == ["chatbot", "tools", "chatbot"]
+    assert [t["tool"] for t in profile["tools"]] == ["get_sales_data_for_product"]
+    assert profile["pandas_ms"] >= 0 and profile["memory"]["peak_bytes"] > 0
+    assert profile["functions"] and "cumulative" in profile["cprofile"]
+    assert profiling.get_profile(profile["profile_id"]) is profile
+    assert profiling.active_profiles == 0
+
+def test_disabled_profiling_installs_no_hooks():
+    """Test that unprofiled runs never reach the profiling hooks"""
+    print("\n=== Testing zero overhead when disabled ===")
+    original_get_llm, original_record_node = agent.get_llm, profiling.record_node
+    model = _scripted_model()
+    agent.get_llm = lambda *args, **kwargs: model
+
+    def fail(*args, **kwargs):
+        raise AssertionError("profiling hook called without an active profile")
+
+    profiling.record_node = fail
+    try:
+        agent.agent_app.invoke({"messages": [HumanMessage(content="How did P301 sell in the last 30 days?")]})
+    finally:
+        agent.get_llm, profiling.record_node = original_get_llm, original_record_node
+
+def test_chat_endpoint_returns_profile_id():
+    """Test that /api/chat?profile=1 stores a profile and points to it"""
+    print("\n=== Testing /api/chat profiling ===")
+    import main
+    original_get_llm = agent.get_llm
+    model = _scripted_model()
+    agent.get_llm = lambda *args, **kwargs: model
+    try:
+        client = TestClient(main.app)
+        response = client.post("/api/chat?profile=1", json={"messages": [
+            {"role": "user", "content": "Compare how P301 sold recently against what you would expect"}]})
+    finally:
+        agent.get_llm = original_get_llm
+    assert response.status_code == 200
+    profile_id = response.headers["x-profile-id"]
+    profile = client.get(f"/api/profiles/{profile_id}").json()
+    print({k: profile[k] for k in ("wall_ms", "pandas_ms")}, [n["node"] for n in profile["nodes"]])
+    assert profile["nodes"] and profile["wall_ms"] > 0
+    assert client.get("/api/profiles/missing").status_code == 404
+
+def test_debug_endpoint_profiles_in_the_threadpool():
+    """Test that /api/debug?profile=1 returns the profile of a run executed off the event loop"""
+    print("\n=== Testing /api/debug profiling ===")
+    import main
+    original_get_llm = agent.get_llm
+    model = _scripted_model()
+    threads = []
+    agent.get_llm = lambda *args, **kwargs: threads.append(threading.current_thread().name) or model
+    try:
+        response = TestClient(main.app).post("/api/debug?profile=1", json={"query": "How did P301 sell in the last 30 days?"})
+    finally:
+        agent.get_llm = original_get_llm
+    assert response.status_code == 200
+    profile = response.json()["trace_data"]["profile"]
+    assert [n["node"] for n in profile["nodes"]] == ["chatbot", "tools", "chatbot"]
+    assert threads and threading.main_thread().name not in threads
+
+def test_concurrent_profiles_are_rejected():
+    """Test that a second profiled request is rejected while one is running (tracemalloc is process-wide)"""
+    print("\n=== Testing concurrent profiling ===")
+    import main
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+
+    worker = threading.Thread(target=profiling.run_profiled, args=(slow,))
+    worker.start()
+    try:
+        assert started.wait(5)
+        try:
+            profiling.run_profiled(lambda: None)
+            raise AssertionError("Expected ProfilerBusyError")
+        except profiling.ProfilerBusyError:
+            pass
+        response = TestClient(main.app).post("/api/debug?profile=1", json={"query": "How did P301 sell?"})
+        assert response.status_code == 409
+    finally:
+        release.set()
+        worker.join()
+    assert profiling.run_profiled(lambda: "ok")[0] == "ok" and profiling.active_profiles == 0
+
+def main():
+    """Run all the profiling tests"""
+    test_opt_in_flags()
+    test_profile_captures_nodes_tools_and_allocations()
+    test_disabled_profiling_installs_no_hooks()
+    test_chat_endpoint_returns_profile_id()
+    test_debug_endpoint_profiles_in_the_threadpool()
+    test_concurrent_profiles_are_rejected()
+
+if __name__ == "__main__":
+    main()
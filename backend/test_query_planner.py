@@ -0,0 +1,91 @@
+"""
+Test the analytics query executor and planner mode
+"""
+import pandas as pd
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from app import agent
+from app.query_planner import execute_analytics_query
+from app.token_usage import TokenUsageTracker
+
+class ScriptedModel(GenericFakeChatModel):
+    """Fake model that ignores bound tools"""
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+def test_grouped_revenue_matches_pandas():
+    """Test that a grouped revenue query matches a hand-written pandas aggregation"""
+    print("\n=== Testing grouped revenue ===")
+    result = execute_analytics_query({
+        "source": "sales",
+        "group_by": ["product_id"],
+        "metrics": [{"op": "sum", "field": "item_total", "alias": "revenue"}],
+        "sort_by": "revenue",
+        "top_k": 3,
+    })
+    print(result["rows"])
+    items = pd.read_csv("data/order_items.csv")
+    expected = items.groupby("product_id")["item_total"].sum().sort_values(ascending=False).head(3)
+    assert [row["product_id"] for row in result["rows"]] == list(expected.index)
+    assert abs(result["rows"][0]["revenue"] - round(expected.iloc[0], 2)) < 0.01
+    assert result["row_count"] == items["product_id"].nunique()
+
+def test_filters_and_ungrouped_metrics():
+    """Test filters combined with metrics over the whole filtered frame"""
+    print("\n=== Testing filters and ungrouped metrics ===")
+    result = execute_analytics_query({
+        "source": "products",
+        "filters": [{"field": "category", "op": "==", "value": "Electronics"}, {"field": "price", "op": ">", "value": "20"}],
+        "metrics": [{"op": "count"}, {"op": "mean", "field": "price"}],
+    })
+    print(result["rows"])
+    products = pd.read_csv("data/products.csv")
+    expected = products[(products["category"] == "Electronics") & (products["price"] > 20)]
+    assert result["rows"][0]["row_count"] == len(expected)
+    assert abs(result["rows"][0]["mean_price"] - round(expected["price"].mean(), 2)) < 0.01
+
+def test_invalid_queries_return_errors():
+    """Test that unknown columns and misplaced windows are reported, not raised"""
+    print("\n=== Testing invalid queries ===")
+    assert "Unknown column" in execute_analytics_query({"source": "products", "select": ["revenue"]})["error"]
+    assert "window_days" in execute_analytics_query({"source": "products", "window_days": 30})["error"]
+    assert "metric" in execute_analytics_query({"source": "sales", "group_by": ["category"]})["error"]
+
+def test_planner_mode_uses_two_llm_calls():
+    """Test that planner mode compiles one query, executes it, then answers"""
+    print("\n=== Testing planner mode ===")
+    query_call = {
+        "name": "run_analytics_query",
+        "args": {"source": "sales", "group_by": ["category"],
+                 "metrics": [{"op": "sum", "field": "quantity", "alias": "units"}], "sort_by": "units", "top_k": 1},
+        "id": "plan_1",
+    }
+    model = ScriptedModel(messages=iter([
+        AIMessage(content="", tool_calls=[query_call]),
+        AIMessage(content="Your top category by units sold is shown above."),
+    ]))
+    original_get_llm = agent.get_llm
+    agent.get_llm = lambda *args, **kwargs: model
+    tracker = TokenUsageTracker()
+    try:
+        result = agent.planner_app.invoke(
+            {"messages": [HumanMessage(content="Which category sold the most units?")]},
+            config={"configurable": {"token_tracker": tracker}},
+        )
+    finally:
+        agent.get_llm = original_get_llm
+    tool_messages = [m for m in result["messages"] if isinstance(m, ToolMessage)]
+    print(f"Tool result: {tool_messages[0].content[:120]}")
+    assert len(tool_messages) == 1 and '"units"' in tool_messages[0].content
+    assert tracker.summary().llm_calls == 2
+    assert result["messages"][-1].content.startswith("Your top category")
+
+def main():
+    """Run all the query planner tests"""
+    test_grouped_revenue_matches_pandas()
+    test_filters_and_ungrouped_metrics()
+    test_invalid_queries_return_errors()
+    test_planner_mode_uses_two_llm_calls()
+
+if __name__ == "__main__":
+    main()
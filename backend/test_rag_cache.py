@@ -0,0 +1,70 @@
+"""
+Test the query embedding and retrieval caches
+"""
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+import data_processing
+from app.rag_cache import CachedRetriever, embed_query, get_rag_cache_stats, clear_rag_caches
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """Deterministic embeddings that count query embeddings"""
+    queries: int = 0
+
+    def embed_query(self, text):
+        self.queries += 1
+        return super().embed_query(text)
+
+class FakeVectorStore:
+    """Vector store stand-in that counts searches"""
+    def __init__(self):
+        self.embeddings = CountingEmbeddings(size=8)
+        self.searches = []
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None):
+        self.searches.append((k, filter))
+        return [Document(page_content=f"chunk {i}", metadata={"source": "sop_product_returns.txt"}) for i in range(k)]
+
+def test_repeated_queries_skip_inference_and_search():
+    """Test that a repeated (differently spaced/cased) query is answered from both caches"""
+    print("\n=== Testing cache hits ===")
+    clear_rag_caches()
+    store = FakeVectorStore()
+    retriever = CachedRetriever(vectorstore=store, k=3)
+    before = get_rag_cache_stats()
+
+    first = retriever.invoke("Return policy for damaged goods")
+    first[0].page_content = "mutated by the caller"
+    second = retriever.invoke("  return POLICY for damaged   goods ")
+    print(get_rag_cache_stats())
+    assert store.embeddings.queries == 1 and len(store.searches) == 1
+    assert second[0].page_content == "chunk 0"
+
+    # Different k or filters search again, with the embedding still cached
+    CachedRetriever(vectorstore=store, k=2).invoke("return policy for damaged goods")
+    CachedRetriever(vectorstore=store, k=3, filter={"source": "x"}).invoke("return policy for damaged goods")
+    assert store.embeddings.queries == 1 and len(store.searches) == 3
+
+    after = get_rag_cache_stats()
+    assert after["query_embedding"]["hits"] - before["query_embedding"]["hits"] == 3
+    assert after["retrieval"]["hits"] - before["retrieval"]["hits"] == 1
+
+def test_collection_changes_invalidate():
+    """Test that a sync which changes the collection bypasses earlier entries"""
+    print("\n=== Testing invalidation ===")
+    clear_rag_caches()
+    store = FakeVectorStore()
+    retriever = CachedRetriever(vectorstore=store)
+    retriever.invoke("how are exchanges handled")
+    data_processing._collection_version += 1  # as sync_knowledge_base does after changing points
+    retriever.invoke("how are exchanges handled")
+    assert store.embeddings.queries == 2 and len(store.searches) == 2
+    assert embed_query("how are exchanges handled", store.embeddings) == store.embeddings.embed_query(
+        "how are exchanges handled")
+
+def main():
+    """Run all the RAG cache tests"""
+    test_repeated_queries_skip_inference_and_search()
+    test_collection_changes_invalidate()
+
+if __name__ == "__main__":
+    main()
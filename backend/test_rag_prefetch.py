@@ -0,0 +1,128 @@
+"""
+Test the speculative RAG prefetch and its reuse by the tool node
+"""
+import contextvars
+import json
+import threading
+import time
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+from app import rag_prefetch
+from app.agent import make_tool_node
+from app.rag_prefetch import start_rag_prefetch, get_prefetch_stats, RAG_TOOL_NAME
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+def _rag_tool(release=None):
+    """A fake query_internal_documents that counts calls and reports the caller's context"""
+    calls = []
+
+    @tool(RAG_TOOL_NAME)
+    def query_internal_documents(query: str) -> list:
+        """Search the internal documents"""
+        calls.append(query)
+        if release is not None:
+            release.wait(5)
+        return [{"page_content": f"chunk for {query}", "request_id": request_id.get()}]
+
+    return query_internal_documents, calls
+
+def test_document_questions_are_prefetched_and_reused():
+    """Test that a document question is prefetched and a similar retrieval query takes the result"""
+    print("\n=== Testing prefetch hit ===")
+    rag_tool, calls = _rag_tool()
+    request_id.set("req-42")
+    before = get_prefetch_stats()
+    prefetch = start_rag_prefetch([rag_tool], "What is the return policy for damaged goods?")
+    assert prefetch is not None
+    used, result = prefetch.take("return policy damaged goods")
+    print(result)
+    assert used and result[0]["request_id"] == "req-42" and calls == ["What is the return policy for damaged goods?"]
+    prefetch.cancel()  # A used prefetch is not counted as cancelled
+    after = get_prefetch_stats()
+    assert after["used"] - before["used"] == 1 and after["cancelled"] == before["cancelled"]
+
+def test_data_questions_and_other_queries_miss():
+    """Test that data questions are not prefetched and unrelated retrieval queries are not served"""
+    print("\n=== Testing prefetch misses ===")
+    rag_tool, calls = _rag_tool()
+    for query in ("Which products have less than 5 units in stock?", "What were total sales last month?",
+                  "How many units of P301 are in stock?"):
+        assert start_rag_prefetch([rag_tool], query) is None, query
+    assert start_rag_prefetch([], "What is the return policy?") is None
+
+    before = get_prefetch_stats()
+    prefetch = start_rag_prefetch([rag_tool], "How are product exchanges handled?")
+    assert prefetch.take("employee discount percentage") == (False, None)
+    prefetch.cancel()
+    after = get_prefetch_stats()
+    assert after["mismatched"] - before["mismatched"] == 1 and after["cancelled"] - before["cancelled"] == 1
+
+def test_busy_workers_skip_prefetch():
+    """Test that prefetches are skipped while every worker is busy and resume once they finish"""
+    print("\n=== Testing prefetch cancel and backpressure ===")
+    release = threading.Event()
+    rag_tool, calls = _rag_tool(release)
+    before = get_prefetch_stats()
+    running = [start_rag_prefetch([rag_tool], f"shipping policy question {i}")
+               for i in range(rag_prefetch.RAG_PREFETCH_WORKERS)]
+    assert all(running)
+    assert start_rag_prefetch([rag_tool], "What is the shipping policy?") is None
+    for prefetch in running:
+        prefetch.cancel()
+    release.set()
+    deadline = time.monotonic() + 5
+    while get_prefetch_stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    after = get_prefetch_stats()
+    print(after)
+    assert after["skipped_busy"] - before["skipped_busy"] == 1 and after["in_flight"] == 0
+    assert after["cancelled"] - before["cancelled"] == len(running)
+    assert start_rag_prefetch([rag_tool], "What is the shipping policy?") is not None
+
+def test_tool_node_reuses_prefetch():
+    """Test that the tool node answers a matching retrieval call from the prefetch"""
+    print("\n=== Testing prefetch reuse in the tool node ===")
+    rag_tool, calls = _rag_tool()
+    node = make_tool_node(lambda: [rag_tool])
+    question = "What is the timeframe for returning a product?"
+    prefetch = start_rag_prefetch([rag_tool], question)
+
+    def run(query):
+        state = {"messages": [
+            HumanMessage(content=question),
+            AIMessage(content="", tool_calls=[{"name": RAG_TOOL_NAME, "args": {"query": query}, "id": "c1"}]),
+        ]}
+        messages = node(state, {"configurable": {"rag_prefetch": prefetch}})["messages"]
+        assert len(messages) == 1 and isinstance(messages[0], ToolMessage)
+        return json.loads(messages[0].content)
+
+    assert run("timeframe for returning a product")[0]["page_content"] == f"chunk for {question}"
+    assert calls == [question]
+    # The prefetch is used once: the model's refined retry runs the tool itself
+    assert run("timeframe for returning a product")[0]["page_content"] == "chunk for timeframe for returning a product"
+    # A different retrieval query runs the tool itself
+    assert run("employee discount limit")[0]["page_content"] == "chunk for employee discount limit"
+    assert calls == [question, "timeframe for returning a product", "employee discount limit"]
+
+def test_refined_query_is_not_served_the_prefetch():
+    """Test that a query adding words to the prefetched one retrieves itself (similarity is symmetric)"""
+    print("\n=== Testing refined queries ===")
+    rag_tool, calls = _rag_tool()
+    prefetch = start_rag_prefetch([rag_tool], "What is the return policy?")
+    refined = "return policy for opened electronics after 30 days"
+    assert rag_prefetch.query_similarity("return policy", refined) < rag_prefetch.RAG_PREFETCH_SIMILARITY
+    assert prefetch.take(refined) == (False, None)
+    assert prefetch.take("return policy")[0]
+    assert prefetch.take("return policy") == (False, None)
+
+def main():
+    """Run all the RAG prefetch tests"""
+    test_document_questions_are_prefetched_and_reused()
+    test_data_questions_and_other_queries_miss()
+    test_busy_workers_skip_prefetch()
+    test_tool_node_reuses_prefetch()
+    test_refined_query_is_not_served_the_prefetch()
+
+if __name__ == "__main__":
+    main()
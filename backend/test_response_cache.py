@@ -0,0 +1,99 @@
+"""
+Test the semantic response cache with a deterministic bag-of-words embedder
+"""
+from datetime import datetime
+from app import response_cache
+from app.models import AgentLogicResponse, DebugInfo, TokenUsage
+from app.response_cache import SemanticResponseCache
+
+VOCABULARY = ["low", "stock", "reorder", "items", "which", "what", "is", "on", "need", "p301", "p302", "return", "policy"]
+
+def fake_embed(text):
+    """Embed text as word counts over a tiny vocabulary"""
+    words = text.replace("?", "").split()
+    return [float(words.count(word)) for word in VOCABULARY]
+
+def make_response(text):
+    return AgentLogicResponse(response=text, debug=DebugInfo(tool_usage=[], message_count=2))
+
+def test_paraphrase_hit():
+    """Test that a near-duplicate query is served from the cache"""
+    print("\n=== Testing paraphrase hit ===")
+    cache = SemanticResponseCache(maxsize=10, similarity_threshold=0.8, embed_fn=fake_embed, version_fn=lambda: 1)
+    cache.store("What is low on stock?", make_response("P301 and P302"))
+    cached = cache.lookup("what is low on stock")
+    assert cached is not None and cached.response == "P301 and P302"
+    assert cache.lookup("return policy") is None
+    print(cache.stats())
+
+def test_entities_must_match():
+    """Test that queries about different product IDs never share an answer"""
+    print("\n=== Testing entity guard ===")
+    cache = SemanticResponseCache(maxsize=10, similarity_threshold=0.5, embed_fn=fake_embed, version_fn=lambda: 1)
+    cache.store("stock p301", make_response("30 units"))
+    assert cache.lookup("stock p302") is None
+
+def test_version_invalidation():
+    """Test that a data or knowledge base change drops cached answers"""
+    print("\n=== Testing version invalidation ===")
+    version = {"value": 1}
+    cache = SemanticResponseCache(maxsize=10, similarity_threshold=0.8, embed_fn=fake_embed, version_fn=lambda: version["value"])
+    cache.store("what is low on stock", make_response("P301"))
+    version["value"] = 2
+    assert cache.lookup("what is low on stock") is None
+    assert cache.stats()["invalidations"] == 1
+
+def test_new_day_invalidates():
+    """Test that the default version changes at midnight, so relative-window answers are recomputed"""
+    print("\n=== Testing date invalidation ===")
+    now = {"value": datetime(2024, 5, 1, 23, 59)}
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now["value"]
+
+    original = response_cache.datetime
+    response_cache.datetime = FakeDatetime
+    try:
+        cache = SemanticResponseCache(maxsize=10, similarity_threshold=0.8, embed_fn=fake_embed)
+        cache.store("top selling items", make_response("P301"))
+        assert cache.lookup("top selling items") is not None
+        now["value"] = datetime(2024, 5, 2, 0, 1)
+        assert cache.lookup("top selling items") is None
+    finally:
+        response_cache.datetime = original
+
+def test_cache_hit_describes_the_new_request():
+    """Test that a response served from the cache gets its own query ID, zero tokens and the cache route"""
+    print("\n=== Testing cache hit metadata ===")
+    from app import agent
+    from app.router import get_router_stats, RESPONSE_CACHE_ROUTE
+    cached = make_response("P301 and P302")
+    cached.debug.route, cached.debug.query_id = "graph", "original-query"
+    cached.debug.token_usage = TokenUsage(prompt_tokens=900, completion_tokens=40, total_tokens=940, llm_calls=2)
+    original_lookup = agent.lookup_response
+    agent.lookup_response = lambda query: cached.model_copy(deep=True)
+    before = get_router_stats()["routes"].get(RESPONSE_CACHE_ROUTE, {}).get("count", 0)
+    try:
+        first = agent._run_agent("Which items need a reorder soon?")
+        second = agent._run_agent("Which items need a reorder soon?")
+    finally:
+        agent.lookup_response = original_lookup
+    print(first.debug)
+    assert first.response == "P301 and P302" and first.debug.route == RESPONSE_CACHE_ROUTE
+    assert first.debug.token_usage == TokenUsage()
+    assert first.debug.query_id not in (None, "original-query", second.debug.query_id)
+    stats = get_router_stats()
+    assert stats["routes"][RESPONSE_CACHE_ROUTE]["count"] - before == 2
+
+def main():
+    """Run all the response cache tests"""
+    test_paraphrase_hit()
+    test_entities_must_match()
+    test_version_invalidation()
+    test_new_day_invalidates()
+    test_cache_hit_describes_the_new_request()
+
+if __name__ == "__main__":
+    main()
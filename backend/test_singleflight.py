@@ -0,0 +1,101 @@
+"""
+Test single-flight coalescing of concurrent identical requests
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app import agent
+from app.singleflight import SingleFlight
+
+def test_concurrent_calls_share_one_execution():
+    """Test that concurrent calls with the same key run the work once"""
+    print("\n=== Testing single-flight coalescing ===")
+    flight = SingleFlight()
+    executions = []
+    results = []
+
+    def work():
+        executions.append(1)
+        time.sleep(0.1)
+        return "answer"
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do("q", work))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(executions) == 1
+    assert [r for r, _ in results] == ["answer"] * 5
+    assert sum(1 for _, shared in results if shared) == 4
+    print(flight.stats())
+
+def test_errors_reach_followers():
+    """Test that a failing execution raises for every waiting caller"""
+    print("\n=== Testing single-flight errors ===")
+    flight = SingleFlight()
+    errors = []
+
+    def work():
+        time.sleep(0.1)
+        raise RuntimeError("boom")
+
+    def call():
+        try:
+            flight.do("q", work)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == ["boom"] * 3
+    assert flight.stats()["in_flight"] == 0
+
+def _in_worker_thread(fn):
+    """Call fn off the main thread (where timeout_handler uses its executor instead of SIGALRM)"""
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("value", fn()))
+    thread.start()
+    thread.join()
+    return result["value"]
+
+def test_timeout_counts_from_start_and_cancels_queued_jobs():
+    """Test that queue time is not charged to the timeout and a job queued past it never runs"""
+    print("\n=== Testing the agent timeout executor ===")
+    original_executor = agent._timeout_executor
+    agent._timeout_executor = ThreadPoolExecutor(max_workers=1)
+    ran = []
+
+    @agent.timeout_handler(timeout_seconds=1)
+    def job(seconds):
+        ran.append(seconds)
+        time.sleep(seconds)
+        return "done"
+
+    try:
+        # Queued for 0.6s, then runs for 0.6s: over a second in total, but within the timeout once started
+        agent._timeout_executor.submit(time.sleep, 0.6)
+        assert _in_worker_thread(lambda: job(0.6)) == "done"
+
+        # Still queued after the timeout: cancelled, and never run once the worker frees up
+        blocker = agent._timeout_executor.submit(time.sleep, 1.5)
+        response = _in_worker_thread(lambda: job(0.01))
+        blocker.result()
+        agent._timeout_executor.submit(lambda: None).result()
+        print(response.debug.error, ran)
+        assert "timed out" in response.debug.error and ran == [0.6]
+    finally:
+        agent._timeout_executor.shutdown(wait=True)
+        agent._timeout_executor = original_executor
+
+def main():
+    """Run all the single-flight tests"""
+    test_concurrent_calls_share_one_execution()
+    test_errors_reach_followers()
+    test_timeout_counts_from_start_and_cancels_queued_jobs()
+
+if __name__ == "__main__":
+    main()
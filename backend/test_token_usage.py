@@ -0,0 +1,66 @@
+"""
+Test per-request token and cost accounting
+"""
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from app.cascade import DEFAULT_MODELS
+from app.token_usage import TokenUsageTracker, extract_usage, estimate_cost, tools_in_context
+
+def test_extract_usage():
+    """Test reading prompt, completion and cached prompt tokens"""
+    print("\n=== Testing usage extraction ===")
+    message = AIMessage(content="ok", usage_metadata={
+        "input_tokens": 1200, "output_tokens": 40, "total_tokens": 1240,
+        "input_token_details": {"cache_read": 1024},
+    })
+    assert extract_usage(message) == (1200, 40, 1024)
+    legacy = AIMessage(content="ok", response_metadata={"token_usage": {
+        "prompt_tokens": 50, "completion_tokens": 5, "prompt_tokens_details": {"cached_tokens": 0},
+    }})
+    assert extract_usage(legacy) == (50, 5, 0)
+    assert extract_usage(AIMessage(content="ok")) == (0, 0, 0)
+
+def test_cost_estimate():
+    """Test that cached prompt tokens are priced at the cached rate"""
+    print("\n=== Testing cost estimate ===")
+    full = estimate_cost("gpt-4o", 1000, 100, 0)
+    cached = estimate_cost("gpt-4o", 1000, 100, 1000)
+    assert full is not None and cached < full
+    assert estimate_cost("unknown-model", 1000, 100, 0) is None
+    # Every cascade default model is priced
+    for models in DEFAULT_MODELS.values():
+        for model in models.values():
+            assert estimate_cost(model, 1000, 100, 0) is not None, model
+
+def test_tracker_attributes_tools():
+    """Test per-hop records and the tools whose results were in each prompt"""
+    print("\n=== Testing per-hop tracking ===")
+    call = {"name": "get_inventory_level", "args": {"product_id": "P301"}, "id": "call_1"}
+    messages = [
+        HumanMessage(content="Stock for P301?"),
+        AIMessage(content="", tool_calls=[call]),
+        ToolMessage(content="{}", tool_call_id="call_1"),
+    ]
+    assert tools_in_context(messages[:1]) == []
+    assert tools_in_context(messages) == ["get_inventory_level"]
+
+    tracker = TokenUsageTracker()
+    tracker.record("gpt-4o", AIMessage(content="", tool_calls=[call], usage_metadata={
+        "input_tokens": 800, "output_tokens": 20, "total_tokens": 820}), 0.5, [])
+    tracker.record("gpt-4o", AIMessage(content="30 units", usage_metadata={
+        "input_tokens": 850, "output_tokens": 10, "total_tokens": 860}), 0.4, ["get_inventory_level"])
+    summary = tracker.summary()
+    print(summary)
+    assert summary.llm_calls == 2
+    assert summary.total_tokens == 1680
+    assert summary.hops[0].tool_calls == ["get_inventory_level"]
+    assert summary.hops[1].tools_in_context == ["get_inventory_level"]
+    assert summary.estimated_cost_usd > 0
+
+def main():
+    """Run all the token usage tests"""
+    test_extract_usage()
+    test_cost_estimate()
+    test_tracker_attributes_tools()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Test the tool result cache
+"""
+import time
+from app.tool_cache import ToolResultCache, memoize_tool
+from app.tools import _get_inventory_level, _list_products, get_data_version
+
+def test_lru_eviction():
+    """Test that the least recently used entry is evicted first"""
+    print("\n=== Testing LRU eviction ===")
+    cache = ToolResultCache(maxsize=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "a" is now the most recently used
+    cache.set("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.stats()["evictions"] == 1
+    print(cache.stats())
+
+def test_ttl_expiry():
+    """Test that entries expire after the TTL"""
+    print("\n=== Testing TTL expiry ===")
+    cache = ToolResultCache(maxsize=10, ttl_seconds=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["expirations"] == 1
+
+def test_memoize_canonical_args_and_version():
+    """Test that equivalent calls share an entry and a version change invalidates it"""
+    print("\n=== Testing memoize_tool ===")
+    cache = ToolResultCache(maxsize=10, ttl_seconds=60)
+    version = {"value": 1}
+    calls = []
+
+    @memoize_tool(lambda: version["value"], cache=cache)
+    def lookup(product_id, days=30):
+        calls.append(product_id)
+        return {"product_id": product_id, "days": days}
+
+    lookup("P1")
+    lookup(product_id="P1", days=30)
+    assert len(calls) == 1
+
+    version["value"] = 2
+    lookup("P1")
+    assert len(calls) == 2
+    print(cache.stats())
+
+def test_cached_tools_match_data():
+    """Test that the memoized data tools return the same result on a hit"""
+    print("\n=== Testing memoized data tools ===")
+    print(f"Data version: {get_data_version()}")
+    products = _list_products(limit=1)
+    if not products:
+        print("No products found to test with")
+        return
+    product_id = products[0]["product_id"]
+    first = _get_inventory_level(product_id)
+    second = _get_inventory_level(product_id=product_id)
+    assert first == second
+
+def main():
+    """Run all the tool cache tests"""
+    test_lru_eviction()
+    test_ttl_expiry()
+    test_memoize_canonical_args_and_version()
+    test_cached_tools_match_data()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Test per-run tool call dedup and the tool call budget
+"""
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from app import agent, tool_dedup
+
+class LoopingModel(GenericFakeChatModel):
+    """Fake model that keeps requesting the same tool call"""
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+def _sales_call(call_id):
+    return {"name": "get_sales_data_for_product", "args": {"product_id": "P301", "days": 30}, "id": call_id}
+
+def test_previous_results_are_per_run():
+    """Test that only results after the latest human message are reused"""
+    print("\n=== Testing per-run result lookup ===")
+    messages = [
+        HumanMessage(content="Sales for P301?"),
+        AIMessage(content="", tool_calls=[_sales_call("a")]),
+        ToolMessage(content='{"total_units_sold": 5}', tool_call_id="a"),
+        AIMessage(content="5 units."),
+    ]
+    key = tool_dedup.tool_call_key("get_sales_data_for_product", {"days": 30, "product_id": "P301"})
+    assert tool_dedup.previous_results(messages)[key] == '{"total_units_sold": 5}'
+    assert tool_dedup.tool_calls_used(messages) == 1
+    # A new turn starts a new run
+    messages.append(HumanMessage(content="And again?"))
+    assert tool_dedup.previous_results(messages) == {}
+    assert tool_dedup.tool_calls_used(messages) == 0
+
+def test_repeated_calls_are_deduplicated_and_budgeted():
+    """Test that a model looping on one call executes it once and is forced to answer"""
+    print("\n=== Testing dedup and budget in a graph run ===")
+    model = LoopingModel(messages=iter(
+        [AIMessage(content="", tool_calls=[_sales_call(f"call_{i}")]) for i in range(50)]
+    ))
+    original_get_llm = agent.get_llm
+    agent.get_llm = lambda *args, **kwargs: model
+    before = tool_dedup.get_tool_dedup_stats()
+    try:
+        result = agent.agent_app.invoke(
+            {"messages": [HumanMessage(content="Sales for P301 in the last 30 days?")]},
+            config={"recursion_limit": 50},
+        )
+    finally:
+        agent.get_llm = original_get_llm
+    after = tool_dedup.get_tool_dedup_stats()
+    tool_messages = [m for m in result["messages"] if isinstance(m, ToolMessage)]
+    print(f"{len(tool_messages)} tool messages, final: {result['messages'][-1].content[:80]}")
+    assert after["executed"] - before["executed"] == 1
+    assert after["deduplicated"] - before["deduplicated"] == tool_dedup.MAX_TOOL_CALLS_PER_RUN - 1
+    assert after["forced_answers"] - before["forced_answers"] == 1
+    assert len(tool_messages) == tool_dedup.MAX_TOOL_CALLS_PER_RUN
+    assert all(m.content.startswith(tool_dedup.DUPLICATE_NOTE) for m in tool_messages[1:])
+    assert not result["messages"][-1].tool_calls
+
+def main():
+    """Run all the tool dedup tests"""
+    test_previous_results_are_per_run()
+    test_repeated_calls_are_deduplicated_and_budgeted()
+
+if __name__ == "__main__":
+    main()
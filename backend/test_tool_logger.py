@@ -0,0 +1,91 @@
+"""
+Test the tool_logger decorator's input/output capture
+"""
+import inspect
+from app import tool_logger
+from app.tool_usage import reset_tracker, start_tool_call, end_tool_call
+
+class _Sink:
+    """Collects trace records in place of the trace store"""
+    def __init__(self):
+        self.records = []
+
+    def record(self, record):
+        self.records.append(record)
+        return True
+
+def _capture(fn, *args, **kwargs):
+    sink = _Sink()
+    original_get_trace_store = tool_logger.get_trace_store
+    tool_logger.get_trace_store = lambda: sink
+    tool_logger.start_session("q-capture")
+    try:
+        fn(*args, **kwargs)
+    finally:
+        tool_logger.end_session()
+        tool_logger.get_trace_store = original_get_trace_store
+    return sink.records
+
+def test_signature_is_resolved_once():
+    """Test that positional args map to parameter names without reflection per call"""
+    print("\n=== Testing signature caching ===")
+    def sales_tool(product_id: str, days: int = 30, config=None):
+        return {"units": 3}
+    decorated = tool_logger.tool_logger(sales_tool)
+    original_signature = inspect.signature
+    inspect.signature = None  # Any per-call reflection would now fail
+    try:
+        records = _capture(decorated, "P301", 7, config={"x": 1})
+    finally:
+        inspect.signature = original_signature
+    print(records[0]["input"])
+    assert records[0]["input"] == {"product_id": "P301", "days": 7}
+
+def test_outputs_are_capped_and_sampled():
+    """Test that large outputs are cut down and unsampled calls log no output"""
+    print("\n=== Testing output capture ===")
+    @tool_logger.tool_logger
+    def big_tool(product_id: str):
+        return {"product_id": product_id, "rows": list(range(10_000)), "note": "x" * 100_000}
+
+    output = _capture(big_tool, "P301")[0]["output"]
+    assert output["product_id"] == "P301"
+    assert len(output["rows"]) == tool_logger.TOOL_LOG_MAX_OUTPUT_ITEMS + 1
+    assert len(output["note"]) < 100_000
+
+    original_rate = tool_logger.TOOL_LOG_OUTPUT_SAMPLE_RATE
+    tool_logger.TOOL_LOG_OUTPUT_SAMPLE_RATE = 0.0
+    try:
+        record = _capture(big_tool, "P301")[0]
+    finally:
+        tool_logger.TOOL_LOG_OUTPUT_SAMPLE_RATE = original_rate
+    assert record["output"] is None and record["input"] == {"product_id": "P301"}
+
+def test_nothing_is_captured_without_a_consumer():
+    """Test that calls inside the tool node, with no logging session, skip capture entirely"""
+    print("\n=== Testing capture is skipped ===")
+    captured = []
+    original_log_tool_call = tool_logger.log_tool_call
+    tool_logger.log_tool_call = lambda **kwargs: captured.append(kwargs)
+
+    @tool_logger.tool_logger
+    def small_tool(product_id: str):
+        return {"quantity": 1}
+
+    reset_tracker()
+    call_id = start_tool_call("small_tool", {"product_id": "P301"})
+    try:
+        assert small_tool("P301") == {"quantity": 1}
+    finally:
+        end_tool_call(call_id)
+        tool_logger.log_tool_call = original_log_tool_call
+    assert captured == []
+
+def main():
+    """Run all the tool_logger tests"""
+    test_signature_is_resolved_once()
+    test_outputs_are_capped_and_sampled()
+    test_nothing_is_captured_without_a_consumer()
+
+if __name__ == "__main__":
+    main()
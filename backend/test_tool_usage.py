@@ -0,0 +1,84 @@
+"""
+Test contextvars-based tool usage tracking
+"""
+import asyncio
+import tempfile
+from langchain_core.messages import AIMessage, HumanMessage
+from test_query_planner import ScriptedModel
+from app import agent, tool_logger
+from app.tool_usage import (
+    reset_tracker, start_tool_call, end_tool_call, add_tool_usage,
+    update_tool_output, get_tool_usage, current_tool_call_id,
+)
+from app.trace_store import TraceStore
+
+def test_records_are_keyed_by_id():
+    """Test start/end timing, O(1) updates by ID and completing a record instead of duplicating it"""
+    print("\n=== Testing ID-keyed records ===")
+    reset_tracker()
+    call_id = start_tool_call("get_inventory_level", {"product_id": "P301"}, "call_1")
+    assert current_tool_call_id() == "call_1"
+    assert end_tool_call(call_id, {"quantity": 5})
+    assert current_tool_call_id() is None
+    # Passing the same ID again completes the existing record
+    add_tool_usage("get_inventory_level", {"product_id": "P301"}, {"quantity": 6}, "call_1")
+    assert update_tool_output("call_1", {"quantity": 7})
+    usage = get_tool_usage()
+    print(usage)
+    assert len(usage) == 1
+    assert usage[0]["output"] == {"quantity": 7} and usage[0]["duration_ms"] >= 0
+    assert usage[0]["ended_at"] >= usage[0]["started_at"]
+    assert not update_tool_output("missing", {})
+
+def test_concurrent_async_requests_are_isolated():
+    """Test that interleaved asyncio tasks (one thread) and offloaded work see their own session"""
+    print("\n=== Testing async isolation ===")
+
+    async def request(i):
+        reset_tracker()
+        call_id = start_tool_call("list_products", {"request": i})
+        await asyncio.sleep(0.01 * (5 - i % 5))
+        # Offloaded work runs with a copy of this task's context
+        await asyncio.to_thread(end_tool_call, call_id, {"request": i})
+        return get_tool_usage()
+
+    async def run_all():
+        return await asyncio.gather(*(request(i) for i in range(20)))
+
+    results = asyncio.run(run_all())
+    for i, usage in enumerate(results):
+        assert len(usage) == 1 and usage[0]["input"] == {"request": i} and usage[0]["output"] == {"request": i}
+
+def test_graph_run_records_each_tool_call_once():
+    """Test that a tool call made by the agent graph yields one usage record and one trace"""
+    print("\n=== Testing one record per graph tool call ===")
+    tool_call = {"name": "get_inventory_level", "args": {"product_id": "P301"}, "id": "inv_1"}
+    model = ScriptedModel(messages=iter([AIMessage(content="", tool_calls=[tool_call]), AIMessage(content="5 units.")]))
+    original_get_llm = agent.get_llm
+    original_get_trace_store = tool_logger.get_trace_store
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TraceStore(directory=tmp, maintenance_interval=0, fsync="off")
+        agent.get_llm = lambda *args, **kwargs: model
+        tool_logger.get_trace_store = lambda: store
+        reset_tracker()
+        tool_logger.start_session("q-usage")
+        try:
+            agent.agent_app.invoke({"messages": [HumanMessage(content="How many P301 do we have?")]})
+        finally:
+            tool_logger.end_session()
+            agent.get_llm = original_get_llm
+            tool_logger.get_trace_store = original_get_trace_store
+        usage = get_tool_usage()
+        print(usage)
+        assert len(usage) == 1 and usage[0]["id"] == "inv_1" and usage[0]["output"] is not None
+        assert store.flush()
+        assert len(store.query(query_id="q-usage")) == 1
+
+def main():
+    """Run all the tool usage tests"""
+    test_records_are_keyed_by_id()
+    test_concurrent_async_requests_are_isolated()
+    test_graph_run_records_each_tool_call_once()
+
+if __name__ == "__main__":
+    main()
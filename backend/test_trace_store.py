@@ -0,0 +1,84 @@
+"""
+Test the segmented, indexed trace store
+"""
+import tempfile
+import time
+from app import tool_logger
+from app.trace_store import TraceStore
+
+def _record(query_id, step, tool, duration_ms, error=None, timestamp=None):
+    return {"query_id": query_id, "step": step, "tool": tool, "input": {"product_id": "P301"},
+            "output": {"value": step}, "timestamp": timestamp or time.time(), "duration_ms": duration_ms, "error": error}
+
+def test_index_queries():
+    """Test lookups by query ID, tool, duration and error status"""
+    print("\n=== Testing indexed queries ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TraceStore(directory=tmp, maintenance_interval=0, fsync="off")
+        for i in range(100):
+            store.record(_record(f"q{i % 10}", i, "get_inventory_level" if i % 2 else "get_product_info",
+                                 duration_ms=i, error="boom" if i % 25 == 0 else None))
+        assert store.flush()
+        assert len(store.query(query_id="q3", limit=50)) == 10
+        assert all(t["tool"] == "get_product_info" for t in store.query(tool="get_product_info"))
+        slow = store.query(min_duration_ms=90, include_records=True)
+        print(slow[:2])
+        assert {t["step"] for t in slow} == set(range(90, 100))
+        assert all(t["record"]["output"]["value"] == t["step"] for t in slow)
+        assert {t["step"] for t in store.query(error=True)} == {0, 25, 50, 75}
+
+def test_rotation_retention_and_compaction():
+    """Test size-based rotation, compaction of small segments and expiry of old ones"""
+    print("\n=== Testing rotation, compaction and retention ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TraceStore(directory=tmp, segment_max_bytes=1000, maintenance_interval=0, fsync="off")
+        for i in range(60):
+            store.record(_record("q1", i, "list_products", duration_ms=1.0))
+            # One batch per record so segments rotate as they fill
+            store.flush()
+        before = store.stats()
+        print(before)
+        assert before["segments"] > 3
+        store.compact()
+        after = store.stats()
+        assert after["segments"] < before["segments"] and after["segments_compacted"] > 0
+        traces = store.query(query_id="q1", include_records=True, limit=100)
+        assert len(traces) == 60 and all(t["record"]["step"] == t["step"] for t in traces)
+        # Everything but the open segment is past retention a year from now
+        store.apply_retention(now=time.time() + 365 * 24 * 3600)
+        remaining = store.query(query_id="q1", limit=100)
+        assert 0 < len(remaining) < 60
+        assert store.stats()["segments"] == 1
+
+def test_tool_logger_records_traces():
+    """Test that tool calls in a session are traced with their duration and error"""
+    print("\n=== Testing tool_logger tracing ===")
+
+    @tool_logger.tool_logger
+    def failing_tool(product_id: str):
+        return {"error": f"Product {product_id} not found"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TraceStore(directory=tmp, maintenance_interval=0, fsync="off")
+        original_get_trace_store = tool_logger.get_trace_store
+        tool_logger.get_trace_store = lambda: store
+        tool_logger.start_session("q-trace")
+        try:
+            failing_tool("P999")
+        finally:
+            tool_logger.end_session()
+            tool_logger.get_trace_store = original_get_trace_store
+        assert store.flush()
+        traces = store.query(query_id="q-trace", include_records=True)
+        print(traces)
+        assert len(traces) == 1 and traces[0]["tool"] == "failing_tool" and traces[0]["error"]
+        assert traces[0]["duration_ms"] >= 0 and traces[0]["record"]["input"] == {"product_id": "P999"}
+
+def main():
+    """Run all the trace store tests"""
+    test_index_queries()
+    test_rotation_retention_and_compaction()
+    test_tool_logger_records_traces()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Test the background warmup state reported by /ready
+"""
+import time
+import os
+import threading
+from langchain_core.messages import AIMessage
+from fastapi.testclient import TestClient
+from app.warmup import start_warmup, wait_for_warmup, get_warmup_state
+
+def test_warmup_runs_steps_in_background():
+    """Test that steps run in order off the calling thread and are reported as ready"""
+    print("\n=== Testing background warmup ===")
+    order = []
+    start_warmup([
+        ("first", lambda: (time.sleep(0.05), order.append("first"))),
+        ("second", lambda: order.append("second")),
+    ], background=True)
+    assert wait_for_warmup(timeout=5)
+    state = get_warmup_state()
+    print(state)
+    assert order == ["first", "second"]
+    assert state["ready"] and state["finished"]
+    assert state["steps"]["first"]["seconds"] >= 0.05
+
+def test_failed_step_is_reported():
+    """Test that a failing step is recorded and does not stop later steps"""
+    print("\n=== Testing failed warmup step ===")
+    def fail():
+        raise RuntimeError("qdrant unavailable")
+    start_warmup([("vector_store", fail), ("data_snapshot", lambda: None)], background=False)
+    state = get_warmup_state()
+    assert not state["ready"]
+    assert state["steps"]["vector_store"]["status"] == "failed"
+    assert "qdrant unavailable" in state["steps"]["vector_store"]["error"]
+    assert state["steps"]["data_snapshot"]["status"] == "ready"
+
+def test_missing_llm_key_does_not_block_readiness():
+    """Test that the LLM client step is skipped without a provider key and /ready still returns 200"""
+    print("\n=== Testing warmup without an LLM key ===")
+    import main
+    keys = ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "LLM_PROVIDER")
+    saved = {key: os.environ.pop(key, None) for key in keys}
+    try:
+        start_warmup([("data_snapshot", lambda: None), ("llm_client", main._warm_llm_client)], background=False)
+        response = TestClient(main.app).get("/ready")
+    finally:
+        os.environ.update({key: value for key, value in saved.items() if value is not None})
+    state = response.json()
+    print(state)
+    assert response.status_code == 200 and state["ready"]
+    assert state["steps"]["llm_client"]["status"] == "skipped" and "API key" in state["steps"]["llm_client"]["reason"]
+
+def test_answers_before_warmup_are_not_cached():
+    """Test that agent answers are stored in the response cache only once warmup is complete"""
+    print("\n=== Testing response caching during warmup ===")
+    from test_query_planner import ScriptedModel
+    from app import agent
+    from app.llm_resilience import reset_llm_resilience
+    reset_llm_resilience()
+    model = ScriptedModel(messages=iter([AIMessage(content="Operations look healthy."),
+                                         AIMessage(content="Operations look healthy.")]))
+    stored = []
+    release = threading.Event()
+    original_get_llm, original_store = agent.get_llm, agent.store_response
+    agent.get_llm = lambda *args, **kwargs: model
+    agent.store_response = lambda query, response: stored.append(query)
+    try:
+        start_warmup([("vector_store", release.wait)], background=True)
+        agent._run_agent("Give me a summary of how operations are going")
+        assert stored == []
+        release.set()
+        assert wait_for_warmup(timeout=5)
+        agent._run_agent("Give me a summary of how operations are going")
+        assert stored == ["Give me a summary of how operations are going"]
+    finally:
+        release.set()
+        agent.get_llm, agent.store_response = original_get_llm, original_store
+
+def main():
+    """Run all the warmup tests"""
+    test_warmup_runs_steps_in_background()
+    test_failed_step_is_reported()
+    test_missing_llm_key_does_not_block_readiness()
+    test_answers_before_warmup_are_not_cached()
+
+if __name__ == "__main__":
+    main()